@@ -1,31 +1,34 @@
 # app.py - Versión optimizada para carga rápida
 import sys
 import os
+import logging
 import tensorflow as tf
 from tensorflow import keras
 from PySide6.QtWidgets import QApplication
 from PySide6.QtCore import QTimer
 from gradcam_visualizer import GradCAMVisualizer
 from views.main_windows import MainWindow
+from views.stall_watchdog import StallWatchdog
+from utils.file_utils import default_model_path
+from utils.metrics import PipelineMetrics, LogFileSink, LoggingSink
+from utils.quality import QualityGate
+from utils.model_registry import ModelRegistry, ModelSwapper, FINGERPRINT_LENGTH
+from utils.runtime_config import load_runtime_config, apply_runtime_config
+from utils.resource_monitor import ResourceMonitor
+from utils.logging_setup import setup_logging
 
-def _resource_path(relative_path):
-    """Resuelve rutas tanto en desarrollo como en ejecutable PyInstaller (onedir/onefile)."""
-    try:
-        base_dir = sys._MEIPASS  # type: ignore[attr-defined]
-    except Exception:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(base_dir, relative_path)
+log = logging.getLogger(__name__)
 
-MODEL_PATH = _resource_path(os.path.join("model", "mobilenet_flV3_finetuning.h5"))
-if not os.path.exists(MODEL_PATH):
-    # fallback: raíz del proyecto en desarrollo
-    alt = _resource_path("mobilenet_flV3_finetuning.h5")
-    if os.path.exists(alt):
-        MODEL_PATH = alt
+MODEL_PATH = default_model_path()
 
 def main():
     # OPTIMIZACIÓN: Cargar modelo de forma asíncrona para mostrar GUI más rápido
-    print("Iniciando aplicación de Detección de Glaucoma...")
+    # logs en JSON (resultados/logs/app.jsonl, con rotación) escritos desde un hilo aparte
+    setup_logging()
+    log.info("Iniciando aplicación de Detección de Glaucoma...")
+    # hilos de TF/OpenCV, workers y lote (resultados/runtime_config.json, ver benchmarks.autotune);
+    # tiene que ser antes de cargar el modelo, cuando TF todavía no inicializó su runtime
+    runtime = apply_runtime_config(load_runtime_config())
     
     # Crear la aplicación GUI primero
     app = QApplication(sys.argv)
@@ -239,25 +242,59 @@ def main():
     
     # Crear ventana principal con placeholder para el modelo
     window = MainWindow(None)  # Sin modelo por ahora
+    window.runtime_config = runtime
     window.resize(1000, 700)
     window.show()
+
+    # Detector de bloqueos de la GUI (opt-in con GLAUCOMA_STALL_WATCHDOG=1)
+    watchdog = StallWatchdog.from_env(window)
+    if watchdog is not None:
+        window.watchdog = watchdog.start()
+        app.aboutToQuit.connect(lambda: watchdog.write_report(os.path.join("resultados", "stall_report.json")))
+
+    # Monitor de recursos de la sesión: RSS, objetos, handles y latencia en resultados/recursos.jsonl
+    # (intervalo en GLAUCOMA_RESOURCE_INTERVAL_S, 60 s por defecto; 0 lo desactiva)
+    monitor = ResourceMonitor.from_env()
+    if monitor is not None:
+        window.set_resource_monitor(monitor.start())
+
+        def _close_monitor():
+            monitor.write_report()
+            monitor.close()
+        app.aboutToQuit.connect(_close_monitor)
     
     # Función para cargar el modelo en segundo plano
     def load_model_and_initialize():
         try:
-            print("Cargando modelo de IA...")
-            model = keras.models.load_model(MODEL_PATH, compile=False)
-            print("✅ Modelo cargado exitosamente!")
-            
-            # Crear visualizador
-            visualizer = GradCAMVisualizer(model, target_layer_name="Conv_1")
+            log.info("Cargando modelo de IA...")
+            # registro de modelos: el de la app queda siempre registrado y es el inicial
+            os.makedirs("resultados", exist_ok=True)
+            registry = ModelRegistry()
+            entry = registry.register(MODEL_PATH)
+            # los tiempos por imagen quedan en resultados/metricas.log (compartido entre modelos)
+            # y como registro JSON en el log de la aplicación
+            metrics = PipelineMetrics(sinks=[LogFileSink(os.path.join("resultados", "metricas.log")), LoggingSink()])
+            if monitor is not None:
+                monitor.metrics = metrics
+
+            def build_visualizer(entry):
+                model = keras.models.load_model(entry["ruta"], compile=False)
+                # control de calidad: las imágenes dudosas se procesan igual pero quedan marcadas
+                return GradCAMVisualizer(model, target_layer_name="Conv_1", metrics=metrics,
+                                         quality_gate=QualityGate(mode="flag"),
+                                         model_fingerprint=entry["sha256"][:FINGERPRINT_LENGTH],
+                                         low_memory=bool(runtime["low_memory"]))
+
+            visualizer = build_visualizer(entry)
+            log.info("Modelo cargado: %s", ModelRegistry.label(entry))
             
             # Actualizar la ventana con el modelo
             window.set_model(visualizer)
-            print("✅ Aplicación completamente inicializada!")
+            window.set_model_registry(registry, ModelSwapper(build_visualizer, current=visualizer, entry=entry))
+            log.info("Aplicación completamente inicializada")
             
         except Exception as e:
-            print(f"❌ Error al cargar el modelo: {e}")
+            log.error("Error al cargar el modelo: %s", e, exc_info=True, extra={"error": repr(e)})
             # Mostrar mensaje de error en la GUI
             window.show_error_message(f"Error al cargar el modelo: {e}")
     
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Autoajuste de la configuración de ejecución (hilos de TF y OpenCV, workers y tamaño de lote)
+en el equipo local. Parte de los valores por defecto (utils.runtime_config) y prueba, de a un
+parámetro por vez, unos pocos valores alternativos con el resto fijo en el mejor hasta ahora.
+Cada combinación corre en un subproceso propio (los hilos de TF solo se fijan antes de
+inicializar el runtime) con el pipeline completo de iter_process sobre retinografías
+sintéticas, y se queda la de más imágenes por segundo. Guarda el resultado en
+resultados/runtime_config.json, que cargan la app, cli.py y server.py al iniciar.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.autotune --images 48 --json autotune.json
+    python -m benchmarks.autotune --model mobilenet_flV3_finetuning.h5 --no-save
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+from benchmarks.synthetic import write_synthetic_folder
+from utils.runtime_config import (RUNTIME_KEYS, LOW_MEMORY_MAX_BATCH, default_runtime_config, apply_runtime_config,
+                                  save_runtime_config)
+
+
+def candidates(base, cores):
+    """
+    Valores alternativos de cada parámetro, en el orden en que se ajustan. Con low_memory
+    no se prueban los límites del perfil (un worker, un hilo inter-op, lote acotado).
+    """
+    def _valid(values, low=1, high=None):
+        return sorted({v for v in values if v >= low and (high is None or v <= high)})
+    if base.get("low_memory"):
+        return [
+            ("tf_intra_op", _valid([base["tf_intra_op"], cores - 1, cores, max(1, cores // 2)], high=cores)),
+            ("batch_size", _valid([1, 2, LOW_MEMORY_MAX_BATCH], high=LOW_MEMORY_MAX_BATCH)),
+            ("cv2_threads", _valid([1, 2, cores], high=cores)),
+        ]
+    return [
+        ("tf_intra_op", _valid([base["tf_intra_op"], cores - 1, cores, max(1, cores // 2)], high=cores)),
+        ("batch_size", _valid([4, 8, 16])),
+        ("workers", _valid([1, 2, 4], high=max(2, cores))),
+        ("cv2_threads", _valid([1, 2, cores], high=cores)),
+        ("tf_inter_op", _valid([1, 2], high=cores)),
+    ]
+
+
+def run_trial(config, folder, model_path=None, alpha=0.35, output_mode="full"):
+    """Una combinación (en este proceso): img/s del pipeline completo después de un lote de calentamiento."""
+    apply_runtime_config(config)
+    # imports diferidos: TF no debe inicializarse antes de fijar sus hilos
+    from gradcam_visualizer import GradCAMVisualizer
+    from utils.image_utils import OutputSettings
+    if model_path:
+        from tensorflow import keras
+        model = keras.models.load_model(model_path, compile=False)
+    else:
+        from benchmarks.synthetic import build_synthetic_model
+        model = build_synthetic_model(alpha=alpha)
+    gc = GradCAMVisualizer(model, target_layer_name="Conv_1", output_settings=OutputSettings(lazy=output_mode == "lazy"),
+                           low_memory=bool(config.get("low_memory")))
+    paths = sorted(os.path.join(folder, f) for f in os.listdir(folder))
+    out = tempfile.mkdtemp(prefix="autotune_out_")
+    kwargs = dict(output_root=out, save_images=output_mode == "full", write_csv=False,
+                  batch_size=config["batch_size"], workers=config["workers"])
+    try:
+        # calentamiento: trazado del grafo para este tamaño de lote
+        list(gc.iter_process(paths[:config["batch_size"]], **kwargs))
+        t0 = time.perf_counter()
+        n_err = sum(1 for _, _, err in gc.iter_process(paths, **kwargs) if err is not None)
+        elapsed = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(out, ignore_errors=True)
+    return {"imagenes_por_s": len(paths) / elapsed, "segundos": elapsed, "errores": n_err}
+
+
+def measure(config, args, folder):
+    """Corre run_trial en un subproceso y devuelve su medición (None si falló)."""
+    cmd = [sys.executable, "-m", "benchmarks.autotune", "--trial", json.dumps(config), "--folder", folder,
+           "--alpha", str(args.alpha), "--output-mode", args.output_mode]
+    if args.model:
+        cmd += ["--model", args.model]
+    proc = subprocess.run(cmd, capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        print(f"[ERROR] Falló la prueba {config}: {proc.stderr.strip().splitlines()[-1:] or proc.returncode}")
+        return None
+    return json.loads(lines[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=48, help="Imágenes por prueba")
+    parser.add_argument("--size", default="2048x1536", help="Tamaño de las imágenes ANCHOxALTO")
+    parser.add_argument("--model", default=None, help="Modelo .h5 real (por defecto, el sintético)")
+    parser.add_argument("--alpha", type=float, default=0.35, help="Ancho del MobileNetV2 sintético")
+    parser.add_argument("--output-mode", choices=["full", "lazy"], default="full")
+    parser.add_argument("--save", default=None, help="Archivo de configuración a escribir (por defecto el de la app)")
+    parser.add_argument("--no-save", action="store_true", help="Solo informar, sin guardar la configuración")
+    parser.add_argument("--json", default=None, help="Archivo JSON con todas las pruebas")
+    # uso interno: una prueba en este proceso
+    parser.add_argument("--trial", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--folder", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.trial:
+        result = run_trial(json.loads(args.trial), args.folder, model_path=args.model, alpha=args.alpha,
+                           output_mode=args.output_mode)
+        print(json.dumps(result))
+        return 0
+
+    cores = os.cpu_count() or 1
+    best = default_runtime_config(cores)
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    workdir = tempfile.mkdtemp(prefix="autotune_")
+    trials = []
+    try:
+        folder = os.path.join(workdir, "imagenes")
+        write_synthetic_folder(folder, args.images, height, width, distinct=min(args.images, 8))
+        print(f"[INFO] {cores} núcleos | {args.images} imágenes {args.size} por prueba")
+        best_score = measure(best, args, folder)
+        if best_score is None:
+            print("[ERROR] No se pudo medir la configuración por defecto")
+            return 1
+        trials.append({"config": dict(best), **best_score})
+        print(f"[INFO] por defecto: {best_score['imagenes_por_s']:.2f} img/s")
+        for key, values in candidates(best, cores):
+            for value in values:
+                if value == best[key]:
+                    continue
+                config = dict(best, **{key: value})
+                score = measure(config, args, folder)
+                if score is None:
+                    continue
+                trials.append({"config": config, **score})
+                print(f"[INFO]   {key}={value}: {score['imagenes_por_s']:.2f} img/s")
+                # se exige una mejora de al menos 3% para no cambiar por ruido de medición
+                if score["imagenes_por_s"] > best_score["imagenes_por_s"] * 1.03:
+                    best, best_score = config, score
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    best["origen"] = "autotune"
+    print("[OK] Mejor configuración: " + ", ".join(f"{k}={best[k]}" for k in RUNTIME_KEYS)
+          + f" ({best_score['imagenes_por_s']:.2f} img/s)")
+    if not args.no_save:
+        path = save_runtime_config(best, args.save, extra={
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "imagenes_por_s": best_score["imagenes_por_s"],
+            "nucleos": cores,
+        })
+        print(f"[INFO] Configuración guardada en {os.path.abspath(path)}")
+    if args.json:
+        report = {
+            "fecha": datetime.now().isoformat(),
+            "plataforma": platform.platform(),
+            "nucleos": cores,
+            "tamano": args.size,
+            "mejor": {k: best[k] for k in RUNTIME_KEYS},
+            "pruebas": trials,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Resultados en {os.path.abspath(args.json)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
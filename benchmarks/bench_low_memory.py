@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Techo de memoria del modo de poca memoria (equipos de 4 GB) sobre una carpeta grande de
+retinografías sintéticas a resolución completa. Corre process_folder completo (overlay y
+heatmap en disco, CSV consolidado) en un subproceso por modo, con el perfil de poca memoria
+de utils.runtime_config y opcionalmente con la configuración normal para comparar, y mide el
+pico de RSS de cada uno (utils.memory). Termina con código 1 si el modo de poca memoria supera
+--max-rss-mb, así sirve como control en la máquina de integración.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_low_memory --images 2000 --max-rss-mb 1500 --json bench_low_memory.json
+    python -m benchmarks.bench_low_memory --images 300 --compare
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+from benchmarks.synthetic import write_synthetic_folder
+from utils.memory import current_rss_mb, peak_rss_mb, total_memory_mb
+from utils.runtime_config import default_runtime_config, low_memory_profile, apply_runtime_config
+
+
+def run_trial(config, folder, alpha=0.35):
+    """Un modo (en este proceso): process_folder sobre folder y pico de RSS."""
+    apply_runtime_config(config)
+    # imports diferidos: TF no debe inicializarse antes de fijar sus hilos
+    from gradcam_visualizer import GradCAMVisualizer
+    from benchmarks.synthetic import build_synthetic_model
+    gc = GradCAMVisualizer(build_synthetic_model(alpha=alpha), target_layer_name="Conv_1",
+                           low_memory=bool(config["low_memory"]))
+    gc.warm_up(batch_sizes=(config["batch_size"],))
+    base = current_rss_mb()
+    out = tempfile.mkdtemp(prefix="bench_low_memory_out_")
+    try:
+        t0 = time.perf_counter()
+        gc.process_folder(folder, output_root=out, write_csv=False, results_path=os.path.join(out, "resultados.csv"),
+                          batch_size=config["batch_size"], workers=config["workers"])
+        elapsed = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(out, ignore_errors=True)
+    n = len(os.listdir(folder))
+    return {"imagenes": n, "segundos": elapsed, "imagenes_por_s": n / elapsed, "rss_modelo_mb": base,
+            "rss_final_mb": current_rss_mb(), "pico_rss_mb": peak_rss_mb()}
+
+
+def measure(config, args, folder):
+    """Corre run_trial en un subproceso (el pico de RSS es por proceso); None si falló."""
+    cmd = [sys.executable, "-m", "benchmarks.bench_low_memory", "--trial", json.dumps(config), "--folder", folder,
+           "--alpha", str(args.alpha)]
+    proc = subprocess.run(cmd, capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        print(f"[ERROR] Falló la corrida {config}: {proc.stderr.strip().splitlines()[-1:] or proc.returncode}")
+        return None
+    return json.loads(lines[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=2000, help="Imágenes de la carpeta sintética")
+    parser.add_argument("--size", default="2048x1536", help="Tamaño de las imágenes ANCHOxALTO")
+    parser.add_argument("--alpha", type=float, default=0.35, help="Ancho del MobileNetV2 sintético")
+    parser.add_argument("--max-rss-mb", type=float, default=1500, help="Techo de RSS del modo de poca memoria")
+    parser.add_argument("--compare", action="store_true", help="Medir también la configuración normal")
+    parser.add_argument("--json", default=None, help="Archivo JSON con los resultados")
+    # uso interno: un modo en este proceso
+    parser.add_argument("--trial", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--folder", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.trial:
+        print(json.dumps(run_trial(json.loads(args.trial), args.folder, alpha=args.alpha)))
+        return 0
+
+    normal = dict(default_runtime_config(), low_memory=0, batch_size=8)
+    modes = [("poca_memoria", low_memory_profile(normal))]
+    if args.compare:
+        modes.append(("normal", normal))
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    workdir = tempfile.mkdtemp(prefix="bench_low_memory_")
+    cases = []
+    try:
+        folder = os.path.join(workdir, "imagenes")
+        write_synthetic_folder(folder, args.images, height, width, distinct=min(args.images, 8))
+        print(f"[INFO] {args.images} imágenes {args.size} | RAM total {total_memory_mb() or 0:.0f} MB")
+        for name, config in modes:
+            case = measure(config, args, folder)
+            if case is None:
+                return 1
+            case.update(modo=name, config=config)
+            cases.append(case)
+            print(f"[INFO] {name:>12s}: pico RSS {case['pico_rss_mb']:7.0f} MB (modelo {case['rss_modelo_mb']:.0f} MB, "
+                  f"final {case['rss_final_mb']:.0f} MB) | {case['imagenes_por_s']:.2f} img/s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        report = {
+            "fecha": datetime.now().isoformat(),
+            "plataforma": platform.platform(),
+            "tamano": args.size,
+            "techo_rss_mb": args.max_rss_mb,
+            "casos": cases,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Resultados en {os.path.abspath(args.json)}")
+    peak = cases[0]["pico_rss_mb"]
+    if peak > args.max_rss_mb:
+        print(f"[ERROR] El modo de poca memoria superó el techo: {peak:.0f} MB > {args.max_rss_mb:.0f} MB")
+        return 1
+    print(f"[OK] Modo de poca memoria dentro del techo: {peak:.0f} MB <= {args.max_rss_mb:.0f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asignaciones de memoria del preprocesado por lotes: camino anterior (redimensionar cada imagen
+a un array nuevo, astype(float32) / 255, np.stack y tf.convert_to_tensor en float32) contra el
+actual (redimensionar dentro del buffer uint8 preasignado del lote y normalizar dentro de TF).
+Con tracemalloc mide, por lote, los bytes asignados de forma transitoria (pico del lote sobre lo
+ya asignado) y suma el total de la corrida ("churn"); además informa los bytes que pasan al
+runtime de TF por lote. La lectura y la conversión a RGB son iguales en ambos casos y quedan
+fuera de la medición: se decodifican unas pocas imágenes sintéticas una vez y se reutilizan.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_memory --images 10000 --batch-size 8 --json bench_memory.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import shutil
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from benchmarks.synthetic import build_synthetic_model, write_synthetic_folder
+from gradcam_visualizer import GradCAMVisualizer, MODEL_INPUT_SIZE
+
+
+def legacy_batch(origs_rgb):
+    """Camino anterior: copia redimensionada, copia float32 normalizada, np.stack y copia float32 a TF."""
+    inputs = [cv2.resize(rgb, MODEL_INPUT_SIZE).astype(np.float32) / 255.0 for rgb in origs_rgb]
+    return tf.convert_to_tensor(np.stack(inputs), dtype=tf.float32)
+
+
+def buffered_batch(gc, origs_rgb):
+    """Camino actual: redimensionado dentro del buffer uint8 del lote, normalización dentro de TF."""
+    batch = gc._input_buffer(len(origs_rgb))
+    for j, rgb in enumerate(origs_rgb):
+        gc.resize_for_model(rgb, out=batch[j])
+    return gc._model_input(batch)
+
+
+def run_case(name, make_batch, decoded, n_images, batch_size, forward=None):
+    """Corre n_images en lotes de batch_size con tracemalloc y devuelve las métricas del caso."""
+    transient = []
+    transferred = 0
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for start in range(0, n_images, batch_size):
+        n = min(batch_size, n_images - start)
+        origs = [decoded[(start + j) % len(decoded)] for j in range(n)]
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        x = make_batch(origs)
+        if forward is not None:
+            forward(x)
+        _, peak = tracemalloc.get_traced_memory()
+        transient.append(peak - before)
+        # bytes que recibe el runtime en la conversión (float32 antes, uint8 ahora)
+        transferred += n * MODEL_INPUT_SIZE[0] * MODEL_INPUT_SIZE[1] * 3 * (4 if name == "antes" else 1)
+        del x
+    elapsed = time.perf_counter() - t0
+    _, peak_total = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    transient = np.asarray(transient, dtype=np.float64)
+    return {
+        "caso": name,
+        "imagenes": n_images,
+        "batch_size": batch_size,
+        "churn_total_mb": float(transient.sum() / 2 ** 20),
+        "transitorio_por_lote_mb_p50": float(np.percentile(transient, 50) / 2 ** 20),
+        "transitorio_por_lote_mb_max": float(transient.max() / 2 ** 20),
+        "pico_mb": float(peak_total / 2 ** 20),
+        "transferido_a_tf_mb": transferred / 2 ** 20,
+        "ms_por_imagen": elapsed * 1000.0 / n_images,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=10000, help="Imágenes por caso")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--size", default="2048x1536", help="Tamaño de las imágenes ANCHOxALTO")
+    parser.add_argument("--distinct", type=int, default=4, help="Imágenes distintas decodificadas y reutilizadas")
+    parser.add_argument("--forward", action="store_true", help="Incluir el forward del modelo sintético")
+    parser.add_argument("--alpha", type=float, default=0.35, help="Ancho del MobileNetV2 sintético")
+    parser.add_argument("--json", default="bench_memory.json", help="Archivo JSON de salida")
+    args = parser.parse_args(argv)
+
+    gc = GradCAMVisualizer(build_synthetic_model(alpha=args.alpha), target_layer_name="Conv_1")
+    forward = (lambda x: gc.sequential_model(x, training=False)) if args.forward else None
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    workdir = tempfile.mkdtemp(prefix="bench_memory_")
+    try:
+        paths = write_synthetic_folder(workdir, args.distinct, height, width)
+        decoded = [gc.load_image(p) for p in paths]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    cases = [("antes", legacy_batch), ("despues", lambda origs: buffered_batch(gc, origs))]
+    report = {
+        "fecha": datetime.now().isoformat(),
+        "plataforma": platform.platform(),
+        "tensorflow": tf.__version__,
+        "opencv": cv2.__version__,
+        "tamano": args.size,
+        "forward": args.forward,
+        "casos": [],
+    }
+    for name, make_batch in cases:
+        # calentamiento: trazado de _normalize y primeras asignaciones
+        run_case(name, make_batch, decoded, 2 * args.batch_size, args.batch_size, forward)
+        case = run_case(name, make_batch, decoded, args.images, args.batch_size, forward)
+        report["casos"].append(case)
+        print(f"{name:>8s}: churn {case['churn_total_mb']:10.1f} MB | por lote p50 "
+              f"{case['transitorio_por_lote_mb_p50']:7.2f} MB | a TF {case['transferido_a_tf_mb']:8.1f} MB | "
+              f"{case['ms_por_imagen']:.2f} ms/imagen")
+
+    json_path = os.path.abspath(args.json)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Resultados en {json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de escritura y relectura de resultados:
+un CSV por imagen (<nombre>_datos.csv) vs archivo consolidado (Parquet / CSV).
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_results_store --n 50000
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from utils.results_store import ResultsWriter, read_results, result_to_row, write_image_csv, pq
+
+
+def synthetic_results(n, seed=0):
+    """Genera n diccionarios con la misma forma que devuelve process_image."""
+    rng = np.random.default_rng(seed)
+    probs = rng.random(n)
+    areas = rng.random(n) * 0.3
+    for i in range(n):
+        urg = float((probs[i] + areas[i]) / 2.0)
+        yield {
+            "image": f"/datos/camara/IMG_{i:06d}.jpg",
+            "overlay_path": f"resultados/IMG_{i:06d}/IMG_{i:06d}_overlay.png",
+            "heatmap_puro_path": f"resultados/IMG_{i:06d}/IMG_{i:06d}_heatmap_puro.png",
+            "csv_path": None,
+            "probabilidad": float(probs[i]),
+            "centro": (float(rng.integers(0, 2000)), float(rng.integers(0, 1500))),
+            "bbox": (10, 20, 800, 900),
+            "tamano_zona_activa": float(areas[i]),
+            "nivel_urgencia": urg,
+            "nivel_urgencia_label": "ALTA" if urg >= 0.75 else "MEDIA" if urg >= 0.5 else "BAJA",
+        }
+
+
+def bench_per_image_csv(results, workdir):
+    t0 = time.perf_counter()
+    for res in results:
+        name = os.path.splitext(os.path.basename(res["image"]))[0]
+        folder = os.path.join(workdir, name)
+        os.makedirs(folder, exist_ok=True)
+        write_image_csv(os.path.join(folder, f"{name}_datos.csv"), result_to_row(res))
+    t_write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    files = glob.glob(os.path.join(workdir, "*", "*_datos.csv"))
+    df = pd.concat((pd.read_csv(f) for f in files), ignore_index=True)
+    t_read = time.perf_counter() - t0
+    return t_write, t_read, len(df)
+
+
+def bench_consolidated(results, path):
+    t0 = time.perf_counter()
+    with ResultsWriter(path) as writer:
+        writer.extend(results)
+    t_write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    df = read_results(writer.path)
+    t_read = time.perf_counter() - t0
+
+    # lectura de una sola columna (caso típico: ranking por urgencia)
+    t0 = time.perf_counter()
+    read_results(writer.path, columns=["nivel_urgencia"])
+    t_read_col = time.perf_counter() - t0
+    return t_write, t_read, t_read_col, len(df), os.path.getsize(writer.path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=50000, help="Cantidad de resultados sintéticos")
+    parser.add_argument("--skip-per-image", action="store_true", help="No medir el modo un-CSV-por-imagen (lento)")
+    parser.add_argument("--json", default=None, help="Guardar las mediciones en este archivo JSON")
+    args = parser.parse_args()
+
+    results = list(synthetic_results(args.n))
+    report = {"n": args.n}
+    workdir = tempfile.mkdtemp(prefix="bench_results_")
+    try:
+        if not args.skip_per_image:
+            w, r, rows = bench_per_image_csv(results, os.path.join(workdir, "por_imagen"))
+            report["csv_por_imagen"] = {"escritura_s": w, "lectura_s": r, "filas": rows}
+            print(f"CSV por imagen      escritura {w:8.2f}s  lectura {r:8.2f}s  ({rows} filas)")
+
+        formatos = [".csv"] + ([".parquet"] if pq is not None else [])
+        for ext in formatos:
+            w, r, rc, rows, size = bench_consolidated(results, os.path.join(workdir, "corrida" + ext))
+            report["consolidado" + ext] = {
+                "escritura_s": w, "lectura_s": r, "lectura_columna_s": rc, "filas": rows, "bytes": size
+            }
+            print(f"Consolidado {ext:8s} escritura {w:8.2f}s  lectura {r:8.2f}s  "
+                  f"1 columna {rc:6.3f}s  ({rows} filas, {size / 1e6:.1f} MB)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark por etapas del pipeline con un modelo sintético (no requiere el .h5).
+Corre iter_process tal cual (el mismo código que la app y la CLI, con --tta si se pide) y
+reporta los tiempos por etapa que registra utils.metrics: lectura, redimensionado, forward,
+backward, heatmap a tamaño original, zona activa, overlay, escritura de imágenes y CSV, más
+el agregado al historial, para varios tamaños de imagen y de lote. Guarda el resultado en
+JSON para comparar entre commits.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_stages --sizes 1024x768 2048x1536 --batch-sizes 1 8 --json bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+from datetime import datetime
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from benchmarks.synthetic import build_synthetic_model, write_synthetic_folder
+from gradcam_visualizer import GradCAMVisualizer
+from utils.image_utils import OutputSettings
+from utils.metrics import PipelineMetrics, MemorySink
+from utils.tta import TestTimeAugmentation
+
+# orden del reporte; las etapas opcionales (tta, shadow...) que aparezcan se agregan al final
+STAGES = ["decode", "resize", "forward", "backward", "heatmap_resize", "active_zone",
+          "overlay", "write_images", "write_csv", "history_append"]
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _summary(values_ms):
+    arr = np.asarray(values_ms, dtype=np.float64)
+    return {
+        "media_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "n": int(arr.size),
+    }
+
+
+def run_case(gc, paths, batch_size, workdir, settings, workers=1, threshold=0.7, circle_radius=25):
+    """
+    Corre el pipeline de producción (iter_process) sobre `paths` en lotes de batch_size y junta
+    los tiempos por etapa que PipelineMetrics registra para cada imagen (las etapas del modelo
+    se miden por lote y se reparten por imagen), más el agregado al historial como en la app.
+    Devuelve {etapa: [ms por imagen, ...]}.
+    """
+    from utils import history_utils
+    times = defaultdict(list)
+    out_root = os.path.join(workdir, "salida")
+    sink = MemorySink(maxlen=None)
+    gc.metrics = PipelineMetrics(sinks=[sink])
+    for path, res, err in gc.iter_process(paths, output_root=out_root, threshold=threshold,
+                                          circle_radius=circle_radius, output_settings=settings,
+                                          batch_size=batch_size, workers=workers):
+        if err is not None:
+            raise err
+        t0 = time.perf_counter()
+        history_utils.append_record(history_utils.result_to_record(res))
+        times["history_append"].append((time.perf_counter() - t0) * 1000)
+    for record in sink.records:
+        for stage, ms in record["tiempos_ms"].items():
+            times[stage].append(ms)
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1024x768", "2048x1536", "3072x2048"],
+                        help="Tamaños de imagen ANCHOxALTO")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--images", type=int, default=16, help="Imágenes por caso")
+    parser.add_argument("--alpha", type=float, default=0.35, help="Ancho del MobileNetV2 sintético")
+    parser.add_argument("--workers", type=int, default=1, help="Hilos de lectura y escritura de iter_process")
+    parser.add_argument("--tta", action="store_true", help="Con TTA en los casos cerca de 0.5 (ver utils.tta)")
+    parser.add_argument("--format", choices=["png", "jpeg", "webp"], default="png")
+    parser.add_argument("--json", default="bench_stages.json", help="Archivo JSON de salida")
+    args = parser.parse_args(argv)
+
+    model = build_synthetic_model(alpha=args.alpha)
+    gc = GradCAMVisualizer(model, target_layer_name="Conv_1", tta=TestTimeAugmentation() if args.tta else None)
+    # trazado del grafo para cada tamaño de lote, fuera de la medición
+    gc.warm_up(batch_sizes=tuple(args.batch_sizes))
+    settings = OutputSettings(args.format)
+
+    report = {
+        "fecha": datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "plataforma": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "tensorflow": tf.__version__,
+        "opencv": cv2.__version__,
+        "modelo_alpha": args.alpha,
+        "formato": args.format,
+        "workers": args.workers,
+        "tta": args.tta,
+        "casos": [],
+    }
+
+    json_path = os.path.abspath(args.json)
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_stages_")
+    try:
+        # el historial usa rutas relativas ("resultados/master_history.csv"): se aísla en workdir
+        os.chdir(workdir)
+        for size in args.sizes:
+            width, height = (int(v) for v in size.lower().split("x"))
+            paths = write_synthetic_folder(os.path.join(workdir, f"in_{size}"), args.images, height, width, distinct=4)
+            # calentamiento: trazado del grafo y primeras asignaciones
+            run_case(gc, paths[:2], 2, workdir, settings, workers=args.workers)
+            for bs in args.batch_sizes:
+                times = run_case(gc, paths, bs, workdir, settings, workers=args.workers)
+                names = [s for s in STAGES if times.get(s)] + sorted(set(times) - set(STAGES))
+                stages = {s: _summary(times[s]) for s in names}
+                total = sum(v["media_ms"] for v in stages.values())
+                report["casos"].append({"tamano": size, "batch_size": bs, "etapas": stages,
+                                        "total_media_ms": total, "imagenes_por_s": 1000.0 / total if total else 0.0})
+                print(f"{size:>10s} lote {bs:2d}: {total:8.1f} ms/imagen  " +
+                      "  ".join(f"{s}={stages[s]['media_ms']:.1f}" for s in names))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Resultados en {json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prueba de resistencia (soak) de una sesión larga: procesa miles de retinografías sintéticas de
+a una por el mismo camino que "Cargar imagen y detectar" de la app (MainWindow.analyze_image:
+process_image, historial, pixmaps del detalle y refresco del historial; con --headless, sin Qt)
+y cada --sample-every imágenes toma una muestra de utils.resource_monitor. Al final estima la
+deriva de RSS por cada 1000 imágenes, la de handles abiertos e hilos y la de la latencia p50
+de cada paso completo (análisis más refresco de la ventana: detecta p. ej. trabajo que crece
+con el historial), y lista los tipos de objeto que crecieron. Termina con
+código 1 si la deriva supera los límites, así sirve como control en la máquina de integración.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.soak_test --images 3000 --json soak.json
+    python -m benchmarks.soak_test --images 500 --headless --size 1024x768
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic import build_synthetic_model, write_synthetic_folder
+from utils.resource_monitor import ResourceMonitor
+
+
+def headless_step(gc):
+    """Mismo trabajo por imagen que analyze_image, sin la ventana."""
+    from utils.history_utils import append_record, read_master, result_to_record
+
+    def _step(path):
+        res = gc.process_image(path, output_root="resultados")
+        append_record(result_to_record(res))
+        read_master()
+    return _step
+
+
+def gui_step(gc, monitor):
+    """analyze_image de una MainWindow fuera de pantalla, con el event loop procesado después de cada imagen."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    from views.main_windows import MainWindow
+    app = QApplication.instance() or QApplication([])
+    window = MainWindow(gc)
+    window.set_resource_monitor(monitor)
+    window.show()
+
+    def _step(path):
+        window.analyze_image(path)
+        app.processEvents()
+    return _step, window
+
+
+def drift_per_1000(samples, key):
+    """Pendiente de key contra las imágenes procesadas, por cada 1000 imágenes (None con menos de 3 muestras)."""
+    pts = [(s["imagenes"], s[key]) for s in samples if s.get(key) is not None]
+    if len(pts) < 3:
+        return None
+    x, y = np.asarray(pts, dtype=np.float64).T
+    return float(np.polyfit(x, y, 1)[0] * 1000.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=3000, help="Imágenes a procesar (de a una)")
+    parser.add_argument("--distinct", type=int, default=16, help="Imágenes sintéticas distintas (se repiten)")
+    parser.add_argument("--size", default="2048x1536", help="Tamaño de las imágenes ANCHOxALTO")
+    parser.add_argument("--model", default=None, help="Modelo .h5 real (por defecto, el sintético)")
+    parser.add_argument("--alpha", type=float, default=0.35, help="Ancho del MobileNetV2 sintético")
+    parser.add_argument("--headless", action="store_true", help="Sin la ventana de Qt")
+    parser.add_argument("--warmup", type=int, default=200, help="Imágenes iniciales que no cuentan para la deriva")
+    parser.add_argument("--sample-every", type=int, default=50, help="Imágenes entre muestras de recursos")
+    parser.add_argument("--max-rss-mb-per-1000", type=float, default=20.0,
+                        help="Deriva máxima de RSS por cada 1000 imágenes")
+    parser.add_argument("--max-handles-per-1000", type=float, default=5.0,
+                        help="Deriva máxima de handles abiertos por cada 1000 imágenes")
+    parser.add_argument("--max-latency-ms-per-1000", type=float, default=100.0,
+                        help="Deriva máxima de la latencia p50 de cada paso (ms) por cada 1000 imágenes")
+    parser.add_argument("--json", default=None, help="Archivo JSON con las muestras y el resultado")
+    args = parser.parse_args(argv)
+
+    from gradcam_visualizer import GradCAMVisualizer
+    from utils.metrics import PipelineMetrics
+    from utils.quality import QualityGate
+    if args.model:
+        from tensorflow import keras
+        model = keras.models.load_model(os.path.abspath(args.model), compile=False)
+    else:
+        model = build_synthetic_model(alpha=args.alpha)
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    workdir = tempfile.mkdtemp(prefix="soak_")
+    cwd = os.getcwd()
+    json_path = os.path.abspath(args.json) if args.json else None
+    window = None
+    try:
+        paths = write_synthetic_folder(os.path.join(workdir, "imagenes"), args.distinct, height, width)
+        # resultados/ (historial e imágenes generadas) queda dentro de la carpeta temporal
+        os.chdir(workdir)
+        metrics = PipelineMetrics()
+        # misma configuración que la app: control de calidad en modo flag
+        gc = GradCAMVisualizer(model, target_layer_name="Conv_1", metrics=metrics, quality_gate=QualityGate(mode="flag"))
+        n_samples = max(3, (args.images - args.warmup) // max(1, args.sample_every))
+        monitor = ResourceMonitor(interval_s=0, metrics=metrics, log_path=os.path.join(workdir, "recursos.jsonl"),
+                                  window=n_samples + 1, trend_window=n_samples + 1)
+        if args.headless:
+            step = headless_step(gc)
+        else:
+            step, window = gui_step(gc, monitor)
+        print(f"[INFO] Soak: {args.images} imágenes {args.size} ({'sin ventana' if args.headless else 'con ventana'}), "
+              f"muestra cada {args.sample_every}")
+
+        t0 = time.perf_counter()
+        step_ms = []
+        for i in range(args.images):
+            t_step = time.perf_counter()
+            step(paths[i % len(paths)])
+            step_ms.append((time.perf_counter() - t_step) * 1000.0)
+            done = i + 1
+            if done == args.warmup or (done > args.warmup and (done - args.warmup) % args.sample_every == 0):
+                # latencia del paso completo (incluye historial y refresco de la ventana, que no
+                # entran en las métricas del pipeline) sobre las imágenes desde la muestra anterior
+                s = monitor.sample(imagenes=done, paso_p50_ms=float(np.median(step_ms)))
+                step_ms = []
+                print(f"[INFO] {done:6d} imágenes | RSS {s['rss_mb']:7.1f} MB | handles {s['handles']} | "
+                      f"objetos {s.get('objetos')} | p50 paso {s['paso_p50_ms']:.0f} ms")
+        elapsed = time.perf_counter() - t0
+        report = monitor.report()
+        samples = list(monitor.samples)
+        monitor.close()
+    finally:
+        os.chdir(cwd)
+        if window is not None:
+            window.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rss_drift = drift_per_1000(samples, "rss_mb")
+    handle_drift = drift_per_1000(samples, "handles")
+    latency_drift = drift_per_1000(samples, "paso_p50_ms")
+    thread_rise = samples[-1]["hilos"] - samples[0]["hilos"] if samples else 0
+    print(f"[INFO] {args.images / elapsed:.2f} img/s | deriva RSS {rss_drift or 0.0:+.1f} MB/1000 imágenes | "
+          f"handles {handle_drift or 0.0:+.1f}/1000 | latencia p50 {latency_drift or 0.0:+.1f} ms/1000 | "
+          f"hilos {thread_rise:+d}")
+    for t in report["tipos_en_crecimiento"]:
+        print(f"[INFO]   tipo en crecimiento: {t['tipo']} {t['subida']:+.0f}")
+
+    failures = []
+    if rss_drift is not None and rss_drift > args.max_rss_mb_per_1000:
+        failures.append(f"RSS {rss_drift:+.1f} MB/1000 imágenes > {args.max_rss_mb_per_1000}")
+    if handle_drift is not None and handle_drift > args.max_handles_per_1000:
+        failures.append(f"handles {handle_drift:+.1f}/1000 imágenes > {args.max_handles_per_1000}")
+    if latency_drift is not None and latency_drift > args.max_latency_ms_per_1000:
+        failures.append(f"latencia p50 {latency_drift:+.1f} ms/1000 imágenes > {args.max_latency_ms_per_1000}")
+    if thread_rise > 0:
+        failures.append(f"hilos {thread_rise:+d}")
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "fecha": datetime.now().isoformat(),
+                "plataforma": platform.platform(),
+                "imagenes": args.images,
+                "tamano": args.size,
+                "con_ventana": not args.headless,
+                "imagenes_por_s": args.images / elapsed,
+                "deriva_rss_mb_por_1000": rss_drift,
+                "deriva_handles_por_1000": handle_drift,
+                "deriva_latencia_p50_ms_por_1000": latency_drift,
+                "fallas": failures,
+                "reporte": report,
+                "muestras": samples,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] Resultados en {json_path}")
+    if failures:
+        print("[ERROR] Deriva por encima del límite: " + "; ".join(failures))
+        return 1
+    print("[OK] Sin deriva de recursos por encima de los límites")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# benchmarks/synthetic.py
+"""
+Modelo e imágenes sintéticas para medir el pipeline sin el modelo .h5 propietario.
+"""
+
+import os
+import cv2
+import numpy as np
+
+
+def build_synthetic_model(alpha=0.35, seed=0):
+    """
+    Modelo secuencial con la misma forma que el de la app: MobileNetV2 (sin pesos
+    preentrenados) + GlobalAveragePooling2D + Dense(1, sigmoid). Incluye la capa Conv_1.
+    """
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(seed)
+    base = tf.keras.applications.MobileNetV2(input_shape=(224, 224, 3), alpha=alpha,
+                                             include_top=False, weights=None)
+    model = tf.keras.Sequential([
+        base,
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(1, activation="sigmoid", kernel_initializer="random_normal"),
+    ])
+    model.build((None, 224, 224, 3))
+    return model
+
+
+def synthetic_fundus(height=1536, width=2048, seed=0):
+    """
+    Imagen BGR uint8 con aspecto de retinografía: fondo negro, disco rojizo circular,
+    disco óptico brillante, vasos oscuros y ruido del sensor.
+    """
+    rng = np.random.default_rng(seed)
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    cy, cx = height // 2, width // 2
+    radius = int(min(height, width) * 0.46)
+
+    # retina: gradiente radial rojo-anaranjado
+    yy, xx = np.ogrid[:height, :width]
+    dist = np.sqrt((yy - cy) ** 2 + (xx - cx) ** 2) / radius
+    inside = dist <= 1.0
+    shade = np.clip(1.0 - 0.45 * dist, 0, 1)
+    img[..., 2] = (inside * shade * 200).astype(np.uint8)
+    img[..., 1] = (inside * shade * 90).astype(np.uint8)
+    img[..., 0] = (inside * shade * 40).astype(np.uint8)
+
+    # disco óptico
+    od_x = cx + int(radius * rng.uniform(0.25, 0.45)) * (1 if rng.random() < 0.5 else -1)
+    od_y = cy + int(radius * rng.uniform(-0.1, 0.1))
+    od_r = max(4, int(radius * rng.uniform(0.10, 0.16)))
+    cv2.circle(img, (od_x, od_y), od_r, (150, 220, 250), -1)
+
+    # vasos: curvas oscuras que salen del disco óptico
+    for _ in range(10):
+        pts = [(od_x, od_y)]
+        ang = rng.uniform(0, 2 * np.pi)
+        for _ in range(6):
+            ang += rng.uniform(-0.4, 0.4)
+            step = radius * 0.18
+            pts.append((int(pts[-1][0] + step * np.cos(ang)), int(pts[-1][1] + step * np.sin(ang))))
+        thickness = max(1, int(radius * rng.uniform(0.006, 0.014)))
+        cv2.polylines(img, [np.array(pts, dtype=np.int32)], False, (20, 30, 110), thickness)
+
+    # ruido del sensor solo dentro del disco
+    noise = rng.normal(0, 6, img.shape).astype(np.int16)
+    img = np.clip(img.astype(np.int16) + noise * inside[..., None], 0, 255).astype(np.uint8)
+    return img
+
+
+def write_synthetic_folder(folder, n, height=1536, width=2048, ext=".jpg", seed=0, distinct=None):
+    """
+    Escribe n retinografías sintéticas en folder y devuelve la lista de rutas.
+    distinct: cantidad de imágenes diferentes a generar; el resto son copias
+              (generar miles de imágenes únicas es lento y no cambia las mediciones)
+    """
+    os.makedirs(folder, exist_ok=True)
+    distinct = n if distinct is None else max(1, min(n, distinct))
+    encoded = []
+    for i in range(distinct):
+        ok, buf = cv2.imencode(ext, synthetic_fundus(height, width, seed=seed + i))
+        encoded.append(buf.tobytes())
+    paths = []
+    for i in range(n):
+        path = os.path.join(folder, f"sintetica_{i:05d}{ext}")
+        with open(path, "wb") as f:
+            f.write(encoded[i % distinct])
+        paths.append(path)
+    return paths
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Detección de glaucoma por línea de comandos (sin interfaz gráfica ni Qt).
+Escribe un registro JSON por imagen (JSON Lines) en stdout o en un archivo.
+
+Ejemplos:
+    python cli.py imagenes/ --output corrida.jsonl
+    python cli.py "capturas/**/*.jpg" --batch-size 16 --workers 4 --output-mode lazy
+    python cli.py --list pendientes.txt --output corrida.jsonl --resume
+    python cli.py archivo/ --recursive --exclude "*/descartadas/*" --output corrida.jsonl
+    python cli.py archivo/ --model nuevo.h5 --output-mode none --tensor-cache --output repuntuado.jsonl
+"""
+
+import os
+import sys
+import glob
+import json
+import logging
+import argparse
+import contextlib
+
+from utils.file_utils import IMAGE_EXTENSIONS, default_model_path, scan_images
+from utils.image_utils import OutputSettings
+from utils.results_store import ResultsWriter, to_jsonable
+from utils.metrics import PipelineMetrics, JsonLinesSink, LoggingSink
+from utils.quality import QualityGate, QUALITY_REJECTED, estimate_saved_ms
+from utils.tensor_cache import TensorCache, TENSOR_CACHE_DIR
+from utils.tta import TestTimeAugmentation, DEFAULT_TTA_MARGIN
+from utils.shadow import ShadowEvaluator, SHADOW_LOG
+from utils.model_registry import ModelRegistry, short_fingerprint
+from utils.runtime_config import load_runtime_config, apply_runtime_config, low_memory_profile
+from utils.memory import peak_rss_mb
+from utils.logging_setup import setup_logging
+
+log = logging.getLogger(__name__)
+
+
+def expand_inputs(inputs, list_files=(), recursive=False, include=None, exclude=None, follow_symlinks=False,
+                  sort=False):
+    """
+    Expande carpetas, patrones glob y listas de archivos a rutas de imagen.
+    Las carpetas se escanean de forma incremental (ver utils.file_utils.scan_images),
+    así el procesamiento empieza sin esperar a listar el árbol completo.
+    Las rutas repetidas se devuelven una sola vez, en el orden en que aparecen.
+    """
+    seen = set()
+
+    def _emit(path):
+        if path not in seen:
+            seen.add(path)
+            yield path
+
+    for list_file in list_files:
+        with open(list_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    yield from _emit(line)
+
+    for item in inputs:
+        if os.path.isdir(item):
+            for path in scan_images(item, recursive=recursive, include=include, exclude=exclude,
+                                    follow_symlinks=follow_symlinks, sort=sort):
+                yield from _emit(path)
+        elif glob.has_magic(item):
+            for path in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                    yield from _emit(path)
+        else:
+            yield from _emit(item)
+
+
+def read_done(jsonl_path):
+    """Imágenes ya procesadas sin error en un archivo JSON Lines previo (para --resume)."""
+    done = set()
+    if not jsonl_path or not os.path.exists(jsonl_path):
+        return done
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # última línea cortada por una interrupción
+            if rec.get("image") and not rec.get("error"):
+                done.add(rec["image"])
+    return done
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="Carpetas, patrones glob o imágenes")
+    parser.add_argument("--list", dest="list_files", action="append", default=[],
+                        help="Archivo de texto con una ruta de imagen por línea (repetible)")
+    parser.add_argument("--recursive", "-r", action="store_true", help="Incluir subcarpetas de las carpetas indicadas")
+    parser.add_argument("--include", action="append", default=None,
+                        help="Patrón glob de imágenes a incluir dentro de las carpetas (repetible)")
+    parser.add_argument("--exclude", action="append", default=None,
+                        help="Patrón glob de archivos o subcarpetas a omitir (repetible)")
+    parser.add_argument("--follow-symlinks", action="store_true", help="Seguir enlaces simbólicos al escanear")
+    parser.add_argument("--sort", action="store_true",
+                        help="Ordenar por nombre dentro de cada carpeta (por defecto, orden del sistema de archivos)")
+    parser.add_argument("--model", default=None,
+                        help="Ruta del modelo .h5 o entrada del registro (fingerprint, nombre o nombre:version); "
+                             "por defecto el de la app")
+    parser.add_argument("--register", action="store_true", help="Agregar --model al registro de modelos")
+    parser.add_argument("--target-layer", default="Conv_1",
+                        help="Capa objetivo para Grad-CAM; varias separadas por comas (p. ej. Conv_1,block_16_project) "
+                             "se calculan con un solo forward y se fusionan")
+    parser.add_argument("--layer-fusion", choices=["mean", "product"], default="mean",
+                        help="Fusión de los heatmaps con varias capas objetivo")
+    parser.add_argument("--output-root", default="resultados", help="Carpeta de resultados por imagen")
+    parser.add_argument("--output", default="-", help="Archivo JSON Lines de salida ('-' = stdout)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Omitir las imágenes ya presentes en --output y agregar al final")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Imágenes por llamada al modelo (por defecto, la configuración de ejecución)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Hilos para lectura y escritura de imágenes (por defecto, la configuración de ejecución)")
+    parser.add_argument("--runtime-config", default=None,
+                        help="JSON con hilos de TF/OpenCV, workers y lote (por defecto resultados/runtime_config.json, "
+                             "ver benchmarks.autotune)")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="Modo de poca memoria (equipos de 4 GB): lote de hasta 4, un worker y heatmaps float16; "
+                             "se activa solo si la configuración de ejecución lo indica")
+    parser.add_argument("--output-mode", choices=["full", "lazy", "none"], default="full",
+                        help="full: overlay y heatmap; lazy: solo heatmap cacheado; none: sin imágenes")
+    parser.add_argument("--format", choices=["png", "jpeg", "webp"], default="png", help="Formato de imágenes")
+    parser.add_argument("--quality", type=int, default=90, help="Calidad JPEG/WebP (1-100)")
+    parser.add_argument("--png-compression", type=int, default=None, help="Compresión PNG (0-9)")
+    parser.add_argument("--max-dim", type=int, default=None, help="Lado máximo de las imágenes guardadas")
+    parser.add_argument("--threshold", type=float, default=0.7, help="Umbral del heatmap para la zona activa")
+    parser.add_argument("--prob-threshold", type=float, default=0.5,
+                        help="Probabilidad a partir de la cual se marca 'detectado'")
+    parser.add_argument("--circle-radius", type=int, default=25, help="Radio del círculo en el overlay")
+    parser.add_argument("--quality-gate", choices=["off", "flag", "reject"], default="off",
+                        help="Control de calidad previo: flag marca las imágenes dudosas, reject no las procesa")
+    parser.add_argument("--tensor-cache", nargs="?", const=TENSOR_CACHE_DIR, default=None, metavar="DIR",
+                        help="Caché de entradas preprocesadas (por hash de contenido); con --output-mode lazy/none "
+                             "las imágenes cacheadas no se decodifican. Útil para repuntuar con otro --model "
+                             f"(por defecto {TENSOR_CACHE_DIR})")
+    parser.add_argument("--tta", action="store_true",
+                        help="Promediar espejo y rotaciones pequeñas en los casos cerca de 0.5 e informar la incertidumbre")
+    parser.add_argument("--tta-margin", type=float, default=DEFAULT_TTA_MARGIN,
+                        help="Con --tta, distancia máxima a 0.5 de la probabilidad para aplicarla")
+    parser.add_argument("--shadow-model", default=None,
+                        help="Modelo candidato evaluado en sombra sobre los mismos lotes (no cambia los resultados)")
+    parser.add_argument("--shadow-log", default=SHADOW_LOG, help="JSON Lines de la evaluación en sombra")
+    parser.add_argument("--no-csv", action="store_true", help="No escribir <nombre>_datos.csv por imagen")
+    parser.add_argument("--results-file", default=None, help="Archivo consolidado .parquet/.csv de la corrida")
+    parser.add_argument("--history", action="store_true", help="Agregar cada resultado al historial de la app")
+    parser.add_argument("--metrics-log", default=None, help="Archivo JSON Lines con los tiempos por etapa de cada imagen")
+    return parser
+
+
+def load_visualizer(model_path, target_layer, output_settings, metrics=None, quality_gate=None, tensor_cache=None,
+                    layer_fusion="mean", tta=None, shadow=None, low_memory=False):
+    # import diferido: --help no necesita cargar TensorFlow
+    from tensorflow import keras
+    from gradcam_visualizer import GradCAMVisualizer
+    model = keras.models.load_model(model_path, compile=False)
+    layers = [name.strip() for name in target_layer.split(",") if name.strip()]
+    return GradCAMVisualizer(model, target_layer_name=layers, output_settings=output_settings, metrics=metrics,
+                             quality_gate=quality_gate, tensor_cache=tensor_cache, layer_fusion=layer_fusion, tta=tta,
+                             shadow=shadow, model_fingerprint=short_fingerprint(model_path), low_memory=low_memory)
+
+
+def resolve_model(model, register=False):
+    """Ruta del modelo: archivo existente o entrada del registro; con register lo agrega al registro."""
+    if model is None:
+        return default_model_path()
+    if os.path.exists(model):
+        if register:
+            entry = ModelRegistry().register(model)
+            log.info("Modelo registrado: %s", ModelRegistry.label(entry))
+        return model
+    entry = ModelRegistry().find(model)
+    if entry is None:
+        raise FileNotFoundError(f"Modelo no encontrado (ni archivo ni entrada del registro): {model}")
+    log.info("Modelo del registro: %s", ModelRegistry.label(entry))
+    return entry["ruta"]
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.inputs and not args.list_files:
+        print("[ERROR] Indique al menos una carpeta, patrón o --list", file=sys.stderr)
+        return 2
+    # logs en JSON (resultados/logs/app.jsonl); en consola van a stderr
+    setup_logging()
+
+    done = read_done(args.output if args.output != "-" else None) if args.resume else set()
+    paths = (p for p in expand_inputs(args.inputs, args.list_files, recursive=args.recursive, include=args.include,
+                                      exclude=args.exclude, follow_symlinks=args.follow_symlinks, sort=args.sort)
+             if p not in done)
+    if done:
+        log.info("Reanudando: %d imágenes ya procesadas", len(done))
+
+    # stdout queda reservado para los registros JSON: los mensajes informativos van a stderr
+    json_out = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        return _run(args, paths, json_out)
+
+
+def _run(args, paths, json_out):
+    # hilos de TF y OpenCV antes de cargar el modelo; --batch-size y --workers tienen prioridad
+    runtime = load_runtime_config(args.runtime_config)
+    if args.low_memory:
+        runtime = low_memory_profile(runtime)
+    runtime.update({k: v for k, v in (("batch_size", args.batch_size), ("workers", args.workers)) if v is not None})
+    apply_runtime_config(runtime)
+    low_memory = bool(runtime["low_memory"])
+    settings = OutputSettings(args.format, png_compression=args.png_compression, quality=args.quality,
+                              max_dim=args.max_dim, lazy=args.output_mode == "lazy")
+    model_path = resolve_model(args.model, register=args.register)
+    sinks = [LoggingSink()]
+    if args.metrics_log:
+        sinks.append(JsonLinesSink(args.metrics_log))
+    metrics = PipelineMetrics(sinks=sinks)
+    gate = QualityGate(mode=args.quality_gate) if args.quality_gate != "off" else None
+    cache = TensorCache(args.tensor_cache) if args.tensor_cache else None
+    tta = TestTimeAugmentation(margin=args.tta_margin) if args.tta else None
+    shadow = None
+    if args.shadow_model:
+        # mismas capas objetivo que el modelo clínico, sin TTA ni caché: solo compute_heatmaps
+        candidate = load_visualizer(resolve_model(args.shadow_model), args.target_layer, settings, layer_fusion=args.layer_fusion,
+                                    low_memory=low_memory)
+        shadow = ShadowEvaluator(candidate, args.shadow_log, name=os.path.basename(args.shadow_model),
+                                 prob_threshold=args.prob_threshold)
+    gc = load_visualizer(model_path, args.target_layer, settings, metrics=metrics, quality_gate=gate,
+                         tensor_cache=cache, layer_fusion=args.layer_fusion, tta=tta, shadow=shadow, low_memory=low_memory)
+
+    if args.history:
+        from utils.history_utils import append_record, result_to_record
+
+    if args.output == "-":
+        out = json_out
+    else:
+        out = open(args.output, "a" if args.resume else "w", encoding="utf-8")
+    writer = ResultsWriter(args.results_file) if args.results_file else None
+    # con una sola carpeta recursiva los resultados conservan sus subcarpetas (evita choques de nombres)
+    input_root = None
+    if args.recursive and len(args.inputs) == 1 and not args.list_files and os.path.isdir(args.inputs[0]):
+        input_root = args.inputs[0]
+    n_ok = n_err = 0
+    try:
+        for path, res, err in gc.iter_process(paths, output_root=args.output_root, threshold=args.threshold,
+                                              circle_radius=args.circle_radius,
+                                              save_images=args.output_mode == "full", write_csv=not args.no_csv,
+                                              batch_size=runtime["batch_size"], workers=runtime["workers"],
+                                              input_root=input_root):
+            if err is not None:
+                n_err += 1
+                record = {"image": path, "error": f"{type(err).__name__}: {err}"}
+                log.error("Al procesar %s: %s", path, err, extra=record)
+            else:
+                n_ok += 1
+                # NaN (p. ej. sin inferencia por calidad) como null: NaN no es JSON válido
+                record = to_jsonable(res, nan_to_none=True)
+                if res.get("calidad") == QUALITY_REJECTED:
+                    record["detectado"] = None
+                else:
+                    record["detectado"] = res["probabilidad"] >= args.prob_threshold
+                if writer is not None:
+                    writer.append(res)
+                if args.history:
+                    append_record(result_to_record(res))
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if writer is not None:
+            writer.close()
+        if out is not json_out:
+            out.close()
+        metrics.close()
+        if cache is not None:
+            cache.close()
+        if shadow is not None:
+            shadow.close()
+
+    snap = metrics.snapshot()
+    print(f"[INFO] Procesadas: {n_ok} | Errores: {n_err} | {snap['imagenes_por_s']:.2f} img/s", file=sys.stderr)
+    n_rejected = snap["contadores"].get("rechazadas_calidad", 0)
+    if n_rejected:
+        print(f"[INFO] Descartadas por calidad: {n_rejected} (~{estimate_saved_ms(metrics) / 1000.0:.1f} s ahorrados)",
+              file=sys.stderr)
+    if snap["contadores"].get("tta"):
+        print(f"[INFO] Con TTA (cerca de 0.5): {snap['contadores']['tta']}", file=sys.stderr)
+    if shadow is not None:
+        s = shadow.summary()
+        print(f"[INFO] Sombra ({s['modelo']}): {s['imagenes']} imágenes | misma decisión {s['concordancia']:.1%} | "
+              f"|Δp| medio {s['dif_prob_media']:.3f} | IoU heatmap {s['iou_medio']:.2f} | "
+              f"+{s['ms_por_imagen']:.1f} ms/imagen | errores {s['errores']}", file=sys.stderr)
+    for stage, v in snap["etapas"].items():
+        print(f"[INFO]   {stage:15s} p50 {v['p50_ms']:8.1f} ms   p95 {v['p95_ms']:8.1f} ms", file=sys.stderr)
+    peak = peak_rss_mb()
+    if peak is not None:
+        print(f"[INFO] Pico de memoria (RSS): {peak:.0f} MB{' (modo poca memoria)' if low_memory else ''}",
+              file=sys.stderr)
+    return 1 if n_err and not n_ok else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
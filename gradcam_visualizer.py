@@ -1,34 +1,101 @@
 import os
+import time
+import logging
+import threading
 import cv2
 import numpy as np
-import pandas as pd
 import tensorflow as tf
-import matplotlib.pyplot as plt
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.file_utils import scan_images
+from utils.results_store import ResultsWriter, result_to_row, write_image_csv
+from utils.image_utils import OutputSettings, save_image, save_heatmap_cache, load_heatmap_cache, imread_reduced
+from utils.metrics import PipelineMetrics, stage_timer
+from utils.manifest import ResultsManifest
+from utils.phash_index import PerceptualIndex, DEFAULT_MAX_DISTANCE, phash_file
+from utils.job_journal import JobJournal
+from utils.quality import QUALITY_REJECTED, estimate_saved_ms
+from utils.runtime_config import LOW_MEMORY_MAX_BATCH, LOW_MEMORY_SWEEP_BATCH
+
+log = logging.getLogger(__name__)
+
+# tamaño de entrada del modelo (ancho, alto)
+MODEL_INPUT_SIZE = (224, 224)
+# etiqueta de urgencia de las imágenes descartadas por el control de calidad
+NOT_GRADABLE_LABEL = "NO EVALUABLE"
+
+
+# colormap JET precalculado (256x1x3, BGR) y su versión RGB, para cv2.applyColorMap
+_JET_LUT_BGR = cv2.applyColorMap(np.arange(256, dtype=np.uint8).reshape(256, 1), cv2.COLORMAP_JET)
+_JET_LUT_RGB = np.ascontiguousarray(_JET_LUT_BGR[..., ::-1])
+
+# el divisor entra como argumento: con la constante dentro del grafo el optimizador cambia la
+# división por una multiplicación y el resultado difiere en el último bit de astype / 255.0.
+# Es un escalar numpy y no un tf.constant: importar este módulo no inicializa el runtime de TF
+# (los hilos de TF solo se pueden configurar antes, ver utils.runtime_config)
+_UINT8_MAX = np.float32(255.0)
+
+
+@tf.function(input_signature=[tf.TensorSpec([None, None, None, 3], tf.uint8), tf.TensorSpec([], tf.float32)])
+def _normalize(batch_u8, scale):
+    """uint8 0..255 -> float32 0..1 dentro del runtime de TF (idéntico a astype(np.float32) / 255.0)."""
+    return tf.cast(batch_u8, tf.float32) / scale
 
 class GradCAMVisualizer:
     # Constructor de la clase GradCAMVisualizer
     # Recibe un modelo secuencial y el nombre de la capa objetivo (opcional
-    def __init__(self, sequential_model, target_layer_name=None):
+    # target_layer_name: nombre o lista de nombres de capas (p. ej. ["Conv_1", "block_16_project"]);
+    # con varias capas todas salen del mismo forward/tape y el heatmap del pipeline es su fusión
+    # layer_fusion: cómo combinar los heatmaps de varias capas, "mean" o "product" (ver fuse_heatmaps)
+    # output_settings: formato/compresión de las imágenes guardadas (ver utils.image_utils)
+    # metrics: tiempos por etapa y agregados (ver utils.metrics); por defecto solo en memoria
+    # quality_gate: control de calidad previo a la inferencia (ver utils.quality); None = desactivado
+    # tensor_cache: caché en disco de las entradas ya preprocesadas (ver utils.tensor_cache); None = desactivada
+    # tta: aumentación en inferencia para los casos cerca de 0.5 (ver utils.tta y apply_tta); None = desactivada
+    # shadow: modelo candidato evaluado en sombra sobre los mismos lotes (ver utils.shadow); None = desactivado
+    # model_fingerprint: huella del archivo del modelo (ver utils.model_registry); va en cada resultado
+    # low_memory: equipos de 4 GB; lotes acotados, heatmaps float16 y process_folder sin acumular resultados
+    def __init__(self, sequential_model, target_layer_name=None, output_settings=None, metrics=None,
+                 quality_gate=None, tensor_cache=None, layer_fusion="mean", tta=None, shadow=None,
+                 model_fingerprint=None, low_memory=False):
         self.sequential_model = sequential_model
+        self.output_settings = output_settings or OutputSettings()
+        self.metrics = metrics or PipelineMetrics()
+        self.quality_gate = quality_gate
+        self.tensor_cache = tensor_cache
+        self.tta = tta
+        self.shadow = shadow
+        self.model_fingerprint = model_fingerprint
+        self.low_memory = low_memory
+        if layer_fusion not in ("mean", "product"):
+            raise ValueError(f"layer_fusion desconocido: {layer_fusion}")
+        self.layer_fusion = layer_fusion
+        # buffers uint8 de entrada al modelo, uno por hilo (ver _input_buffer)
+        self._buffers = threading.local()
         self.base_model = sequential_model.layers[0]  # Modelo funcional MobileNetV2
 
         # Forzar ejecución para que input/output se definan
         dummy = tf.zeros((1, 224, 224, 3))
         _ = sequential_model(dummy)
 
-        # Buscar capa convolucional objetivo en el base_model
+        # Buscar capa(s) convolucional(es) objetivo en el base_model
         if target_layer_name is None:
             conv_layers = [layer for layer in self.base_model.layers if isinstance(layer, tf.keras.layers.Conv2D)]
             if not conv_layers:
                 raise ValueError("No se encontró capa convolucional en base_model")
-            self.target_layer = conv_layers[-1]
+            self.target_layers = [conv_layers[-1]]
         else:
-            self.target_layer = self.base_model.get_layer(target_layer_name)
-        print(f"[INFO] Usando capa objetivo: {self.target_layer.name}")
+            names = [target_layer_name] if isinstance(target_layer_name, str) else list(target_layer_name)
+            if not names:
+                raise ValueError("Lista de capas objetivo vacía")
+            self.target_layers = [self.base_model.get_layer(name) for name in names]
+        # la primera capa es la principal (compatibilidad con el código de una sola capa)
+        self.target_layer = self.target_layers[0]
+        log.info("Usando capa objetivo: %s", ", ".join(self.layer_names))
 
         # Crear modelo para Grad-CAM:
         # input: base_model.input
-        # output: [target_layer.output, output_final]
+        # output: [salida de cada capa objetivo..., output_final]
         # Pero la salida final la obtendremos pasando la salida del base_model
         # por las capas restantes del modelo secuencial
         base_output = self.base_model.output
@@ -40,54 +107,219 @@ class GradCAMVisualizer:
 
         self.grad_model = tf.keras.Model(
             inputs=self.base_model.input,
-            outputs=[self.target_layer.output, output_final]
+            outputs=[layer.output for layer in self.target_layers] + [output_final]
         )
+
+    @property
+    def layer_names(self):
+        return [layer.name for layer in self.target_layers]
+
+    def warm_up(self, batch_sizes=(1,)):
+        """Trazado de _normalize y primer forward/backward por tamaño de lote, antes de usar el modelo."""
+        for n in batch_sizes:
+            self.compute_heatmaps(np.zeros((n, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), dtype=np.uint8))
     # ------------------------------------------------------------------
 
     def compute_heatmap(self, img_input, class_index=None):
         """
-        img_input: tensor numpy shape (1, H, W, 3), normalizado 0-1 (float32)
+        img_input: numpy shape (1, H, W, 3), uint8 0..255 o float32 normalizado 0-1
         devuelve: heatmap (2D numpy float, normalized 0..1), probabilidad (float)
         """
-        # grad_model ya fue creado en el constructor y usa base_model.input y salida final
-        with tf.GradientTape() as tape:
-            conv_outputs, predictions = self.grad_model(tf.convert_to_tensor(img_input, dtype=tf.float32))
-            # Elegir clase: si salida es escalar, usamos índice 0; si multi-clase usamos argmax
-            if class_index is None:
-                if predictions.shape[-1] == 1:
-                    class_index = 0
-                else:
-                    class_index = tf.argmax(predictions[0]).numpy()
-            loss = predictions[:, class_index]
+        heatmaps, probs = self.compute_heatmaps(img_input, class_index=class_index)
+        return heatmaps[0], float(probs[0])
+
+    def compute_heatmaps(self, batch_input, class_index=None, timings=None):
+        """
+        Versión por lotes de compute_heatmap: un solo forward y un solo tape para N imágenes.
+        batch_input: numpy shape (N, H, W, 3), uint8 0..255 (se normaliza dentro de TF) o
+        float32 normalizado 0-1
+        timings: dict opcional donde se suman los ms de "forward" y "backward" del lote
+        devuelve: heatmaps (N, h, w) float32 normalizados 0..1 (float16 con low_memory),
+        probabilidades (N,) float
+        Con varias capas objetivo, heatmaps es la fusión de todas (ver fuse_heatmaps).
+        """
+        maps, scores = self.compute_layer_heatmaps(batch_input, class_indices=[class_index], timings=timings)
+        layers = [maps[name][class_index] for name in self.layer_names]
+        heatmaps = layers[0] if len(layers) == 1 else self.fuse_heatmaps(layers, mode=self.layer_fusion)
+        if self.low_memory:
+            heatmaps = heatmaps.astype(np.float16)
+        return heatmaps, scores[class_index]
 
-        grads = tape.gradient(loss, conv_outputs)  # gradientes w.r.t. activations
-        pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))  # promedio espacial por canal
+    def compute_layer_heatmaps(self, batch_input, class_indices=None, timings=None):
+        """
+        Grad-CAM de todas las capas objetivo y de varias clases con UN solo forward: las
+        activaciones de cada capa salen de grad_model en la misma pasada y, por clase, un solo
+        tape.gradient devuelve los gradientes de todas las capas a la vez.
+        class_indices: lista de índices de clase; None en la lista (o class_indices=None) es la
+        clase predicha de cada imagen (índice 0 si la salida es escalar)
+        devuelve: {capa: {clase: heatmaps (N, h, w) normalizados 0..1}} con la resolución propia
+        de cada capa, y {clase: probabilidades (N,) float}
+        """
+        timings = {} if timings is None else timings
+        classes = [None] if class_indices is None else list(class_indices)
+        t0 = time.perf_counter()
+        # persistente solo si hace falta más de un gradiente (una clase = una sola pasada hacia atrás)
+        with tf.GradientTape(persistent=len(classes) > 1) as tape:
+            outputs = self.grad_model(self._model_input(batch_input))
+            conv_outputs, predictions = outputs[:-1], outputs[-1]
+            losses = [self._class_score(predictions, c) for c in classes]
+        t1 = time.perf_counter()
+
+        maps = {name: {} for name in self.layer_names}
+        scores = {}
+        for c, loss in zip(classes, losses):
+            # el gradiente de la suma separa por imagen: cada muestra solo depende de su propia entrada
+            grads = tape.gradient(loss, conv_outputs)  # gradientes w.r.t. activations, todas las capas
+            for name, conv, g in zip(self.layer_names, conv_outputs, grads):
+                maps[name][c] = self._gradcam(conv, g)
+            # probabilidad de la clase seleccionada por imagen
+            scores[c] = loss.numpy().astype(float)
+        del tape
+        t2 = time.perf_counter()
+        timings["forward"] = timings.get("forward", 0.0) + (t1 - t0) * 1000.0
+        timings["backward"] = timings.get("backward", 0.0) + (t2 - t1) * 1000.0
+        return maps, scores
+
+    @staticmethod
+    def _class_score(predictions, class_index=None):
+        """Salida del modelo para la clase elegida, por imagen (N,)."""
+        # Elegir clase: si salida es escalar, usamos índice 0; si multi-clase usamos argmax por imagen
+        if class_index is None:
+            if predictions.shape[-1] == 1:
+                class_idx = tf.zeros((tf.shape(predictions)[0],), dtype=tf.int64)
+            else:
+                class_idx = tf.argmax(predictions, axis=-1)
+        else:
+            class_idx = tf.fill((tf.shape(predictions)[0],), tf.constant(class_index, dtype=tf.int64))
+        return tf.gather(predictions, class_idx, axis=1, batch_dims=1)
+
+    @staticmethod
+    def _gradcam(conv_outputs, grads):
+        """Heatmaps (N, h, w) de una capa a partir de sus activaciones y gradientes."""
+        pooled_grads = tf.reduce_mean(grads, axis=(1, 2))  # promedio espacial por canal -> (N, channels)
 
-        conv_outputs = conv_outputs[0]  # quitar batch dim -> (h, w, channels)
         # Grad-CAM: ponderar cada mapa de activación por su gradiente promedio y sumar
-        heatmap = tf.reduce_sum(tf.multiply(conv_outputs, pooled_grads), axis=-1)
+        heatmaps = tf.reduce_sum(conv_outputs * pooled_grads[:, tf.newaxis, tf.newaxis, :], axis=-1)
 
-        # normalizar y asegurar no-negativos
-        heatmap = np.maximum(heatmap.numpy(), 0)
-        maxv = heatmap.max() if heatmap.max() != 0 else 1e-10
-        heatmap = heatmap / maxv
+        # normalizar y asegurar no-negativos (por imagen)
+        heatmaps = np.maximum(heatmaps.numpy(), 0)
+        maxv = heatmaps.max(axis=(1, 2), keepdims=True)
+        maxv[maxv == 0] = 1e-10
+        return heatmaps / maxv
 
-        # obtener probabilidad de la clase seleccionada (si salida única, predictions[0][0])
-        if predictions.shape[-1] == 1:
-            prob = float(predictions.numpy()[0][0])
+    @staticmethod
+    def fuse_heatmaps(layer_heatmaps, mode="mean"):
+        """
+        Combina heatmaps (N, h, w) de varias capas: se llevan a la resolución más fina
+        (INTER_LINEAR) y se promedian ("mean") o se multiplican con media geométrica
+        ("product", solo queda lo que marcan todas las capas). Renormaliza por imagen a 0..1.
+        """
+        h = max(m.shape[1] for m in layer_heatmaps)
+        w = max(m.shape[2] for m in layer_heatmaps)
+        resized = []
+        for maps in layer_heatmaps:
+            if maps.shape[1:] != (h, w):
+                maps = np.stack([cv2.resize(m.astype(np.float32, copy=False), (w, h), interpolation=cv2.INTER_LINEAR)
+                                 for m in maps])
+            resized.append(np.clip(maps, 0, 1))
+        stacked = np.stack(resized)
+        if mode == "product":
+            fused = np.prod(stacked, axis=0) ** (1.0 / len(stacked))
         else:
-            prob = float(predictions.numpy()[0][class_index])
+            fused = stacked.mean(axis=0)
+        maxv = fused.max(axis=(1, 2), keepdims=True)
+        maxv[maxv == 0] = 1e-10
+        return (fused / maxv).astype(np.float32)
+
+    def apply_tta(self, batch_input, heatmaps, probs, timings=None):
+        """
+        TTA sobre las imágenes del lote cercanas al umbral de decisión (tta.applies): todas sus
+        vistas aumentadas van apiladas en UNA sola llamada a compute_heatmaps y los heatmaps se
+        promedian en el encuadre original. Modifica heatmaps y probs en el lugar (probabilidad
+        media de las vistas) y devuelve la incertidumbre por imagen (varianza; NaN si no aplicó).
+        """
+        uncertainty = np.full(len(probs), np.nan)
+        if self.tta is None:
+            return uncertainty
+        idx = [j for j in range(len(probs)) if self.tta.applies(probs[j])]
+        if not idx:
+            return uncertainty
+        timings = {} if timings is None else timings
+        with stage_timer(timings, "tta"):
+            views = self.tta.augment(batch_input[idx])
+            view_heatmaps, view_probs = self.compute_heatmaps(views)
+            merged, mean, var = self.tta.merge(heatmaps[idx], probs[idx], view_heatmaps, view_probs,
+                                               batch_input.shape[1:])
+        heatmaps[idx] = merged
+        probs[idx] = mean
+        uncertainty[idx] = var
+        self.metrics.count("tta", len(idx))
+        return uncertainty
+
+    def _apply_uncertainty(self, res, uncertainty):
+        if not np.isnan(uncertainty):
+            res["incertidumbre"] = float(uncertainty)
+            res["tta_vistas"] = self.tta.n_views
+
+    def _run_shadow(self, image_paths, batch_input, heatmaps, probs, timings):
+        """
+        Evaluación en sombra del lote (antes de TTA, sobre la misma entrada): no modifica
+        heatmaps ni probs y sus errores no llegan al resultado clínico. Suma su costo en
+        timings["shadow"].
+        """
+        if self.shadow is None:
+            return
+        try:
+            ms = self.shadow.evaluate(image_paths, batch_input, heatmaps, probs)
+        except Exception as e:
+            log.error("Evaluación en sombra: %s: %s", type(e).__name__, e, exc_info=True,
+                      extra={"modelo_fingerprint": self.model_fingerprint})
+            return
+        timings["shadow"] = timings.get("shadow", 0.0) + ms
+
+    def predict_probs(self, batch_input, timings=None):
+        """
+        Solo la probabilidad (forward sin GradientTape ni capa objetivo), para el barrido
+        rápido de iter_prioritized. batch_input como en compute_heatmaps.
+        """
+        timings = {} if timings is None else timings
+        with stage_timer(timings, "sweep"):
+            predictions = self.sequential_model(self._model_input(batch_input), training=False)
+            predictions = predictions.numpy()
+            probs = predictions[:, 0] if predictions.shape[-1] == 1 else predictions.max(axis=-1)
+        return probs.astype(float)
+
+    @staticmethod
+    def _model_input(batch_input):
+        """
+        Tensor de entrada del modelo. Un lote uint8 pasa al runtime tal cual (una sola copia,
+        4 veces menos bytes que float32) y se normaliza en el grafo.
+        """
+        x = tf.convert_to_tensor(batch_input)
+        if x.dtype == tf.uint8:
+            return _normalize(x, _UINT8_MAX)
+        return tf.cast(x, tf.float32)
 
-        return heatmap, prob
+    def _input_buffer(self, n):
+        """
+        Buffer uint8 (n, 224, 224, 3) del hilo actual, reutilizado entre lotes (crece si hace
+        falta): las imágenes se redimensionan directamente dentro de él.
+        """
+        buf = getattr(self._buffers, "batch", None)
+        if buf is None or len(buf) < n:
+            buf = np.empty((n, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), dtype=np.uint8)
+            self._buffers.batch = buf
+        return buf[:n]
 
     def _resize_heatmap(self, heatmap, target_shape):
         """
-        redimensiona heatmap (2D) a tamaño target_shape (h, w) usando INTER_CUBIC
+        redimensiona heatmap (2D) a tamaño target_shape (h, w) usando INTER_CUBIC; el resultado
+        es float32 aunque heatmap sea float16 (cv2.resize no admite float16)
         """
         h, w = target_shape
-        heatmap_resized = cv2.resize(heatmap, (w, h), interpolation=cv2.INTER_CUBIC)
-        # garantizar rango 0..1
-        heatmap_resized = np.clip(heatmap_resized, 0, 1)
+        heatmap_resized = cv2.resize(heatmap.astype(np.float32, copy=False), (w, h), interpolation=cv2.INTER_CUBIC)
+        # garantizar rango 0..1 (en el mismo array)
+        np.clip(heatmap_resized, 0, 1, out=heatmap_resized)
         return heatmap_resized
 
     def compute_active_zone(self, heatmap_resized, threshold=0.7):
@@ -98,7 +330,11 @@ class GradCAMVisualizer:
         """
         mask = heatmap_resized >= threshold
         total_pixels = mask.size
-        active_pixels = int(np.sum(mask))
+        # píxeles activos por fila y por columna: alcanza para el centro y el bbox sin armar la
+        # lista de coordenadas (np.argwhere ocupa 16 bytes por píxel activo a resolución completa)
+        rows = np.count_nonzero(mask, axis=1)
+        cols = np.count_nonzero(mask, axis=0)
+        active_pixels = int(rows.sum())
         area_ratio = active_pixels / total_pixels if total_pixels > 0 else 0.0
 
         if active_pixels == 0:
@@ -107,17 +343,44 @@ class GradCAMVisualizer:
             center_y = -1
             bbox = (-1, -1, -1, -1)
         else:
-            coords = np.argwhere(mask)  # [[y,x],...]
-            ys = coords[:, 0]
-            xs = coords[:, 1]
-            center_y = float(np.mean(ys))
-            center_x = float(np.mean(xs))
-            ymin, ymax = int(ys.min()), int(ys.max())
-            xmin, xmax = int(xs.min()), int(xs.max())
-            bbox = (xmin, ymin, xmax, ymax)
+            # sumas enteras exactas: mismo resultado que el promedio de las coordenadas
+            center_y = float(np.dot(np.arange(len(rows), dtype=np.int64), rows) / active_pixels)
+            center_x = float(np.dot(np.arange(len(cols), dtype=np.int64), cols) / active_pixels)
+            ys = np.flatnonzero(rows)
+            xs = np.flatnonzero(cols)
+            bbox = (int(xs[0]), int(ys[0]), int(xs[-1]), int(ys[-1]))
 
         return area_ratio, (center_x, center_y), bbox, mask
 
+    @staticmethod
+    def heatmap_color(heatmap_resized, rgb=False):
+        """Heatmap 0..1 (HxW) -> colormap JET uint8 con el LUT precalculado (BGR, o RGB si rgb)."""
+        hm = cv2.convertScaleAbs(heatmap_resized, alpha=255.0)
+        return cv2.applyColorMap(hm, _JET_LUT_RGB if rgb else _JET_LUT_BGR)
+
+    @staticmethod
+    def draw_markers(img, circle_center=None, circle_radius=20, bbox=None, rgb=False):
+        """Dibuja el círculo (amarillo) y el bbox (blanco) sobre img, en el mismo buffer."""
+        if circle_center is not None and circle_center[0] >= 0:
+            cx, cy = int(round(circle_center[0])), int(round(circle_center[1]))
+            cv2.circle(img, (cx, cy), circle_radius, (255, 255, 0) if rgb else (0, 255, 255), 3)
+        if bbox is not None and bbox[0] >= 0:
+            xmin, ymin, xmax, ymax = bbox
+            cv2.rectangle(img, (xmin, ymin), (xmax, ymax), (255, 255, 255), 2)
+        return img
+
+    def render_overlay_bgr(self, img_bgr, heatmap_resized, circle_center=None, circle_radius=20, bbox=None, alpha=0.4):
+        """
+        Overlay para guardar, sin conversiones de color: todo en BGR (el orden de imread/imwrite).
+        La mezcla se hace EN img_bgr (se sobrescribe la imagen original) y los marcadores se
+        dibujan sobre ese mismo buffer.
+        devuelve: overlay_bgr (el mismo img_bgr), heatmap_color (BGR uint8)
+        """
+        hm_color = self.heatmap_color(heatmap_resized)
+        cv2.addWeighted(hm_color, alpha, img_bgr, 1 - alpha, 0, dst=img_bgr)
+        self.draw_markers(img_bgr, circle_center, circle_radius, bbox)
+        return img_bgr, hm_color
+
     def create_overlay(self, original_img_rgb, heatmap_resized, circle_center=None, circle_radius=20, bbox=None, alpha=0.4):
         """
         original_img_rgb: imagen original en RGB (H,W,3) uint8 o float 0..255
@@ -126,50 +389,90 @@ class GradCAMVisualizer:
         bbox: (xmin,ymin,xmax,ymax) para dibujar rectángulo
         alpha: peso del heatmap
         devuelve: overlay_rgb (uint8), heatmap_color (BGR uint8)
+        (para mostrar en pantalla; al guardar se usa render_overlay_bgr)
         """
-        # convertir heatmap a color
-        hm = np.uint8(255 * np.clip(heatmap_resized, 0, 1))
-        hm_color = cv2.applyColorMap(hm, cv2.COLORMAP_JET)  # BGR
-        # original_img_rgb -> convertir a BGR para cv2.addWeighted, luego volver a RGB
-        orig_bgr = cv2.cvtColor(original_img_rgb, cv2.COLOR_RGB2BGR)
-        overlay_bgr = cv2.addWeighted(hm_color, alpha, orig_bgr, 1 - alpha, 0)
-
-        # dibujar marcadores sobre overlay (en BGR)
-        if circle_center is not None and circle_center[0] >= 0:
-            cx, cy = int(round(circle_center[0])), int(round(circle_center[1]))
-            cv2.circle(overlay_bgr, (cx, cy), circle_radius, (0, 255, 255), 3)  # amarillo BGR
-        if bbox is not None and bbox[0] >= 0:
-            xmin, ymin, xmax, ymax = bbox
-            cv2.rectangle(overlay_bgr, (xmin, ymin), (xmax, ymax), (255, 255, 255), 2)  # blanco
+        # mezcla directamente en RGB con el LUT en ese orden: no hay idas y vueltas a BGR
+        original_img_rgb = np.asarray(original_img_rgb, dtype=np.uint8)
+        overlay_rgb = cv2.addWeighted(self.heatmap_color(heatmap_resized, rgb=True), alpha, original_img_rgb, 1 - alpha, 0)
+        self.draw_markers(overlay_rgb, circle_center, circle_radius, bbox, rgb=True)
+        return overlay_rgb, self.heatmap_color(heatmap_resized)
 
-        overlay_rgb = cv2.cvtColor(overlay_bgr, cv2.COLOR_BGR2RGB)
-        return overlay_rgb, hm_color  # hm_color es BGR
-
-    def process_image(self, image_path, output_root="resultados", threshold=0.7, circle_radius=25, save_images=True):
+    def render_overlay_from_cache(self, res, circle_radius=25, alpha=0.45):
         """
-        Procesa 1 imagen y guarda resultados en output_root/<nombre_sin_ext>/
-        Guarda: overlay (predicción con gradcam), gradcam_puro (colormap), archivo CSV con datos.
-        Retorna un diccionario con los valores clave.
+        Genera overlay y heatmap de un resultado procesado en modo lazy.
+        res: dict de process_image (o fila del historial) con image y heatmap_cache_path
+        devuelve: overlay_rgb (uint8), heatmap_color (BGR uint8) o (None, None) si falta algo
         """
-        # leer imagen original (BGR) y convertir a RGB
+        heatmap_small = load_heatmap_cache(res.get("heatmap_cache_path"))
+        if heatmap_small is None:
+            return None, None
+        orig_bgr = cv2.imread(res["image"]) if isinstance(res.get("image"), str) else None
+        if orig_bgr is None:
+            return None, None
+        orig_rgb = cv2.cvtColor(orig_bgr, cv2.COLOR_BGR2RGB)
+        heatmap_resized = self._resize_heatmap(heatmap_small, orig_rgb.shape[:2])
+        center = res.get("centro", (-1, -1))
+        bbox = tuple(int(v) for v in res.get("bbox", (-1, -1, -1, -1)))
+        return self.create_overlay(orig_rgb, heatmap_resized, circle_center=center, circle_radius=circle_radius, bbox=bbox, alpha=alpha)
+
+    def load_image(self, image_path, rgb=True):
+        """Lee la imagen original y la devuelve en RGB (o en BGR, tal como la decodifica cv2, si rgb=False)."""
         orig_bgr = cv2.imread(image_path)
         if orig_bgr is None:
             raise FileNotFoundError(f"No se pudo cargar la imagen: {image_path}")
-        orig_rgb = cv2.cvtColor(orig_bgr, cv2.COLOR_BGR2RGB)
-        orig_h, orig_w = orig_rgb.shape[:2]
+        return cv2.cvtColor(orig_bgr, cv2.COLOR_BGR2RGB) if rgb else orig_bgr
 
-        # preprocesar para el modelo (224x224 y normalizar)
-        img_resized_for_model = cv2.resize(orig_rgb, (224, 224))
-        img_input = np.expand_dims(img_resized_for_model.astype(np.float32) / 255.0, axis=0)
+    def resize_for_model(self, orig_img, out=None, bgr=False):
+        """
+        Redimensiona a la entrada del modelo (224x224, RGB uint8 sin normalizar); out: destino opcional.
+        bgr: la imagen viene en BGR; redimensionar y pasar a RGB conmutan, así que solo se
+        convierte la imagen chica.
+        """
+        if not bgr:
+            return cv2.resize(orig_img, MODEL_INPUT_SIZE, dst=out)
+        return cv2.cvtColor(cv2.resize(orig_img, MODEL_INPUT_SIZE), cv2.COLOR_BGR2RGB, dst=out)
 
-        # calcular heatmap y prob
-        heatmap_small, prob = self.compute_heatmap(img_input)
+    def preprocess(self, orig_rgb):
+        """Redimensiona a la entrada del modelo (224x224) y normaliza a 0..1 (float32)."""
+        return self.resize_for_model(orig_rgb).astype(np.float32) / 255.0
+
+    def output_folder(self, image_path, output_root="resultados", input_root=None):
+        """
+        Carpeta de resultados de una imagen: output_root/<nombre_sin_ext>/.
+        Si se indica input_root (carpeta escaneada recursivamente) se conserva la
+        subcarpeta relativa, así dos imágenes con el mismo nombre no se pisan.
+        """
+        base_name = os.path.splitext(os.path.basename(image_path))[0]
+        if input_root:
+            rel_dir = os.path.relpath(os.path.dirname(os.path.abspath(image_path)), os.path.abspath(input_root))
+            if rel_dir != os.curdir and not rel_dir.startswith(os.pardir):
+                return os.path.join(output_root, rel_dir, base_name)
+        return os.path.join(output_root, base_name)
+
+    def finalize_result(self, image_path, orig_img, heatmap_small, prob, output_root="resultados", threshold=0.7,
+                        circle_radius=25, save_images=True, write_csv=True, output_settings=None, timings=None,
+                        input_root=None, orig_shape=None, bgr=False):
+        """
+        Etapas posteriores al modelo para 1 imagen: heatmap a tamaño original, zona activa,
+        urgencia, overlay y escritura de archivos. Devuelve el dict de resultado.
+        timings: ms por etapa ya medidos para esta imagen (decode, modelo...); se completan
+        con las etapas de aquí y se adjuntan al resultado en "tiempos_ms".
+        input_root: ver output_folder.
+        orig_shape: (alto, ancho) original si no se decodificó la imagen (orig_img None, entrada
+        tomada de la caché de tensores); solo vale cuando no hay overlay que dibujar.
+        bgr: orig_img viene en BGR (como la decodifica cv2). En ese caso el overlay se mezcla en el
+        mismo buffer de orig_img (queda sobrescrita) y se guarda sin ninguna conversión de color.
+        """
+        timings = {} if timings is None else timings
+        orig_h, orig_w = orig_img.shape[:2] if orig_img is not None else orig_shape
 
         # redimensionar heatmap a tamaño original
-        heatmap_resized = self._resize_heatmap(heatmap_small, (orig_h, orig_w))
+        with stage_timer(timings, "heatmap_resize"):
+            heatmap_resized = self._resize_heatmap(heatmap_small, (orig_h, orig_w))
 
         # calcular zona activa (sobre el heatmap redimensionado)
-        area_ratio, (center_x, center_y), bbox, mask = self.compute_active_zone(heatmap_resized, threshold=threshold)
+        with stage_timer(timings, "active_zone"):
+            area_ratio, (center_x, center_y), bbox, _ = self.compute_active_zone(heatmap_resized, threshold=threshold)
 
         # calcular nivel de urgencia (promedio entre prob y area_ratio)
         urgency = float((prob + area_ratio) / 2.0)
@@ -183,69 +486,605 @@ class GradCAMVisualizer:
 
         # crear carpeta resultado
         base_name = os.path.splitext(os.path.basename(image_path))[0]
-        out_folder = os.path.join(output_root, base_name)
+        out_folder = self.output_folder(image_path, output_root, input_root)
         os.makedirs(out_folder, exist_ok=True)
 
         # crear_overlay y guardar imágenes
-        overlay_rgb, heatmap_color_bgr = self.create_overlay(orig_rgb, heatmap_resized, circle_center=(center_x, center_y), circle_radius=circle_radius, bbox=bbox, alpha=0.45)
-
-        if save_images:
-            # overlay (RGB -> BGR for saving)
-            overlay_bgr = cv2.cvtColor(overlay_rgb.astype(np.uint8), cv2.COLOR_RGB2BGR)
-            overlay_path = os.path.join(out_folder, f"{base_name}_overlay.png")
-            cv2.imwrite(overlay_path, overlay_bgr)
-
-            # heatmap puro: heatmap_color_bgr (BGR)
-            heatmap_puro_path = os.path.join(out_folder, f"{base_name}_heatmap_puro.png")
-            cv2.imwrite(heatmap_puro_path, heatmap_color_bgr)
-
-        # Guardar CSV con datos
-        csv_path = os.path.join(out_folder, f"{base_name}_datos.csv")
-        df = pd.DataFrame([{
-            "nombre_imagen": os.path.basename(image_path),
-            "probabilidad": float(prob),
-            "centro_x": float(center_x),
-            "centro_y": float(center_y),
-            "bbox_xmin": int(bbox[0]) if bbox[0] is not None else -1,
-            "bbox_ymin": int(bbox[1]) if bbox[1] is not None else -1,
-            "bbox_xmax": int(bbox[2]) if bbox[2] is not None else -1,
-            "bbox_ymax": int(bbox[3]) if bbox[3] is not None else -1,
-            "tamano_zona_activa": float(area_ratio),
-            "nivel_urgencia": float(urgency),
-            "nivel_urgencia_label": urgency_label
-        }])
-        df.to_csv(csv_path, index=False)
+        settings = output_settings or self.output_settings
+        overlay_path = None
+        heatmap_puro_path = None
+        heatmap_cache_path = None
+        if settings.lazy:
+            # modo diferido: solo se guarda el heatmap chico, el overlay se genera al abrir el detalle
+            with stage_timer(timings, "write_images"):
+                heatmap_cache_path = save_heatmap_cache(os.path.join(out_folder, f"{base_name}_heatmap.npy"), heatmap_small)
+        elif save_images:
+            if orig_img is None:
+                raise ValueError("Para dibujar el overlay hace falta la imagen original")
+            with stage_timer(timings, "overlay"):
+                img_bgr = orig_img if bgr else cv2.cvtColor(orig_img, cv2.COLOR_RGB2BGR)
+                overlay_bgr, heatmap_color_bgr = self.render_overlay_bgr(img_bgr, heatmap_resized, circle_center=(center_x, center_y), circle_radius=circle_radius, bbox=bbox, alpha=0.45)
+            # el heatmap float32 a resolución completa ya no hace falta durante la codificación
+            del heatmap_resized
 
-        # retornar resumen
-        return {
+            with stage_timer(timings, "write_images"):
+                overlay_path = save_image(os.path.join(out_folder, f"{base_name}_overlay"), overlay_bgr, settings)
+
+                # heatmap puro: heatmap_color_bgr (BGR)
+                heatmap_puro_path = save_image(os.path.join(out_folder, f"{base_name}_heatmap_puro"), heatmap_color_bgr, settings)
+
+        resultado = {
             "image": image_path,
-            "overlay_path": overlay_path if save_images else None,
-            "heatmap_puro_path": heatmap_puro_path if save_images else None,
-            "csv_path": csv_path,
+            "overlay_path": overlay_path,
+            "heatmap_puro_path": heatmap_puro_path,
+            "heatmap_cache_path": heatmap_cache_path,
+            "csv_path": None,
             "probabilidad": float(prob),
             "centro": (center_x, center_y),
             "bbox": bbox,
             "tamano_zona_activa": float(area_ratio),
             "nivel_urgencia": float(urgency),
-            "nivel_urgencia_label": urgency_label
+            "nivel_urgencia_label": urgency_label,
+            "modelo_fingerprint": self.model_fingerprint,
         }
 
-    def process_folder(self, input_folder, output_root="resultados", threshold=0.7, circle_radius=25, save_images=True):
+        # Guardar CSV con datos (opcional: en corridas grandes conviene el archivo consolidado)
+        if write_csv:
+            with stage_timer(timings, "write_csv"):
+                csv_path = os.path.join(out_folder, f"{base_name}_datos.csv")
+                write_image_csv(csv_path, result_to_row(resultado))
+            resultado["csv_path"] = csv_path
+
+        resultado["tiempos_ms"] = timings
+        resultado["contadores"] = {
+            "lote": 1,
+            "bytes_escritos": sum(os.path.getsize(p) for p in (overlay_path, heatmap_puro_path, heatmap_cache_path,
+                                                               resultado["csv_path"]) if p),
+        }
+        # retornar resumen
+        return resultado
+
+    def rejected_result(self, image_path, quality, timings=None):
+        """
+        Resultado de una imagen que el control de calidad descartó: no pasa por el modelo,
+        no se generan archivos y la probabilidad y la urgencia quedan en NaN.
+        """
+        self.metrics.count("rechazadas_calidad")
+        return {
+            "image": image_path,
+            "overlay_path": None,
+            "heatmap_puro_path": None,
+            "heatmap_cache_path": None,
+            "csv_path": None,
+            "probabilidad": float("nan"),
+            "centro": None,
+            "bbox": None,
+            "tamano_zona_activa": 0.0,
+            "nivel_urgencia": float("nan"),
+            "nivel_urgencia_label": NOT_GRADABLE_LABEL,
+            "modelo_fingerprint": self.model_fingerprint,
+            "calidad": quality["calidad"],
+            "calidad_motivo": quality["calidad_motivo"],
+            "calidad_metricas": quality["calidad_metricas"],
+            "tiempos_ms": dict(timings or {}),
+            "contadores": {"lote": 0, "bytes_escritos": 0},
+        }
+
+    @staticmethod
+    def _apply_quality(res, quality):
+        if quality is not None:
+            res["calidad"] = quality["calidad"]
+            res["calidad_motivo"] = quality["calidad_motivo"]
+            res["calidad_metricas"] = quality["calidad_metricas"]
+
+    def process_image(self, image_path, output_root="resultados", threshold=0.7, circle_radius=25, save_images=True, write_csv=True,
+                      output_settings=None):
+        """
+        Procesa 1 imagen y guarda resultados en output_root/<nombre_sin_ext>/
+        Guarda: overlay (predicción con gradcam), gradcam_puro (colormap), archivo CSV con datos.
+        write_csv: si es False no se escribe <nombre>_datos.csv (csv_path queda en None).
+        output_settings: reemplaza a self.output_settings para esta llamada. En modo lazy
+        no se escriben imágenes, solo <nombre>_heatmap.npy (ver render_overlay_from_cache).
+        Retorna un diccionario con los valores clave.
+        """
+        timings = {}
+        quality = None
+        if self.quality_gate is not None:
+            # control de calidad sobre una lectura reducida, antes de decodificar la imagen completa
+            with stage_timer(timings, "quality"):
+                quality = self.quality_gate.check_file(image_path)
+            if quality is None:
+                raise FileNotFoundError(f"No se pudo cargar la imagen: {image_path}")
+            if quality["calidad"] == QUALITY_REJECTED:
+                return self.rejected_result(image_path, quality, timings)
+        # leer imagen original (en BGR, sin convertir) y preprocesar para el modelo (224x224)
+        with stage_timer(timings, "decode"):
+            orig_bgr = self.load_image(image_path, rgb=False)
+        with stage_timer(timings, "resize"):
+            img_input = self._input_buffer(1)
+            self.resize_for_model(orig_bgr, out=img_input[0], bgr=True)
+
+        # calcular heatmap y prob
+        heatmaps, probs = self.compute_heatmaps(img_input, timings=timings)
+        self._run_shadow([image_path], img_input, heatmaps, probs, timings)
+        uncertainty = self.apply_tta(img_input, heatmaps, probs, timings=timings)
+
+        res = self.finalize_result(image_path, orig_bgr, heatmaps[0], float(probs[0]), output_root=output_root,
+                                   threshold=threshold, circle_radius=circle_radius, save_images=save_images,
+                                   write_csv=write_csv, output_settings=output_settings, timings=timings, bgr=True)
+        self._apply_quality(res, quality)
+        self._apply_uncertainty(res, uncertainty[0])
+        self.metrics.record(image_path, res["tiempos_ms"], modelo_fingerprint=self.model_fingerprint, **res["contadores"])
+        return res
+
+    def process_batch(self, items, output_root="resultados", threshold=0.7, circle_radius=25, save_images=True,
+                      write_csv=True, output_settings=None, pool=None, timings=None, input_root=None, qualities=None,
+                      cached=None, bgr=False):
+        """
+        Procesa un lote de imágenes ya leídas con una sola llamada al modelo.
+        items: lista de (image_path, orig_rgb)
+        pool: executor opcional para paralelizar preprocesado y etapas posteriores
+        timings: lista opcional (una por item) con los ms ya medidos, p. ej. la lectura
+        input_root: ver output_folder
+        qualities: lista opcional (una por item) con el control de calidad ya hecho; si hay
+        quality_gate y falta, se evalúa aquí. Las imágenes RECHAZADA no pasan por el modelo
+        (su orig_rgb puede ser None).
+        cached: lista opcional (una por item) con (tensor uint8, (alto, ancho)) tomado de la caché
+        de tensores; esos items no se redimensionan y su orig_rgb puede ser None (sin overlay).
+        bgr: las imágenes vienen en BGR (ver finalize_result: el overlay se mezcla en su buffer).
+        devuelve: lista de (resultado, error) en el mismo orden; resultado es None si hubo error
+        """
+        if not items:
+            return []
+        mapper = pool.map if pool is not None else map
+        timings = [dict(t) for t in timings] if timings is not None else [{} for _ in items]
+        qualities = list(qualities) if qualities is not None else [None] * len(items)
+        cached = list(cached) if cached is not None else [None] * len(items)
+
+        if self.quality_gate is not None:
+            def _check(k):
+                if qualities[k] is not None:
+                    return qualities[k]
+                with stage_timer(timings[k], "quality"):
+                    return self.quality_gate.check(items[k][1], is_rgb=not bgr)
+            qualities = list(mapper(_check, range(len(items))))
+
+        outcomes = [None] * len(items)
+        keep = []
+        for k, q in enumerate(qualities):
+            if q is not None and q["calidad"] == QUALITY_REJECTED:
+                outcomes[k] = (self.rejected_result(items[k][0], q, timings[k]), None)
+            else:
+                keep.append(k)
+        n = len(keep)
+        if not n:
+            return outcomes
+
+        # cada imagen se redimensiona directo a su lugar en el lote (sin copias intermedias)
+        batch_input = self._input_buffer(n)
+
+        def _preprocess(j):
+            k = keep[j]
+            if cached[k] is not None:
+                with stage_timer(timings[k], "tensor_cache"):
+                    np.copyto(batch_input[j], cached[k][0])
+                return
+            with stage_timer(timings[k], "resize"):
+                self.resize_for_model(items[k][1], out=batch_input[j], bgr=bgr)
+            if self.tensor_cache is not None:
+                with stage_timer(timings[k], "tensor_cache"):
+                    self.tensor_cache.put(items[k][0], batch_input[j], items[k][1].shape[:2])
+
+        try:
+            list(mapper(_preprocess, range(n)))
+            batch_timings = {}
+            heatmaps, probs = self.compute_heatmaps(batch_input, timings=batch_timings)
+            self._run_shadow([items[k][0] for k in keep], batch_input, heatmaps, probs, batch_timings)
+            uncertainty = self.apply_tta(batch_input, heatmaps, probs, timings=batch_timings)
+        except Exception as e:
+            for k in keep:
+                outcomes[k] = (None, e)
+            return outcomes
+        # el costo del modelo se reparte en partes iguales entre las imágenes del lote
+        for k in keep:
+            for stage, ms in batch_timings.items():
+                timings[k][stage] = ms / n
+
+        def _finalize(j):
+            k = keep[j]
+            path, orig_img = items[k]
+            try:
+                res = self.finalize_result(path, orig_img, heatmaps[j], probs[j], output_root=output_root, threshold=threshold,
+                                           circle_radius=circle_radius, save_images=save_images, write_csv=write_csv,
+                                           output_settings=output_settings, timings=timings[k], input_root=input_root,
+                                           orig_shape=cached[k][1] if cached[k] is not None else None, bgr=bgr)
+                self._apply_quality(res, qualities[k])
+                self._apply_uncertainty(res, uncertainty[j])
+                return res, None
+            except Exception as e:
+                return None, e
+
+        for k, (res, err) in zip(keep, mapper(_finalize, range(n))):
+            outcomes[k] = (res, err)
+            if res is not None:
+                res["contadores"]["lote"] = n
+                self.metrics.record(res["image"], res["tiempos_ms"], modelo_fingerprint=self.model_fingerprint,
+                                    **res["contadores"])
+            else:
+                self.metrics.count("errores")
+        return outcomes
+
+    def iter_process(self, image_paths, output_root="resultados", threshold=0.7, circle_radius=25, save_images=True,
+                     write_csv=True, output_settings=None, batch_size=8, workers=1, input_root=None):
+        """
+        Procesa una secuencia de imágenes por lotes: la lectura y las etapas posteriores
+        corren en un pool de `workers` hilos y el modelo se ejecuta una vez por lote.
+        Genera (image_path, resultado, error) en el mismo orden de entrada;
+        resultado es None si hubo error.
+        Con tensor_cache, si no hay overlay que dibujar (modo lazy o save_images=False) las
+        imágenes ya cacheadas no se decodifican; las demás se agregan a la caché.
+        """
+        batch_size = max(1, int(batch_size))
+        if self.low_memory:
+            batch_size = min(batch_size, LOW_MEMORY_MAX_BATCH)
+        os.makedirs(output_root, exist_ok=True)
+        settings = output_settings or self.output_settings
+        # sin overlay alcanza con la entrada del modelo y el tamaño original
+        use_cached = self.tensor_cache is not None and (settings.lazy or not save_images)
+
+        def _load(path):
+            t = {}
+            quality = None
+            try:
+                if self.quality_gate is not None:
+                    # lectura reducida para el control de calidad; si se rechaza no se decodifica completa
+                    with stage_timer(t, "quality"):
+                        quality = self.quality_gate.check_file(path)
+                    if quality is None:
+                        raise FileNotFoundError(f"No se pudo cargar la imagen: {path}")
+                    if quality["calidad"] == QUALITY_REJECTED:
+                        return None, t, None, quality, None
+                if use_cached:
+                    with stage_timer(t, "tensor_cache"):
+                        cached = self.tensor_cache.get(path)
+                    if cached is not None:
+                        return None, t, None, quality, cached
+                with stage_timer(t, "decode"):
+                    orig_bgr = self.load_image(path, rgb=False)
+                return orig_bgr, t, None, quality, None
+            except Exception as e:
+                return None, t, e, quality, None
+
+        def _batches():
+            batch = []
+            for path in image_paths:
+                batch.append(path)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+                for paths in _batches():
+                    loaded = list(pool.map(_load, paths))
+                    ok = [i for i, (_, _, err, _, _) in enumerate(loaded) if err is None]
+                    outcomes = {i: (None, err) for i, (_, _, err, _, _) in enumerate(loaded) if err is not None}
+                    if len(ok) < len(paths):
+                        self.metrics.count("errores", len(paths) - len(ok))
+                    batch_out = self.process_batch([(paths[i], loaded[i][0]) for i in ok], output_root=output_root,
+                                                   threshold=threshold, circle_radius=circle_radius,
+                                                   save_images=save_images, write_csv=write_csv,
+                                                   output_settings=output_settings, pool=pool,
+                                                   timings=[loaded[i][1] for i in ok], input_root=input_root,
+                                                   qualities=[loaded[i][3] for i in ok],
+                                                   cached=[loaded[i][4] for i in ok], bgr=True)
+                    outcomes.update(zip(ok, batch_out))
+                    # las imágenes decodificadas del lote se liberan antes de entregar los resultados
+                    del loaded, batch_out
+                    for i, path in enumerate(paths):
+                        res, err = outcomes[i]
+                        yield path, res, err
+        finally:
+            if self.tensor_cache is not None:
+                self.tensor_cache.save()
+
+    def iter_prioritized(self, image_paths, batch_size=8, workers=1, sweep_batch_size=32, on_sweep=None, **kwargs):
+        """
+        Procesa primero los casos más probables: un barrido rápido calcula solo la probabilidad
+        de cada imagen (lectura reducida + forward, ver predict_probs) y luego Grad-CAM, zona
+        activa, overlay y escritura corren en orden de probabilidad descendente.
+        on_sweep: función opcional que recibe [(image_path, prob_barrido), ...] ya ordenada.
+        kwargs: se pasan a iter_process. Genera (image_path, resultado, error) en orden de prioridad;
+        las imágenes ilegibles (y las rechazadas por quality_gate) se informan durante el barrido.
+        """
+        sweep_batch_size = max(1, int(sweep_batch_size))
+        if self.low_memory:
+            sweep_batch_size = min(sweep_batch_size, LOW_MEMORY_SWEEP_BATCH)
+        sweep_input = np.empty((sweep_batch_size, MODEL_INPUT_SIZE[1], MODEL_INPUT_SIZE[0], 3), dtype=np.uint8)
+
+        def _load_small(job):
+            """Deja la entrada del modelo en sweep_input[i]; devuelve (True | dict de calidad | None, tiempos)."""
+            i, path = job
+            t = {}
+            if self.tensor_cache is not None and self.quality_gate is None:
+                # con la entrada ya cacheada el barrido no decodifica nada
+                with stage_timer(t, "tensor_cache"):
+                    cached = self.tensor_cache.get(path) if os.path.exists(path) else None
+                if cached is not None:
+                    np.copyto(sweep_input[i], cached[0])
+                    return True, t
+            with stage_timer(t, "sweep_decode"):
+                img_bgr, _ = imread_reduced(path, min_side=min(MODEL_INPUT_SIZE))
+                if img_bgr is None:
+                    return None, t
+            if self.quality_gate is not None:
+                # la lectura reducida del barrido alcanza para el control de calidad
+                with stage_timer(t, "quality"):
+                    quality = self.quality_gate.check(img_bgr)
+                if quality["calidad"] == QUALITY_REJECTED:
+                    return quality, t
+            self.resize_for_model(img_bgr, out=sweep_input[i], bgr=True)
+            return True, t
+
+        paths = list(image_paths)
+        ranked = []
+        with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+            for start in range(0, len(paths), sweep_batch_size):
+                batch = paths[start:start + sweep_batch_size]
+                loaded = list(pool.map(_load_small, enumerate(batch)))
+                ok = [i for i, (x, _) in enumerate(loaded) if x is True]
+                for i, (x, t) in enumerate(loaded):
+                    if x is None:
+                        self.metrics.count("errores")
+                        yield batch[i], None, FileNotFoundError(f"No se pudo cargar la imagen: {batch[i]}")
+                    elif isinstance(x, dict):
+                        yield batch[i], self.rejected_result(batch[i], x, t), None
+                if ok:
+                    probs = self.predict_probs(sweep_input[:len(batch)] if len(ok) == len(batch) else sweep_input[ok])
+                    ranked.extend((batch[i], float(p)) for i, p in zip(ok, probs))
+
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        self.metrics.count("barrido", len(ranked))
+        if on_sweep is not None:
+            on_sweep(ranked)
+        yield from self.iter_process([path for path, _ in ranked], batch_size=batch_size, workers=workers, **kwargs)
+
+    def iter_folder(self, input_folder, recursive=False, include=None, exclude=None, follow_symlinks=False,
+                    sort=False, manifest=None, journal=None, prioritize=False, dedupe_index=None, force=False,
+                    **kwargs):
+        """
+        Escanea input_folder de forma incremental (ver utils.file_utils.scan_images) y procesa
+        las imágenes a medida que aparecen, sin listar antes el árbol completo.
+        Con recursive=True los resultados conservan las subcarpetas (input_root=input_folder).
+        manifest: ResultsManifest opcional; las imágenes sin cambios desde la corrida anterior
+        no se procesan y se devuelve el resultado guardado (con "reutilizado": True).
+        journal: JobJournal opcional de un trabajo que se reanuda; las imágenes ya registradas
+        tampoco se procesan. El registro de las nuevas lo hace quien consume el generador.
+        dedupe_index: PerceptualIndex opcional; las imágenes casi idénticas a una ya procesada
+        (ráfagas, reexportaciones) no pasan por el modelo y reciben el resultado de la original
+        con "duplicado_de". Si la original está en proceso en esta misma corrida, se espera a ella.
+        force: no reutilizar resultados del manifiesto ni del índice de duplicados (se recalcula
+        todo, aunque ambos se siguen actualizando).
+        prioritize: procesar en orden de probabilidad descendente (ver iter_prioritized).
+        kwargs: se pasan a iter_process (o a iter_prioritized). Genera (image_path, resultado, error).
+        """
+        paths = scan_images(input_folder, recursive=recursive, include=include, exclude=exclude,
+                            follow_symlinks=follow_symlinks, sort=sort)
+        kwargs.setdefault("input_root", input_folder if recursive else None)
+        run = self.iter_prioritized if prioritize else self.iter_process
+        if manifest is None and journal is None and dedupe_index is None:
+            yield from run(paths, **kwargs)
+            return
+
+        reused = deque()
+        in_flight = set()   # imágenes agregadas al índice en esta corrida y aún sin resultado
+        waiting = {}        # original en proceso -> duplicados que esperan su resultado
+        orphans = []        # duplicados cuya original falló: se procesan al final
+
+        def _dedupe(path):
+            h = phash_file(path)
+            if h is None:
+                return None
+            hit = None if force else dedupe_index.match(h, exclude=path)
+            if hit is not None:
+                original = hit[0]
+                if original in in_flight:
+                    waiting.setdefault(original, []).append(path)
+                    return False
+                res = dedupe_index.linked_result(original, path)
+                if res is not None:
+                    return res
+            # imagen nueva (o su original ya no tiene archivos): se procesa y queda en el índice
+            dedupe_index.add(h, path)
+            in_flight.add(os.path.abspath(path))
+            return None
+
+        def _linked(res):
+            if manifest is not None:
+                manifest.update(res["image"], res)
+            self.metrics.count("duplicadas")
+            return res
+
+        def _pending():
+            for path in paths:
+                res = journal.lookup(path) if journal is not None else None
+                if res is not None:
+                    if manifest is not None:
+                        manifest.update(path, res)
+                elif manifest is not None and not force:
+                    res = manifest.lookup(path)
+                if res is None and dedupe_index is not None:
+                    res = _dedupe(path)
+                    if res is False:
+                        continue
+                    if res is not None:
+                        res = _linked(res)
+                if res is not None:
+                    reused.append(res)
+                else:
+                    yield path
+
+        def _finish(path, res):
+            """Registra el resultado de una imagen procesada; devuelve los duplicados que la esperaban."""
+            if res is not None and manifest is not None:
+                manifest.update(path, res)
+            key = os.path.abspath(path)
+            if dedupe_index is None or key not in in_flight:
+                return []
+            in_flight.discard(key)
+            dups = waiting.pop(key, [])
+            if res is None:
+                dedupe_index.discard(path)
+                orphans.extend(dups)
+                return []
+            dedupe_index.set_result(path, res)
+            linked = [dedupe_index.linked_result(path, dup) for dup in dups]
+            orphans.extend(dup for dup, r in zip(dups, linked) if r is None)
+            return [_linked(r) for r in linked if r is not None]
+
+        for path, res, err in run(_pending(), **kwargs):
+            while reused:
+                cached = reused.popleft()
+                yield cached["image"], cached, None
+            linked = _finish(path, res)
+            yield path, res, err
+            for dup in linked:
+                yield dup["image"], dup, None
+        while reused:
+            cached = reused.popleft()
+            yield cached["image"], cached, None
+        if orphans:
+            for path, res, err in run(iter(orphans), **kwargs):
+                if res is not None and manifest is not None:
+                    manifest.update(path, res)
+                yield path, res, err
+
+    def process_folder(self, input_folder, output_root="resultados", threshold=0.7, circle_radius=25, save_images=True,
+                       write_csv=True, results_path=None, output_settings=None, batch_size=1, workers=1,
+                       recursive=False, include=None, exclude=None, follow_symlinks=False, sort=False,
+                       incremental=False, prune_deleted=False, resumable=False, on_result=None, prioritize=False,
+                       on_sweep=None, dedupe=False, dedupe_distance=DEFAULT_MAX_DISTANCE, force=False, collect=None):
         """
         Recorre todas las imágenes de input_folder (.jpg/.jpeg/.png) y llama process_image.
+        results_path: si se indica (.parquet o .csv), además guarda todos los resultados
+        de la corrida en un único archivo consolidado (ver utils.results_store).
+        batch_size/workers: ver iter_process.
+        recursive/include/exclude/follow_symlinks/sort: ver iter_folder.
+        incremental: usar output_root/manifest.json para procesar solo imágenes nuevas o
+        modificadas y reutilizar el resultado guardado de las demás (ver utils.manifest).
+        prune_deleted: con incremental, borrar los resultados de imágenes que ya no existen.
+        resumable: registrar cada imagen terminada en un journal en disco (output_root/jobs/, ver
+        utils.job_journal); si la corrida anterior sobre la misma carpeta y con los mismos
+        parámetros se interrumpió, se reanuda desde ahí. Los resultados llevan "job_id".
+        on_result: función llamada con cada resultado apenas está listo (p. ej. para mostrarlo o
+        agregarlo al historial; los reutilizados llegan con "reutilizado": True); con resumable
+        se llama antes de registrarlo en el journal.
+        prioritize: barrido rápido de probabilidad y luego el pipeline completo empezando por
+        los casos más probables (ver iter_prioritized, incluido on_sweep).
+        dedupe: índice de hashes perceptuales en output_root/phash_index.json; las imágenes a
+        distancia de Hamming <= dedupe_distance de una ya procesada reutilizan su resultado
+        (con "duplicado_de"). force: recalcular todo aunque el manifiesto o el índice tengan resultado.
+        collect: acumular los resultados en la lista devuelta (por defecto sí, salvo con low_memory);
+        sin acumular, cada resultado solo pasa por results_path y on_result y se devuelve [].
         Devuelve una lista con los resultados por imagen.
         """
+        collect = not self.low_memory if collect is None else collect
         results = []
         os.makedirs(output_root, exist_ok=True)
-        valid_ext = (".jpg", ".jpeg", ".png", ".bmp", ".tiff")
-        for fname in sorted(os.listdir(input_folder)):
-            if fname.lower().endswith(valid_ext):
-                fp = os.path.join(input_folder, fname)
-                try:
-                    res = self.process_image(fp, output_root=output_root, threshold=threshold, circle_radius=circle_radius, save_images=save_images)
+        settings = output_settings or self.output_settings
+        # solo lo que cambia el resultado: la carpeta de entrada no (manifiesto e índice usan rutas
+        # absolutas), así varias carpetas comparten output_root sin invalidarse entre sí
+        config = {
+            "threshold": threshold, "circle_radius": circle_radius, "save_images": save_images,
+            "write_csv": write_csv, "output_settings": settings.to_dict(),
+        }
+        if self.model_fingerprint is not None:
+            # con otro modelo no se reutilizan resultados del manifiesto ni del índice de duplicados
+            config["modelo"] = self.model_fingerprint
+        if len(self.target_layers) > 1:
+            # otra combinación de capas da otros heatmaps: no reutilizar resultados de otra configuración
+            config["capas_gradcam"] = self.layer_names + [self.layer_fusion]
+        if self.tta is not None:
+            config["tta"] = self.tta.to_dict()
+        manifest = None
+        if incremental:
+            manifest = ResultsManifest(output_root, config=config)
+            if prune_deleted:
+                removed = manifest.prune_deleted(input_folder)
+                if removed:
+                    log.info("Resultados eliminados de imágenes borradas: %d", len(removed))
+        dedupe_index = PerceptualIndex(output_root, config=config, max_distance=dedupe_distance) if dedupe else None
+        journal = None
+        if resumable:
+            # se reanuda solo con la misma selección de imágenes y la misma configuración
+            journal = JobJournal(input_folder, output_root, params=dict(
+                config, recursive=recursive, include=include, exclude=exclude))
+        n_done = n_reused = n_dup = n_rejected = 0
+        completed = False
+        writer = ResultsWriter(results_path) if results_path else None
+        try:
+            for fp, res, err in self.iter_folder(input_folder, recursive=recursive, include=include, exclude=exclude,
+                                                 follow_symlinks=follow_symlinks, sort=sort,
+                                                 output_root=output_root, threshold=threshold,
+                                                 circle_radius=circle_radius, save_images=save_images,
+                                                 write_csv=write_csv, output_settings=output_settings,
+                                                 batch_size=batch_size, workers=workers, manifest=manifest,
+                                                 journal=journal, prioritize=prioritize,
+                                                 dedupe_index=dedupe_index, force=force,
+                                                 **({"on_sweep": on_sweep} if prioritize else {})):
+                fname = os.path.relpath(fp, input_folder)
+                if err is not None:
+                    log.error("Al procesar %s: %s", fname, err,
+                              extra={"image": fp, "error": f"{type(err).__name__}: {err}",
+                                     "modelo_fingerprint": self.model_fingerprint})
+                    if journal is not None:
+                        journal.record_error(fp, err)
+                    continue
+                if journal is not None:
+                    res["job_id"] = journal.job_id
+                n_done += 1
+                if collect:
                     results.append(res)
-                    print(f"[OK] Procesada: {fname} -> {res['overlay_path']}")
-                except Exception as e:
-                    print(f"[ERROR] Al procesar {fname}: {e}")
-
-        return results
\ No newline at end of file
+                if writer is not None:
+                    writer.append(res)
+                if on_result is not None:
+                    on_result(res)
+                if res.get("reutilizado"):
+                    n_reused += 1
+                    continue
+                if journal is not None:
+                    journal.record(fp, res)
+                if res.get("calidad") == QUALITY_REJECTED:
+                    n_rejected += 1
+                if res.get("duplicado_de"):
+                    n_dup += 1
+                    log.info("Duplicada de %s: %s", os.path.basename(res["duplicado_de"]), fname,
+                             extra={"image": fp, "duplicado_de": res["duplicado_de"]})
+                elif res.get("calidad") == QUALITY_REJECTED:
+                    log.info("Descartada por calidad: %s (%s)", fname, res["calidad_motivo"],
+                             extra={"image": fp, "calidad_motivo": res["calidad_motivo"]})
+                else:
+                    log.info("Procesada: %s -> %s", fname, res["overlay_path"], extra={"image": fp})
+            completed = True
+        finally:
+            if journal is not None:
+                # si la corrida se interrumpe, el journal queda abierto para reanudarla
+                if completed:
+                    journal.finish()
+                else:
+                    journal.close()
+            if dedupe_index is not None:
+                dedupe_index.save()
+                log.info("Duplicadas (resultado de la original, sin inferencia): %d", n_dup)
+            if manifest is not None:
+                manifest.save()
+                log.info("Sin cambios (resultado reutilizado): %d | procesadas: %d", n_reused, n_done - n_reused - n_dup)
+            if n_rejected:
+                log.info("Control de calidad: %d imágenes descartadas antes del modelo "
+                         "(~%.1f s de procesamiento ahorrados en total)", n_rejected, estimate_saved_ms(self.metrics) / 1000.0)
+            if writer is not None:
+                writer.close()
+                log.info("Resultados consolidados en: %s", writer.path)
+        return results
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Servicio HTTP local de inferencia: un único modelo cargado compartido por varios puestos.
+Los pedidos concurrentes se agrupan en lotes (micro-batching) dentro de un presupuesto
+de latencia; si la cola se llena responde 503 para que el cliente reintente.
+
+Uso:
+    python server.py --port 8765 --max-batch 8 --max-latency-ms 25
+
+Pedido (el cuerpo es la imagen tal cual):
+    curl --data-binary @fondo.jpg "http://127.0.0.1:8765/predict?name=fondo.jpg"
+"""
+
+import os
+import sys
+import json
+import uuid
+import logging
+import argparse
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+import numpy as np
+
+from utils.file_utils import default_model_path
+from utils.image_utils import OutputSettings
+from utils.micro_batcher import MicroBatcher, QueueFullError
+from utils.quality import QualityGate
+from utils.tta import TestTimeAugmentation
+from utils.shadow import ShadowEvaluator, SHADOW_LOG
+from utils.model_registry import short_fingerprint
+from utils.runtime_config import load_runtime_config, apply_runtime_config
+from utils.results_store import to_jsonable
+from utils.metrics import PipelineMetrics, LoggingSink
+from utils.logging_setup import setup_logging
+
+log = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+
+
+def decode_upload(data):
+    """
+    Decodifica los bytes de una imagen subida a BGR uint8 (None si no es una imagen válida).
+    Se deja en BGR: process_batch(bgr=True) convierte solo la entrada chica del modelo.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    # configurado por make_server
+    batcher = None
+    upload_dir = None
+    request_timeout = 120.0
+
+    def _send_json(self, status, payload, headers=None):
+        # JSON estricto: sin NaN (los clientes HTTP no lo aceptan)
+        body = json.dumps(payload, ensure_ascii=False, allow_nan=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self._send_json(404, {"error": "Ruta no encontrada"})
+            return
+        b = self.batcher
+        self._send_json(200, {
+            "status": "ok",
+            "en_cola": b.pending,
+            "lotes": b.batches,
+            "imagenes": b.items,
+            "imagenes_por_lote": (b.items / b.batches) if b.batches else 0.0,
+        })
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/predict":
+            self._send_json(404, {"error": "Ruta no encontrada"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._send_json(400, {"error": "Cuerpo vacío: enviar la imagen como cuerpo del pedido"})
+            return
+        if length > MAX_UPLOAD_BYTES:
+            self._send_json(413, {"error": "Imagen demasiado grande"})
+            return
+        # el lugar en la cola se toma antes de leer, decodificar y guardar la imagen: con el
+        # servicio saturado se responde 503 sin hacer ese trabajo
+        try:
+            self.batcher.reserve()
+        except QueueFullError:
+            self.close_connection = True
+            self._send_json(503, {"error": "Servicio ocupado, reintentar"},
+                            headers={"Retry-After": "1", "Connection": "close"})
+            return
+        data = self.rfile.read(length)
+        orig_bgr = decode_upload(data)
+        if orig_bgr is None:
+            self.batcher.release()
+            self._send_json(400, {"error": "No se pudo decodificar la imagen"})
+            return
+
+        # se guarda la imagen recibida para poder regenerar el overlay (modo lazy) y abrir el detalle
+        name = parse_qs(url.query).get("name", ["imagen.png"])[0]
+        name = os.path.basename(name) or "imagen.png"
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        image_path = os.path.join(self.upload_dir, f"{stamp}_{uuid.uuid4().hex[:8]}_{name}")
+        with open(image_path, "wb") as f:
+            f.write(data)
+
+        fut = self.batcher.submit((image_path, orig_bgr), reserved=True)
+        try:
+            res = fut.result(timeout=self.request_timeout)
+        except Exception as e:
+            # si todavía no entró en un lote, no se procesa
+            fut.cancel()
+            if os.path.exists(image_path):
+                os.remove(image_path)
+            log.error("Error al procesar %s: %s", image_path, e, exc_info=True,
+                      extra={"image": image_path, "error": f"{type(e).__name__}: {e}"})
+            self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        # las imágenes rechazadas por calidad no tienen probabilidad (NaN): van como null
+        self._send_json(200, to_jsonable(res, nan_to_none=True))
+
+    def log_message(self, format, *args):
+        log.info("%s - %s", self.address_string(), format % args, extra={"cliente": self.address_string()})
+
+
+def make_server(gc, host="127.0.0.1", port=8765, output_root="resultados", max_batch_size=8,
+                max_latency_ms=25, max_queue=64, process_kwargs=None):
+    """Crea el servidor y el micro-batcher (ya iniciado) alrededor de un GradCAMVisualizer."""
+    process_kwargs = dict(process_kwargs or {})
+    upload_dir = os.path.join(output_root, "_uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+
+    def _process(items):
+        return gc.process_batch(items, output_root=output_root, bgr=True, **process_kwargs)
+
+    batcher = MicroBatcher(_process, max_batch_size=max_batch_size, max_latency_ms=max_latency_ms,
+                           max_queue=max_queue).start()
+    handler = type("Handler", (InferenceHandler,), {"batcher": batcher, "upload_dir": upload_dir})
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    return httpd, batcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="Interfaz de escucha (por defecto solo local)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model", default=None, help="Ruta del modelo .h5 (por defecto el de la app)")
+    parser.add_argument("--target-layer", default="Conv_1", help="Capa(s) objetivo, separadas por comas")
+    parser.add_argument("--output-root", default="resultados")
+    parser.add_argument("--max-batch", type=int, default=None,
+                        help="Tamaño máximo de lote (por defecto, el de la configuración de ejecución)")
+    parser.add_argument("--runtime-config", default=None, help="JSON de hilos y lote (ver utils.runtime_config)")
+    parser.add_argument("--max-latency-ms", type=float, default=25, help="Espera máxima para completar un lote")
+    parser.add_argument("--max-queue", type=int, default=64, help="Pedidos en cola antes de responder 503")
+    parser.add_argument("--output-mode", choices=["full", "lazy", "none"], default="lazy")
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--quality-gate", choices=["off", "flag", "reject"], default="off",
+                        help="Control de calidad previo (ver utils.quality)")
+    parser.add_argument("--tta", action="store_true", help="TTA en los casos cerca de 0.5 (ver utils.tta)")
+    parser.add_argument("--shadow-model", default=None, help="Modelo candidato evaluado en sombra (ver utils.shadow)")
+    parser.add_argument("--shadow-log", default=SHADOW_LOG)
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    runtime = load_runtime_config(args.runtime_config)
+    if args.max_batch is not None:
+        runtime["batch_size"] = args.max_batch
+    apply_runtime_config(runtime)
+    from tensorflow import keras
+    from gradcam_visualizer import GradCAMVisualizer
+    model_path = args.model or default_model_path()
+    model = keras.models.load_model(model_path, compile=False)
+    layers = [name.strip() for name in args.target_layer.split(",")]
+    shadow = None
+    if args.shadow_model:
+        candidate = GradCAMVisualizer(keras.models.load_model(args.shadow_model, compile=False), target_layer_name=layers,
+                                      model_fingerprint=short_fingerprint(args.shadow_model),
+                                      low_memory=bool(runtime["low_memory"]))
+        shadow = ShadowEvaluator(candidate, args.shadow_log, name=os.path.basename(args.shadow_model))
+    gc = GradCAMVisualizer(model, target_layer_name=layers,
+                           output_settings=OutputSettings(lazy=args.output_mode == "lazy"),
+                           quality_gate=QualityGate(mode=args.quality_gate) if args.quality_gate != "off" else None,
+                           tta=TestTimeAugmentation() if args.tta else None, shadow=shadow,
+                           model_fingerprint=short_fingerprint(model_path), low_memory=bool(runtime["low_memory"]),
+                           metrics=PipelineMetrics(sinks=[LoggingSink()]))
+
+    httpd, batcher = make_server(gc, host=args.host, port=args.port, output_root=args.output_root,
+                                 max_batch_size=runtime["batch_size"], max_latency_ms=args.max_latency_ms,
+                                 max_queue=args.max_queue,
+                                 process_kwargs={"threshold": args.threshold,
+                                                 "save_images": args.output_mode == "full"})
+    log.info("Servicio de inferencia en http://%s:%d (POST /predict, GET /health)", args.host, args.port)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        batcher.stop()
+        if shadow is not None:
+            shadow.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
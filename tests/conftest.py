@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# los módulos del proyecto se importan desde la raíz (utils.*, gradcam_visualizer...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
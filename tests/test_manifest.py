@@ -0,0 +1,67 @@
+# tests/test_manifest.py
+import os
+
+from utils.manifest import ResultsManifest
+
+
+def _write(path, data=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _result(image, out_folder):
+    return {
+        "image": image,
+        "overlay_path": _write(os.path.join(out_folder, "overlay.png")),
+        "csv_path": _write(os.path.join(out_folder, "datos.csv")),
+        "probabilidad": 0.8,
+    }
+
+
+def test_prune_duplicate_keeps_original_files(tmp_path):
+    input_folder, output_root = str(tmp_path / "in"), str(tmp_path / "out")
+    original = _write(os.path.join(input_folder, "a.jpg"), b"a")
+    duplicate = _write(os.path.join(input_folder, "b.jpg"), b"a")
+    res = _result(original, os.path.join(output_root, "a"))
+    manifest = ResultsManifest(output_root)
+    manifest.update(original, res)
+    # el duplicado guarda una copia del resultado de la original (mismas rutas de archivos)
+    manifest.update(duplicate, dict(res, image=duplicate, duplicado_de=os.path.abspath(original)))
+
+    os.remove(duplicate)
+    removed = manifest.prune_deleted(input_folder)
+
+    assert removed == [os.path.abspath(duplicate)]
+    assert os.path.exists(res["overlay_path"]) and os.path.exists(res["csv_path"])
+    assert manifest.lookup(original)["reutilizado"] is True
+
+
+def test_prune_original_keeps_files_still_used_by_duplicate(tmp_path):
+    input_folder, output_root = str(tmp_path / "in"), str(tmp_path / "out")
+    original = _write(os.path.join(input_folder, "a.jpg"), b"a")
+    duplicate = _write(os.path.join(input_folder, "b.jpg"), b"a")
+    res = _result(original, os.path.join(output_root, "a"))
+    manifest = ResultsManifest(output_root)
+    manifest.update(original, res)
+    manifest.update(duplicate, dict(res, image=duplicate, duplicado_de=os.path.abspath(original)))
+
+    os.remove(original)
+    manifest.prune_deleted(input_folder)
+
+    assert os.path.exists(res["overlay_path"])
+    assert manifest.lookup(duplicate) is not None
+
+
+def test_prune_removes_own_result_folder(tmp_path):
+    input_folder, output_root = str(tmp_path / "in"), str(tmp_path / "out")
+    image = _write(os.path.join(input_folder, "a.jpg"))
+    res = _result(image, os.path.join(output_root, "a"))
+    manifest = ResultsManifest(output_root)
+    manifest.update(image, res)
+
+    os.remove(image)
+    manifest.prune_deleted(input_folder)
+
+    assert not os.path.exists(os.path.join(output_root, "a"))
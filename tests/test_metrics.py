@@ -0,0 +1,40 @@
+import json
+import sys
+import threading
+
+from utils.metrics import JsonLinesSink, LogFileSink, PipelineMetrics
+
+
+def test_file_sinks_keep_lines_whole_under_concurrency(tmp_path):
+    jsonl = tmp_path / "metricas.jsonl"
+    logf = tmp_path / "metricas.log"
+    metrics = PipelineMetrics(sinks=[JsonLinesSink(str(jsonl)), LogFileSink(str(logf))])
+    per_thread = 200
+    pad = "x" * 2000  # líneas largas para que una escritura sin lock se parta
+
+    def work(n):
+        for i in range(per_thread):
+            metrics.record(f"img_{n}_{i}.png", {"carga": 1.0, "gradcam": 2.0}, relleno=pad)
+
+    # cambios de hilo muy frecuentes para que los emit se crucen
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        sys.setswitchinterval(interval)
+    for sink in metrics.sinks:
+        sink.close()
+
+    lines = jsonl.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 8 * per_thread
+    images = {json.loads(line)["image"] for line in lines}
+    assert len(images) == 8 * per_thread
+
+    log_lines = logf.read_text(encoding="utf-8").splitlines()
+    assert len(log_lines) == 8 * per_thread
+    assert all(line.endswith("gradcam=2.0ms") for line in log_lines)
@@ -0,0 +1,51 @@
+# tests/test_micro_batcher.py
+import pytest
+
+from utils.micro_batcher import MicroBatcher, QueueFullError
+
+
+def _echo(items):
+    return [(item, None) for item in items]
+
+
+def test_reserve_limits_queue_and_release_frees_slot():
+    batcher = MicroBatcher(_echo, max_queue=2)
+    batcher.reserve()
+    batcher.submit("a")
+    with pytest.raises(QueueFullError):
+        batcher.reserve()
+    with pytest.raises(QueueFullError):
+        batcher.submit("b")
+    batcher.release()
+    batcher.submit("b")
+
+
+def test_stop_fails_queued_futures():
+    batcher = MicroBatcher(_echo, max_queue=4)
+    futures = [batcher.submit(i) for i in range(3)]
+    batcher.stop()
+    for fut in futures:
+        assert isinstance(fut.exception(timeout=1), RuntimeError)
+    assert batcher.pending == 0
+
+
+def test_cancelled_requests_are_not_processed():
+    processed = []
+
+    def _process(items):
+        processed.extend(items)
+        return _echo(items)
+
+    batcher = MicroBatcher(_process, max_batch_size=4, max_latency_ms=1, max_queue=4)
+    cancelled = batcher.submit("viejo")
+    kept = batcher.submit("nuevo")
+    assert cancelled.cancel()
+    batcher.start()
+    try:
+        assert kept.result(timeout=5) == "nuevo"
+        # los lugares de ambos pedidos (también el cancelado) quedaron libres
+        for _ in range(4):
+            batcher.reserve()
+    finally:
+        batcher.stop()
+    assert processed == ["nuevo"]
@@ -0,0 +1,40 @@
+# tests/test_shadow.py
+import json
+
+import numpy as np
+
+from utils.shadow import ShadowEvaluator, heatmap_agreement
+
+
+class _FlatCandidate:
+    """Candidato mínimo: heatmaps constantes y probabilidad fija (solo compute_heatmaps)."""
+    model_fingerprint = "candidato"
+
+    def compute_heatmaps(self, batch_input):
+        n = len(batch_input)
+        return np.zeros((n, 7, 7), dtype=np.float32), np.full(n, 0.4, dtype=np.float32)
+
+
+def test_constant_heatmap_has_no_correlation():
+    flat = np.zeros((7, 7), dtype=np.float32)
+    ramp = np.linspace(0, 1, 49, dtype=np.float32).reshape(7, 7)
+    corr, iou = heatmap_agreement(flat, ramp)
+    assert corr is None
+    assert 0.0 <= iou <= 1.0
+
+
+def test_shadow_log_is_strict_json_with_flat_heatmap(tmp_path):
+    log_path = tmp_path / "shadow.jsonl"
+    shadow = ShadowEvaluator(_FlatCandidate(), str(log_path), name="plano")
+    heatmaps = np.random.default_rng(0).random((2, 7, 7)).astype(np.float32)
+    shadow.evaluate(["a.jpg", "b.jpg"], np.zeros((2, 224, 224, 3), dtype=np.uint8), heatmaps,
+                    np.array([0.9, float("nan")], dtype=np.float32))
+    shadow.close()
+
+    def _reject(token):
+        raise ValueError(f"token no JSON: {token}")
+
+    lines = log_path.read_text(encoding="utf-8").splitlines()
+    records = [json.loads(line, parse_constant=_reject) for line in lines]
+    assert [r["heatmap_corr"] for r in records] == [None, None]
+    assert records[1]["prob_clinico"] is None
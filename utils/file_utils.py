@@ -1,8 +1,97 @@
 # utils/file_utils.py
 import os
+import sys
 import shutil
+import fnmatch
 import platform
 import subprocess
+import logging
+
+log = logging.getLogger(__name__)
+
+# extensiones de imagen aceptadas al recorrer carpetas
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tiff")
+
+MODEL_FILENAME = "mobilenet_flV3_finetuning.h5"
+
+def resource_path(relative_path):
+    """Resuelve rutas tanto en desarrollo como en ejecutable PyInstaller (onedir/onefile)."""
+    try:
+        base_dir = sys._MEIPASS  # type: ignore[attr-defined]
+    except Exception:
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_dir, relative_path)
+
+def default_model_path():
+    """Ruta del modelo: model/<MODEL_FILENAME> o, en desarrollo, la raíz del proyecto."""
+    path = resource_path(os.path.join("model", MODEL_FILENAME))
+    if not os.path.exists(path):
+        # fallback: raíz del proyecto en desarrollo
+        alt = resource_path(MODEL_FILENAME)
+        if os.path.exists(alt):
+            path = alt
+    return path
+
+def _matches(rel_path, patterns):
+    """True si rel_path (o su nombre) coincide con algún patrón glob, sin distinguir mayúsculas."""
+    rel = rel_path.replace(os.sep, "/").lower()
+    name = rel.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatchcase(rel, p) or fnmatch.fnmatchcase(name, p) for p in patterns)
+
+def scan_images(root, recursive=True, include=None, exclude=None, follow_symlinks=False, sort=False,
+                extensions=IMAGE_EXTENSIONS):
+    """
+    Recorre root con os.scandir y genera las rutas de imagen a medida que las encuentra
+    (no arma la lista completa antes de empezar).
+    include/exclude: patrones glob sobre la ruta relativa a root o el nombre de archivo
+                     (sin distinguir mayúsculas); exclude también poda subcarpetas
+    follow_symlinks: seguir enlaces simbólicos a carpetas y archivos (con protección de ciclos)
+    sort: ordenar por nombre dentro de cada carpeta (recorrido en profundidad); así cada
+          carpeta se lee entera antes de generar sus imágenes
+    """
+    include = [p.lower() for p in (include or [])]
+    exclude = [p.lower() for p in (exclude or [])]
+    extensions = tuple(e.lower() for e in extensions)
+    visited = set()
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        if follow_symlinks:
+            try:
+                st = os.stat(folder)
+            except OSError:
+                continue
+            if (st.st_dev, st.st_ino) in visited:
+                continue
+            visited.add((st.st_dev, st.st_ino))
+        subdirs = []
+        try:
+            with os.scandir(folder) as it:
+                # sin sort se genera directo del iterador: una carpeta plana enorme no se lee
+                # entera antes de la primera imagen; solo se guardan las subcarpetas pendientes
+                for entry in (sorted(it, key=lambda e: e.name) if sort else it):
+                    try:
+                        if entry.is_symlink() and not follow_symlinks:
+                            continue
+                        is_dir = entry.is_dir(follow_symlinks=follow_symlinks)
+                    except OSError:
+                        continue
+                    rel = os.path.relpath(entry.path, root)
+                    if is_dir:
+                        if recursive and not (exclude and _matches(rel, exclude)):
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.name.lower().endswith(extensions):
+                        continue
+                    if include and not _matches(rel, include):
+                        continue
+                    if exclude and _matches(rel, exclude):
+                        continue
+                    yield entry.path
+        except OSError as e:
+            log.error("No se pudo leer la carpeta %s: %s", folder, e)
+        # se apilan al revés para visitar las subcarpetas en orden
+        stack.extend(reversed(subdirs))
 
 def open_folder(path):
     path = os.path.abspath(path)
@@ -0,0 +1,131 @@
+# utils/folder_watcher.py
+import os
+import time
+import threading
+import logging
+
+from utils.file_utils import scan_images
+from utils.manifest import file_signature
+
+log = logging.getLogger(__name__)
+
+
+class FolderWatcher:
+    """
+    Vigila una carpeta por sondeo (funciona en carpetas de red sin inotify) y procesa
+    las imágenes nuevas que escribe el retinógrafo.
+    - Una imagen se considera completa cuando su tamaño y mtime no cambian durante
+      `stable_polls` sondeos seguidos.
+    - Las imágenes listas se agrupan durante `batch_window` segundos (o hasta
+      `max_batch`) y se procesan en un solo lote con gc.iter_process.
+    - on_results(lista de resultados) se llama desde el hilo del watcher al terminar
+      cada lote; on_error(path, error) para las imágenes que fallan.
+    """
+
+    def __init__(self, gc, folder, output_root="resultados", on_results=None, on_error=None,
+                 poll_interval=1.0, stable_polls=2, batch_window=2.0, max_batch=16,
+                 recursive=True, process_existing=False, max_retries=3, process_kwargs=None):
+        self.gc = gc
+        self.folder = folder
+        self.output_root = output_root
+        self.on_results = on_results
+        self.on_error = on_error
+        self.poll_interval = poll_interval
+        self.stable_polls = stable_polls
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.recursive = recursive
+        self.process_existing = process_existing
+        self.max_retries = max_retries
+        self.process_kwargs = dict(process_kwargs or {})
+        self._done = {}      # ruta -> firma procesada
+        self._pending = {}   # ruta -> [firma, sondeos estables]
+        self._ready = []     # rutas completas esperando lote
+        self._ready_since = None
+        self._retries = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.processed = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="folder-watcher", daemon=True)
+        self._thread.start()
+        log.info("Vigilando carpeta: %s", self.folder)
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        log.info("Vigilancia detenida: %s", self.folder)
+
+    def _run(self):
+        if not self.process_existing:
+            # las imágenes ya presentes al iniciar no se procesan
+            for path in scan_images(self.folder, recursive=self.recursive):
+                self._done[path] = file_signature(path)
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                log.error("Vigilancia de %s: %s", self.folder, e, exc_info=True)
+            self._stop.wait(self.poll_interval)
+        # lo que quedó listo se procesa antes de salir
+        if self._ready:
+            self._flush()
+
+    def poll(self):
+        """Un sondeo: detecta imágenes nuevas o modificadas y procesa el lote si corresponde."""
+        for path in scan_images(self.folder, recursive=self.recursive):
+            if path in self._ready:
+                continue
+            sig = file_signature(path)
+            if sig is None or self._done.get(path) == sig:
+                continue
+            entry = self._pending.get(path)
+            if entry is None or entry[0] != sig:
+                # nueva o todavía cambiando
+                self._pending[path] = [sig, 0]
+                continue
+            entry[1] += 1
+            if entry[1] >= self.stable_polls:
+                del self._pending[path]
+                self._ready.append(path)
+                if self._ready_since is None:
+                    self._ready_since = time.monotonic()
+
+        if self._ready and (len(self._ready) >= self.max_batch
+                            or time.monotonic() - self._ready_since >= self.batch_window):
+            self._flush()
+
+    def _flush(self):
+        paths, self._ready, self._ready_since = self._ready[:self.max_batch], self._ready[self.max_batch:], None
+        if self._ready:
+            self._ready_since = time.monotonic()
+        results = []
+        for path, res, err in self.gc.iter_process(paths, output_root=self.output_root, batch_size=len(paths),
+                                                   input_root=self.folder if self.recursive else None,
+                                                   **self.process_kwargs):
+            if err is None:
+                self._done[path] = file_signature(path)
+                self._retries.pop(path, None)
+                results.append(res)
+                continue
+            # puede ser un archivo que el equipo todavía no terminó de escribir: se reintenta
+            n = self._retries.get(path, 0) + 1
+            self._retries[path] = n
+            if n >= self.max_retries:
+                self._done[path] = file_signature(path)
+                log.error("Al procesar %s: %s", os.path.basename(path), err,
+                          extra={"image": path, "error": f"{type(err).__name__}: {err}"})
+                if self.on_error is not None:
+                    self.on_error(path, err)
+        self.processed += len(results)
+        if results and self.on_results is not None:
+            self.on_results(results)
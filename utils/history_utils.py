@@ -1,27 +1,93 @@
 # utils/history_utils.py
 import os
+import csv
+import threading
 import pandas as pd
 from datetime import datetime
 
 MASTER_CSV = os.path.join("resultados", "master_history.csv")
 
+MASTER_COLUMNS = [
+    "timestamp", "image", "overlay_path", "heatmap_puro_path", "heatmap_cache_path", "csv_path",
+    "probabilidad", "centro_x", "centro_y", "bbox_xmin", "bbox_ymin", "bbox_xmax", "bbox_ymax",
+    "tamano_zona_activa", "nivel_urgencia", "nivel_urgencia_label", "job_id", "calidad", "calidad_motivo",
+    "duplicado_de", "incertidumbre", "modelo_fingerprint"
+]
+
+_lock = threading.Lock()
+# imágenes ya registradas por job_id (se carga una vez por trabajo, para no duplicar al reanudar)
+_job_images = {}
+
 def ensure_master():
     os.makedirs("resultados", exist_ok=True)
     if not os.path.exists(MASTER_CSV):
-        df = pd.DataFrame(columns=[
-            "timestamp", "image", "overlay_path", "heatmap_puro_path", "csv_path",
-            "probabilidad", "centro_x", "centro_y", "bbox_xmin", "bbox_ymin", "bbox_xmax", "bbox_ymax",
-            "tamano_zona_activa", "nivel_urgencia", "nivel_urgencia_label"
-        ])
+        df = pd.DataFrame(columns=MASTER_COLUMNS)
         df.to_csv(MASTER_CSV, index=False)
+        return
+    # migración: historiales creados con menos columnas se reescriben una sola vez
+    with open(MASTER_CSV, "r", newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    if header != MASTER_COLUMNS:
+        df = pd.read_csv(MASTER_CSV)
+        df.reindex(columns=MASTER_COLUMNS).to_csv(MASTER_CSV, index=False)
+
+def result_to_record(res):
+    """Convierte el dict de process_image en una fila del historial."""
+    # las imágenes descartadas por calidad no tienen zona activa
+    centro = res.get("centro") or (None, None)
+    bbox = res.get("bbox") or (None, None, None, None)
+    return {
+        "image": res["image"],
+        "overlay_path": res["overlay_path"],
+        "heatmap_puro_path": res["heatmap_puro_path"],
+        "heatmap_cache_path": res.get("heatmap_cache_path"),
+        "csv_path": res["csv_path"],
+        "probabilidad": res["probabilidad"],
+        "centro_x": centro[0],
+        "centro_y": centro[1],
+        "bbox_xmin": bbox[0],
+        "bbox_ymin": bbox[1],
+        "bbox_xmax": bbox[2],
+        "bbox_ymax": bbox[3],
+        "tamano_zona_activa": res["tamano_zona_activa"],
+        "nivel_urgencia": res["nivel_urgencia"],
+        "nivel_urgencia_label": res["nivel_urgencia_label"],
+        "job_id": res.get("job_id"),
+        "calidad": res.get("calidad"),
+        "calidad_motivo": res.get("calidad_motivo"),
+        "duplicado_de": res.get("duplicado_de"),
+        "incertidumbre": res.get("incertidumbre"),
+        "modelo_fingerprint": res.get("modelo_fingerprint"),
+    }
+
+def _images_of_job(job_id):
+    if job_id not in _job_images:
+        df = pd.read_csv(MASTER_CSV, usecols=["image", "job_id"])
+        _job_images[job_id] = set(df.loc[df["job_id"] == job_id, "image"])
+    return _job_images[job_id]
 
 def append_record(record_dict):
-    ensure_master()
-    df = pd.read_csv(MASTER_CSV)
-    record = record_dict.copy()
-    record["timestamp"] = datetime.now().isoformat()
-    df = pd.concat([df, pd.DataFrame([record])], ignore_index=True)
-    df.to_csv(MASTER_CSV, index=False)
+    """
+    Agrega una fila al final del historial (sin releer el archivo completo).
+    Si el registro trae job_id y esa imagen ya figura para el mismo trabajo
+    (p. ej. al reanudar un trabajo interrumpido), no se agrega de nuevo.
+    Devuelve True si se agregó.
+    """
+    with _lock:
+        ensure_master()
+        record = record_dict.copy()
+        job_id = record.get("job_id")
+        if job_id:
+            seen = _images_of_job(job_id)
+            if record["image"] in seen:
+                return False
+            seen.add(record["image"])
+        record["timestamp"] = datetime.now().isoformat()
+        with open(MASTER_CSV, "a", newline="", encoding="utf-8") as f:
+            csv.DictWriter(f, fieldnames=MASTER_COLUMNS, extrasaction="ignore").writerow(record)
+            f.flush()
+            os.fsync(f.fileno())
+        return True
 
 def read_master():
     ensure_master()
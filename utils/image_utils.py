@@ -0,0 +1,115 @@
+# utils/image_utils.py
+import os
+import cv2
+import numpy as np
+
+# formato -> extensión de archivo
+OUTPUT_FORMATS = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+
+
+class OutputSettings:
+    """
+    Configuración de las imágenes que genera process_image.
+    fmt: "png", "jpeg" o "webp"
+    png_compression: 0..9 (None = valor por defecto de OpenCV)
+    quality: 1..100 para JPEG/WebP
+    max_dim: lado máximo en pixeles de las imágenes guardadas (None = resolución original)
+    lazy: no se escriben imágenes al detectar; se guarda el heatmap y el overlay
+          se genera bajo demanda al abrir el detalle
+    """
+
+    def __init__(self, fmt="png", png_compression=None, quality=90, max_dim=None, lazy=False):
+        fmt = fmt.lower()
+        if fmt == "jpg":
+            fmt = "jpeg"
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Formato de salida no soportado: {fmt}")
+        self.fmt = fmt
+        self.png_compression = png_compression
+        self.quality = quality
+        self.max_dim = max_dim
+        self.lazy = lazy
+
+    @property
+    def extension(self):
+        return OUTPUT_FORMATS[self.fmt]
+
+    def imwrite_params(self):
+        """Parámetros para cv2.imwrite según el formato elegido."""
+        if self.fmt == "png":
+            if self.png_compression is None:
+                return []
+            return [cv2.IMWRITE_PNG_COMPRESSION, int(self.png_compression)]
+        if self.fmt == "jpeg":
+            return [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)]
+        return [cv2.IMWRITE_WEBP_QUALITY, int(self.quality)]
+
+    def to_dict(self):
+        return {
+            "fmt": self.fmt,
+            "png_compression": self.png_compression,
+            "quality": self.quality,
+            "max_dim": self.max_dim,
+            "lazy": self.lazy,
+        }
+
+
+def limit_size(img, max_dim):
+    """Reduce img para que su lado mayor no supere max_dim (no agranda)."""
+    if not max_dim:
+        return img
+    h, w = img.shape[:2]
+    scale = max_dim / float(max(h, w))
+    if scale >= 1.0:
+        return img
+    new_size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return cv2.resize(img, new_size, interpolation=cv2.INTER_AREA)
+
+
+def save_image(path_without_ext, img_bgr, settings):
+    """
+    Guarda img_bgr (uint8 BGR) con el formato de settings.
+    Devuelve la ruta final (con la extensión del formato).
+    """
+    path = path_without_ext + settings.extension
+    img_bgr = limit_size(img_bgr, settings.max_dim)
+    if not cv2.imwrite(path, img_bgr, settings.imwrite_params()):
+        raise IOError(f"No se pudo guardar la imagen: {path}")
+    return path
+
+
+def save_heatmap_cache(path, heatmap_small):
+    """Guarda el heatmap a resolución del modelo (pocos KB) para renderizar luego; float16 se conserva."""
+    heatmap_small = np.asarray(heatmap_small)
+    np.save(path, heatmap_small if heatmap_small.dtype == np.float16 else heatmap_small.astype(np.float32))
+    return path
+
+
+def load_heatmap_cache(path):
+    if not isinstance(path, str) or not os.path.exists(path):
+        return None
+    return np.load(path)
+
+
+# factores de reducción que OpenCV aplica al decodificar (en JPEG la reducción la hace el decoder, mucho más rápido)
+_REDUCED_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                  1: cv2.IMREAD_COLOR}
+
+
+def imread_reduced(path, min_side=224, max_factor=8):
+    """
+    Lee una imagen (BGR) reducida por el mayor factor (1, 2, 4 u 8, hasta max_factor) que
+    deje su lado menor >= min_side. Útil para etapas que solo necesitan una versión chica.
+    Devuelve (img_bgr, factor) o (None, 0) si no se pudo leer.
+    """
+    factor = max(f for f in _REDUCED_FLAGS if f <= max_factor)
+    img = cv2.imread(path, _REDUCED_FLAGS[factor])
+    if img is None:
+        return None, 0
+    if factor == 1 or min(img.shape[:2]) >= min_side:
+        return img, factor
+    # con el tamaño de la primera lectura se estima el factor justo y se lee una sola vez más
+    full_side = min(img.shape[:2]) * factor
+    factor = max([f for f in _REDUCED_FLAGS if f < factor and full_side // f >= min_side] or [1])
+    img = cv2.imread(path, _REDUCED_FLAGS[factor])
+    return (img, factor) if img is not None else (None, 0)
@@ -0,0 +1,151 @@
+# utils/job_journal.py
+import os
+import json
+import uuid
+import hashlib
+import threading
+import logging
+from datetime import datetime
+
+from utils.results_store import to_jsonable
+
+log = logging.getLogger(__name__)
+
+JOBS_DIRNAME = "jobs"
+
+
+def jobs_dir(output_root="resultados"):
+    """Carpeta de journals de los trabajos que escriben en output_root (output_root/jobs)."""
+    return os.path.join(output_root, JOBS_DIRNAME)
+
+
+def job_key(input_folder, output_root):
+    """Identificador estable de (carpeta de entrada, carpeta de salida) para el nombre del journal."""
+    raw = f"{os.path.abspath(input_folder)}|{os.path.abspath(output_root)}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class JobJournal:
+    """
+    Journal de un trabajo por lotes (JSON Lines, un registro por imagen terminada).
+    Cada registro se escribe con flush + fsync, así sobrevive a un corte de luz o a un
+    reinicio del equipo; una última línea cortada se ignora al leer.
+    El journal queda en output_root/jobs (ver jobs_dir). Si existe uno sin terminar para la
+    misma carpeta y con los mismos params, se reanuda: mismo job_id y las imágenes ya
+    registradas no se vuelven a procesar. Con otros params se empieza un trabajo nuevo.
+    """
+
+    def __init__(self, input_folder, output_root="resultados", params=None, jobs_folder=None):
+        jobs_folder = jobs_folder or jobs_dir(output_root)
+        os.makedirs(jobs_folder, exist_ok=True)
+        self.path = os.path.join(jobs_folder, f"{job_key(input_folder, output_root)}.jsonl")
+        self.params = to_jsonable(params or {})
+        self.done = {}
+        self.resumed = False
+        self._lock = threading.Lock()
+        header = self._load()
+        if header is not None and not self.finished and header.get("params") != self.params:
+            log.warning("El trabajo interrumpido %s usó otros parámetros: se empieza de nuevo", header["job_id"],
+                        extra={"job_id": header["job_id"], "params_anteriores": header.get("params"),
+                               "params": self.params})
+            header = None
+        if header is not None and not self.finished:
+            self.job_id = header["job_id"]
+            self.resumed = True
+            self._f = open(self.path, "a", encoding="utf-8")
+            log.info("Reanudando trabajo %s: %d imágenes ya procesadas", self.job_id, len(self.done),
+                     extra={"job_id": self.job_id})
+        else:
+            # sin journal o el anterior terminó: trabajo nuevo
+            self.job_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+            self.done = {}
+            self._f = open(self.path, "w", encoding="utf-8")
+            self._write({"tipo": "inicio", "job_id": self.job_id, "input_folder": os.path.abspath(input_folder),
+                         "output_root": os.path.abspath(output_root), "params": self.params,
+                         "timestamp": datetime.now().isoformat()})
+
+    def _load(self):
+        self.finished = False
+        if not os.path.exists(self.path):
+            return None
+        header = None
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # última línea cortada por la interrupción
+                tipo = rec.get("tipo")
+                if tipo == "inicio":
+                    header = rec
+                elif tipo == "imagen":
+                    self.done[rec["image"]] = rec["result"]
+                elif tipo == "fin":
+                    self.finished = True
+        return header
+
+    def _write(self, rec):
+        with self._lock:
+            self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def lookup(self, image_path):
+        """Resultado ya registrado de image_path en este trabajo, o None."""
+        res = self.done.get(os.path.abspath(image_path))
+        if res is None:
+            return None
+        res = dict(res)
+        res["image"] = image_path
+        res["reutilizado"] = True
+        return res
+
+    def record(self, image_path, res):
+        """Registra una imagen terminada (después de haber guardado sus resultados)."""
+        key = os.path.abspath(image_path)
+        result = {k: v for k, v in res.items() if k not in ("tiempos_ms", "contadores", "reutilizado")}
+        self.done[key] = to_jsonable(result)
+        self._write({"tipo": "imagen", "image": key, "result": self.done[key]})
+
+    def record_error(self, image_path, err):
+        self._write({"tipo": "error", "image": os.path.abspath(image_path), "error": f"{type(err).__name__}: {err}"})
+
+    def finish(self):
+        self._write({"tipo": "fin", "job_id": self.job_id, "imagenes": len(self.done),
+                     "timestamp": datetime.now().isoformat()})
+        self.finished = True
+        self.close()
+
+    def close(self):
+        if not self._f.closed:
+            self._f.close()
+
+
+def unfinished_jobs(output_root="resultados"):
+    """
+    Encabezados de los trabajos sin terminar que escriben en output_root (para ofrecer
+    reanudarlos al iniciar la app).
+    """
+    jobs = []
+    folder = jobs_dir(output_root)
+    if not os.path.isdir(folder):
+        return jobs
+    for fname in sorted(os.listdir(folder)):
+        if not fname.endswith(".jsonl"):
+            continue
+        header, finished, n = None, False, 0
+        with open(os.path.join(folder, fname), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if rec.get("tipo") == "inicio":
+                    header = rec
+                elif rec.get("tipo") == "imagen":
+                    n += 1
+                elif rec.get("tipo") == "fin":
+                    finished = True
+        if header is not None and not finished:
+            jobs.append(dict(header, procesadas=n))
+    return jobs
@@ -0,0 +1,123 @@
+# utils/logging_setup.py
+import os
+import json
+import copy
+import queue
+import atexit
+import logging
+import platform
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_PATH = os.path.join("resultados", "logs", "app.jsonl")
+# variables de entorno para otro archivo ("" = sin archivo) y otro nivel
+LOG_PATH_ENV = "GLAUCOMA_LOG_PATH"
+LOG_LEVEL_ENV = "GLAUCOMA_LOG_LEVEL"
+# logger de los registros por imagen (ver utils.metrics.LoggingSink): solo van al archivo
+IMAGE_LOGGER = "imagenes"
+
+# atributos propios de LogRecord; el resto (extra=...) va como campo del JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Un objeto JSON por línea: fecha, nivel, logger, mensaje, equipo, proceso e hilo, más los
+    campos pasados en extra (p. ej. image, tiempos_ms, modelo_fingerprint, error) y el
+    traceback si hubo excepción.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.host = platform.node()
+
+    def format(self, record):
+        data = {
+            "fecha": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+            "equipo": self.host,
+            "pid": record.process,
+            "hilo": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if record.exc_info:
+            data["traceback"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["traceback"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler que en el hilo que llama solo resuelve el mensaje y el traceback (como texto,
+    aparte): el JSON y la escritura los hace el hilo del QueueListener.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(log_path=None, level=None, console=True, max_bytes=5 * 1024 * 1024, backup_count=5):
+    """
+    Logging estructurado de la aplicación: el logger raíz solo encola los registros
+    (QueueHandler) y un QueueListener en su propio hilo los escribe en log_path como JSON
+    Lines con rotación (max_bytes, backup_count) y, con console, en stderr como
+    "[NIVEL] mensaje" (sin los registros por imagen). Se llama una vez al iniciar la app, la
+    CLI o el servidor; las siguientes llamadas no hacen nada.
+    log_path: por defecto GLAUCOMA_LOG_PATH o resultados/logs/app.jsonl ("" = sin archivo)
+    level: por defecto GLAUCOMA_LOG_LEVEL o INFO
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+    if log_path is None:
+        log_path = os.environ.get(LOG_PATH_ENV, LOG_PATH)
+    level = (level or os.environ.get(LOG_LEVEL_ENV) or "INFO").upper()
+
+    handlers = []
+    if log_path:
+        folder = os.path.dirname(log_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        file_handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+        console_handler.addFilter(lambda record: record.name != IMAGE_LOGGER)
+        handlers.append(console_handler)
+
+    _queue_handler = _DeferredQueueHandler(queue.SimpleQueue())
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+    _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Vacía la cola, cierra los archivos y saca el handler del logger raíz."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener = _queue_handler = None
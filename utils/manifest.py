@@ -0,0 +1,155 @@
+# utils/manifest.py
+import os
+import json
+import shutil
+import hashlib
+import threading
+import logging
+
+from utils.results_store import to_jsonable
+
+log = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 2
+
+# rutas de archivos generados que deben seguir existiendo para reutilizar un resultado
+RESULT_FILE_KEYS = ("overlay_path", "heatmap_puro_path", "heatmap_cache_path", "csv_path")
+
+
+def config_id(config):
+    """Identificador corto de una configuración de procesamiento (sha1 de su JSON canónico)."""
+    text = json.dumps(to_jsonable(config or {}), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def file_signature(path):
+    """(tamaño, mtime en ns) de un archivo, o None si no se puede leer."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _result_folder(res):
+    """Carpeta (absoluta) de los archivos generados de un resultado, o None."""
+    path = next((res[k] for k in RESULT_FILE_KEYS if res.get(k)), None)
+    return os.path.dirname(os.path.abspath(path)) if path else None
+
+
+class ResultsManifest:
+    """
+    Manifiesto de una carpeta de resultados (output_root/manifest.json): por cada imagen
+    de entrada guarda tamaño, mtime y el resultado producido. Permite volver a correr
+    process_folder procesando solo las imágenes nuevas o modificadas.
+    config: parámetros que afectan al resultado (umbral, formato, modelo...). Cada entrada
+    guarda el identificador de la configuración con que se produjo y solo se reutiliza con
+    esa misma; las de otras configuraciones (u otras carpetas) se conservan, así varias
+    carpetas o modelos pueden compartir output_root sin descartarse entre sí.
+    """
+
+    def __init__(self, output_root, config=None, save_every=200):
+        self.output_root = output_root
+        self.path = os.path.join(output_root, MANIFEST_FILENAME)
+        self.config = to_jsonable(config or {})
+        self.config_id = config_id(self.config)
+        # identificador -> configuración de todas las entradas (solo informativo)
+        self.configs = {self.config_id: self.config}
+        self.save_every = save_every
+        self.entries = {}
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def key(image_path):
+        return os.path.abspath(image_path)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error("Manifiesto ilegible, se reprocesará todo: %s", e)
+            return
+        if data.get("version") != MANIFEST_VERSION:
+            log.info("Manifiesto de otra versión: se ignora y se reprocesa todo")
+            return
+        self.entries = data.get("imagenes", {})
+        self.configs.update(data.get("configs", {}))
+
+    def lookup(self, image_path):
+        """Resultado guardado si la imagen no cambió y sus archivos siguen existiendo; si no, None."""
+        entry = self.entries.get(self.key(image_path))
+        if entry is None or entry.get("config") != self.config_id:
+            return None
+        sig = file_signature(image_path)
+        if sig is None or [entry["size"], entry["mtime_ns"]] != list(sig):
+            return None
+        res = entry["result"]
+        if any(res.get(k) and not os.path.exists(res[k]) for k in RESULT_FILE_KEYS):
+            return None
+        res = dict(res)
+        res["image"] = image_path
+        res["reutilizado"] = True
+        return res
+
+    def update(self, image_path, res):
+        """Registra el resultado de una imagen recién procesada."""
+        sig = file_signature(image_path)
+        if sig is None:
+            return
+        result = {k: v for k, v in res.items() if k not in ("tiempos_ms", "contadores", "reutilizado")}
+        with self._lock:
+            self.entries[self.key(image_path)] = {"size": sig[0], "mtime_ns": sig[1], "config": self.config_id,
+                                                  "result": to_jsonable(result)}
+            self._dirty += 1
+            flush = self.save_every and self._dirty >= self.save_every
+        if flush:
+            self.save()
+
+    def prune_deleted(self, input_folder, remove_outputs=True):
+        """
+        Quita del manifiesto las imágenes de input_folder que ya no existen y, si
+        remove_outputs, borra su carpeta de resultados. Devuelve la lista de rutas quitadas.
+        """
+        prefix = os.path.join(os.path.abspath(input_folder), "")
+        root = os.path.join(os.path.abspath(self.output_root), "")
+        removed = []
+        with self._lock:
+            pruned = []
+            for key in [k for k in self.entries if k.startswith(prefix) and not os.path.exists(k)]:
+                pruned.append(self.entries.pop(key))
+                removed.append(key)
+            # carpetas que siguen en uso: un duplicado (ver utils.phash_index) guarda una copia del
+            # resultado de la original, con las rutas de sus archivos
+            in_use = {_result_folder(e["result"]) for e in self.entries.values()}
+            for entry in pruned if remove_outputs else []:
+                res = entry["result"]
+                folder = _result_folder(res)
+                if res.get("duplicado_de") or folder in in_use:
+                    continue
+                # solo se borran carpetas dentro de output_root
+                if folder and folder.startswith(root) and os.path.isdir(folder):
+                    shutil.rmtree(folder, ignore_errors=True)
+            if removed:
+                self._dirty += len(removed)
+        return removed
+
+    def save(self):
+        """Escribe el manifiesto de forma atómica (archivo temporal + os.replace)."""
+        with self._lock:
+            used = {e.get("config") for e in self.entries.values()}
+            configs = {k: v for k, v in self.configs.items() if k in used}
+            data = {"version": MANIFEST_VERSION, "configs": configs, "imagenes": self.entries}
+            os.makedirs(self.output_root, exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._dirty = 0
@@ -0,0 +1,74 @@
+# utils/memory.py
+import os
+import sys
+import ctypes
+
+_MB = 1024.0 * 1024.0
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+
+class _MemoryStatusEx(ctypes.Structure):
+    _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+
+
+def _windows_counters():
+    counters = _ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32, psapi = ctypes.windll.kernel32, ctypes.windll.psapi
+    # el pseudo-handle del proceso es un puntero: sin restype/argtypes se truncaría a 32 bits
+    kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+    psapi.GetProcessMemoryInfo.argtypes = [ctypes.c_void_p, ctypes.POINTER(_ProcessMemoryCounters), ctypes.c_ulong]
+    if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+
+def current_rss_mb():
+    """Memoria residente actual del proceso en MB (None si no se puede medir en esta plataforma)."""
+    if sys.platform == "win32":
+        counters = _windows_counters()
+        return counters.WorkingSetSize / _MB if counters else None
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / _MB
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso desde que arrancó, en MB (None si no se puede medir)."""
+    if sys.platform == "win32":
+        counters = _windows_counters()
+        return counters.PeakWorkingSetSize / _MB if counters else None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return peak / _MB if sys.platform == "darwin" else peak / 1024.0
+
+
+def total_memory_mb():
+    """RAM física total del equipo en MB (None si no se puede medir)."""
+    if sys.platform == "win32":
+        status = _MemoryStatusEx()
+        status.dwLength = ctypes.sizeof(status)
+        if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return None
+        return status.ullTotalPhys / _MB
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / _MB
+    except (ValueError, OSError, AttributeError):
+        return None
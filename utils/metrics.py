@@ -0,0 +1,168 @@
+# utils/metrics.py
+import json
+import time
+import logging
+import threading
+from collections import deque, defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.logging_setup import IMAGE_LOGGER
+
+log = logging.getLogger(__name__)
+
+
+@contextmanager
+def stage_timer(timings, name):
+    """Suma en timings[name] los milisegundos que tarda el bloque."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - t0) * 1000.0
+
+
+class MemorySink:
+    """Guarda los últimos registros en memoria (útil para pruebas y para la GUI)."""
+
+    def __init__(self, maxlen=1000):
+        self.records = deque(maxlen=maxlen)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """Agrega un registro JSON por imagen a un archivo."""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "a", encoding="utf-8")
+        # record() llama a emit desde varios hilos: sin lock las líneas se mezclan
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+
+class LogFileSink:
+    """Una línea legible por imagen: nombre, total y tiempo de cada etapa."""
+
+    def __init__(self, path):
+        self.path = path
+        self._f = open(path, "a", encoding="utf-8")
+        # record() llama a emit desde varios hilos: sin lock las líneas se mezclan
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        stages = " ".join(f"{k}={v:.1f}ms" for k, v in record["tiempos_ms"].items())
+        line = f"{record['timestamp']} {record['image']} total={record['total_ms']:.1f}ms {stages}\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+
+    def close(self):
+        with self._lock:
+            self._f.close()
+
+
+class LoggingSink:
+    """
+    Cada imagen como registro de log estructurado (logger IMAGE_LOGGER, ver utils.logging_setup):
+    image, total_ms, tiempos_ms por etapa y los extra de record (modelo_fingerprint, lote...).
+    """
+
+    def __init__(self, logger_name=IMAGE_LOGGER):
+        self.logger = logging.getLogger(logger_name)
+
+    def emit(self, record):
+        fields = {k: v for k, v in record.items() if k != "timestamp"}
+        self.logger.info("Imagen procesada: %s", record["image"], extra=fields)
+
+    def close(self):
+        pass
+
+
+class PipelineMetrics:
+    """
+    Agregados móviles del pipeline: p50/p95 por etapa e imágenes por segundo sobre
+    las últimas `window` imágenes. Cada imagen registrada se envía además a los sinks.
+    """
+
+    def __init__(self, window=500, sinks=None):
+        self.window = window
+        self.sinks = list(sinks or [])
+        self._stages = defaultdict(lambda: deque(maxlen=window))
+        self._totals = deque(maxlen=window)
+        self._done_at = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def record(self, image, timings, **extra):
+        """Registra los tiempos (ms por etapa) de una imagen ya procesada."""
+        total = float(sum(timings.values()))
+        now = time.time()
+        with self._lock:
+            for stage, ms in timings.items():
+                self._stages[stage].append(ms)
+            self._totals.append(total)
+            self._done_at.append(now)
+            self.counters["imagenes"] += 1
+        record = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now)),
+            "image": image,
+            "total_ms": total,
+            "tiempos_ms": dict(timings),
+        }
+        record.update(extra)
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                log.error("Sink de métricas: %s", e, exc_info=True)
+
+    def throughput(self):
+        """Imágenes por segundo sobre la ventana actual."""
+        with self._lock:
+            if len(self._done_at) < 2:
+                return 0.0
+            span = self._done_at[-1] - self._done_at[0]
+            return (len(self._done_at) - 1) / span if span > 0 else 0.0
+
+    def snapshot(self):
+        """Resumen actual: p50/p95 por etapa, total por imagen, imágenes/s y contadores."""
+        with self._lock:
+            stages = {name: list(vals) for name, vals in self._stages.items() if vals}
+            totals = list(self._totals)
+            counters = dict(self.counters)
+        summary = {
+            "etapas": {name: {"p50_ms": float(np.percentile(v, 50)), "p95_ms": float(np.percentile(v, 95))}
+                       for name, v in stages.items()},
+            "imagenes_por_s": self.throughput(),
+            "contadores": counters,
+        }
+        if totals:
+            summary["total"] = {"p50_ms": float(np.percentile(totals, 50)), "p95_ms": float(np.percentile(totals, 95))}
+        return summary
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,129 @@
+# utils/micro_batcher.py
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class QueueFullError(Exception):
+    """La cola de pedidos está llena: el cliente debe reintentar más tarde."""
+
+
+class MicroBatcher:
+    """
+    Agrupa pedidos concurrentes en lotes para una sola llamada al modelo.
+    Un hilo toma el primer pedido de la cola y espera hasta max_latency_ms
+    (o hasta juntar max_batch_size pedidos) antes de llamar a process_fn.
+
+    process_fn: recibe la lista de items y devuelve una lista de (resultado, error)
+                del mismo largo (ver GradCAMVisualizer.process_batch)
+    max_queue: pedidos en espera como máximo; por encima reserve/submit lanzan QueueFullError.
+               reserve() permite comprobar el lugar antes del trabajo caro de cada pedido
+               (leer y decodificar la imagen) y submit(item, reserved=True) lo usa después.
+    Los futures de pedidos cancelados (p. ej. por timeout del cliente) antes de entrar en un
+    lote no se procesan; stop() hace fallar los que quedaron en la cola.
+    """
+
+    def __init__(self, process_fn, max_batch_size=8, max_latency_ms=25, max_queue=64):
+        self.process_fn = process_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_latency = max(0.0, max_latency_ms / 1000.0)
+        self._queue = queue.Queue()
+        # lugares de la cola (reservados o con un pedido en espera); se liberan al armar el lote
+        self._slots = threading.BoundedSemaphore(max(1, int(max_queue)))
+        self._stop = threading.Event()
+        self._thread = None
+        # estadísticas simples para /health
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # los pedidos que no llegaron a un lote no quedan esperando para siempre
+        while True:
+            try:
+                _, fut = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._slots.release()
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(RuntimeError("Servicio de inferencia detenido"))
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def reserve(self):
+        """Reserva un lugar en la cola sin bloquear; QueueFullError si está llena."""
+        if self._stop.is_set() or not self._slots.acquire(blocking=False):
+            raise QueueFullError("Cola de inferencia llena")
+
+    def release(self):
+        """Libera un lugar reservado que no se va a usar (p. ej. si el pedido resultó inválido)."""
+        self._slots.release()
+
+    def submit(self, item, reserved=False):
+        """
+        Encola un item y devuelve un Future con su resultado. No bloquea.
+        reserved: el lugar ya se tomó con reserve() (si no, se toma acá).
+        """
+        if not reserved:
+            self.reserve()
+        fut = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def _take(self, timeout):
+        """Siguiente pedido de la cola (None si no llegó ninguno); los cancelados se descartan."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                item, fut = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+            self._slots.release()
+            if fut.set_running_or_notify_cancel():
+                return item, fut
+
+    def _collect(self):
+        first = self._take(0.2)
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            nxt = self._take(remaining)
+            if nxt is None:
+                break
+            batch.append(nxt)
+        return batch
+
+    def _loop(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            try:
+                outcomes = self.process_fn(items)
+            except Exception as e:
+                outcomes = [(None, e)] * len(items)
+            self.batches += 1
+            self.items += len(items)
+            for (_, fut), (res, err) in zip(batch, outcomes):
+                if err is not None:
+                    fut.set_exception(err)
+                else:
+                    fut.set_result(res)
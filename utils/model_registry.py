@@ -0,0 +1,175 @@
+# utils/model_registry.py
+import os
+import json
+import hashlib
+import threading
+import logging
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+REGISTRY_PATH = os.path.join("resultados", "model_registry.json")
+# caracteres del sha256 que se guardan como "modelo_fingerprint" en resultados e historial
+FINGERPRINT_LENGTH = 16
+
+# (ruta, tamaño, mtime) -> sha256, para no releer un .h5 de varios MB en cada arranque
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """sha256 (hex) del contenido de un archivo de modelo (memorizado mientras no cambien tamaño y mtime)."""
+    st = os.stat(path)
+    sig = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _digests_lock:
+        digest = _digests.get(sig)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _digests_lock:
+            _digests[sig] = digest
+    return digest
+
+
+def short_fingerprint(model_path):
+    """Fingerprint corto del modelo en model_path (prefijo de su sha256)."""
+    return file_fingerprint(model_path)[:FINGERPRINT_LENGTH]
+
+
+class ModelRegistry:
+    """
+    Registro de modelos con versiones y fingerprint de contenido (resultados/model_registry.json).
+    Cada entrada: nombre, version (entera, por nombre), ruta, sha256 y fecha de alta. Registrar
+    un archivo con el mismo contenido que otra entrada no crea una versión nueva.
+    """
+
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self.entries = []
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("modelos", [])
+        except (OSError, ValueError) as e:
+            log.error("Registro de modelos ilegible, se reconstruye: %s", e)
+
+    def save(self):
+        """Escribe el registro de forma atómica (archivo temporal + os.replace)."""
+        with self._lock:
+            data = {"modelos": self.entries}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def register(self, model_path, name=None, version=None):
+        """Agrega model_path (o devuelve la entrada con el mismo contenido) y guarda el registro."""
+        digest = file_fingerprint(model_path)
+        name = name or os.path.splitext(os.path.basename(model_path))[0]
+        with self._lock:
+            for entry in self.entries:
+                if entry["sha256"] == digest:
+                    # mismo contenido: solo se actualiza la ruta si el archivo se movió
+                    if not os.path.exists(entry["ruta"]):
+                        entry["ruta"] = os.path.abspath(model_path)
+                        break
+                    return entry
+            else:
+                if version is None:
+                    version = max((e["version"] for e in self.entries if e["nombre"] == name), default=0) + 1
+                entry = {
+                    "nombre": name,
+                    "version": int(version),
+                    "ruta": os.path.abspath(model_path),
+                    "sha256": digest,
+                    "agregado": datetime.now().isoformat(timespec="seconds"),
+                }
+                self.entries.append(entry)
+        self.save()
+        return entry
+
+    def find(self, key):
+        """
+        Entrada por fingerprint (sha256 o su prefijo), "nombre:version" o nombre (última versión).
+        None si no existe.
+        """
+        with self._lock:
+            entries = list(self.entries)
+        for entry in entries:
+            if len(key) >= 8 and entry["sha256"].startswith(key.lower()):
+                return entry
+        name, _, version = key.partition(":")
+        matches = [e for e in entries if e["nombre"] == name and (not version or str(e["version"]) == version)]
+        return max(matches, key=lambda e: e["version"]) if matches else None
+
+    def available(self):
+        """Entradas cuyo archivo existe, ordenadas por nombre y versión."""
+        with self._lock:
+            entries = [e for e in self.entries if os.path.exists(e["ruta"])]
+        return sorted(entries, key=lambda e: (e["nombre"], e["version"]))
+
+    @staticmethod
+    def label(entry):
+        return f"{entry['nombre']} v{entry['version']} · {entry['sha256'][:8]}"
+
+
+class ModelSwapper:
+    """
+    Modelo activo con reemplazo en caliente: swap() carga y precalienta el modelo nuevo en un
+    hilo aparte (factory(entrada) -> GradCAMVisualizer, luego warm_up) y recién cuando está
+    listo lo publica como activo de una sola vez. Hasta entonces se sigue usando el anterior;
+    los trabajos en curso terminan con el modelo con el que empezaron.
+    """
+
+    def __init__(self, factory, current=None, entry=None):
+        self.factory = factory
+        self.entry = entry
+        self._current = current
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def current(self):
+        with self._lock:
+            return self._current
+
+    @property
+    def busy(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def swap(self, entry, on_ready=None, on_error=None):
+        """Carga entry en segundo plano; on_ready(visualizador) u on_error(mensaje) desde ese hilo."""
+        if self.busy:
+            raise RuntimeError("Ya hay un cambio de modelo en curso")
+
+        def _load():
+            try:
+                log.info("Cargando modelo %s...", ModelRegistry.label(entry))
+                visualizer = self.factory(entry)
+                visualizer.warm_up()
+            except Exception as e:
+                log.error("No se pudo cargar el modelo %s: %s", entry["ruta"], e, exc_info=True,
+                          extra={"modelo_fingerprint": entry["sha256"][:FINGERPRINT_LENGTH]})
+                if on_error is not None:
+                    on_error(f"No se pudo cargar el modelo: {e}")
+                return
+            with self._lock:
+                self._current = visualizer
+                self.entry = entry
+            log.info("Modelo activo: %s", ModelRegistry.label(entry),
+                     extra={"modelo_fingerprint": entry["sha256"][:FINGERPRINT_LENGTH]})
+            if on_ready is not None:
+                on_ready(visualizer)
+
+        self._thread = threading.Thread(target=_load, name="model-swap", daemon=True)
+        self._thread.start()
+        return self._thread
@@ -0,0 +1,187 @@
+# utils/phash_index.py
+import os
+import json
+import threading
+import logging
+import cv2
+import numpy as np
+
+from utils.image_utils import imread_reduced
+from utils.manifest import RESULT_FILE_KEYS, config_id
+from utils.results_store import to_jsonable
+
+log = logging.getLogger(__name__)
+
+PHASH_INDEX_FILENAME = "phash_index.json"
+PHASH_INDEX_VERSION = 2
+
+# distancia de Hamming (sobre 64 bits) por defecto para considerar dos imágenes la misma toma:
+# solo hashes idénticos. Con 6 bits ya se confunden retinografías distintas (de otro paciente),
+# así que una distancia mayor tiene que pedirse explícitamente.
+DEFAULT_MAX_DISTANCE = 0
+
+# popcount de cada byte, para la distancia de Hamming vectorizada
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def phash(img_bgr):
+    """
+    Hash perceptual de 64 bits (DCT 32x32, bloque de bajas frecuencias 8x8 contra su mediana).
+    Robusto a reescalados, recompresión JPEG y pequeños cambios de brillo.
+    """
+    gray = img_bgr if img_bgr.ndim == 2 else cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    # el término DC (brillo medio) no entra en la mediana
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def phash_file(image_path):
+    """Hash perceptual de una imagen en disco con una lectura reducida, o None si no se pudo leer."""
+    img, _ = imread_reduced(image_path, min_side=64)
+    if img is None:
+        return None
+    return phash(img)
+
+
+class PerceptualIndex:
+    """
+    Índice de hashes perceptuales de las imágenes ya procesadas en una carpeta de resultados
+    (output_root/phash_index.json). Permite detectar ráfagas y reexportaciones de la misma toma
+    con otro nombre y reutilizar su resultado en lugar de volver a pasar por el modelo.
+    config: parámetros que afectan al resultado (como en ResultsManifest); solo se comparan
+    las entradas producidas con la misma configuración, las demás se conservan tal cual.
+    """
+
+    def __init__(self, output_root, config=None, max_distance=DEFAULT_MAX_DISTANCE, save_every=200):
+        self.output_root = output_root
+        self.path = os.path.join(output_root, PHASH_INDEX_FILENAME)
+        self.config = to_jsonable(config or {})
+        self.config_id = config_id(self.config)
+        self.max_distance = max_distance
+        self.save_every = save_every
+        # ruta -> posición; las primeras len(self.images) posiciones de _hashes son las válidas
+        self.images = []
+        self.results = []
+        self._pos = {}
+        self._hashes = np.zeros(64, dtype=np.uint64)
+        # entradas de otras configuraciones: no se comparan, pero se vuelven a guardar
+        self._other = []
+        self._dirty = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error("Índice de duplicados ilegible, se reconstruye: %s", e)
+            return
+        if data.get("version") != PHASH_INDEX_VERSION:
+            return
+        entries = []
+        for e in data.get("entradas", []):
+            (entries if e.get("config") == self.config_id else self._other).append(e)
+        self.images = [e["image"] for e in entries]
+        self.results = [e["result"] for e in entries]
+        self._pos = {img: i for i, img in enumerate(self.images)}
+        self._hashes = np.zeros(max(64, 2 * len(entries)), dtype=np.uint64)
+        self._hashes[:len(entries)] = [int(e["hash"], 16) for e in entries]
+
+    def __len__(self):
+        return len(self.images)
+
+    def distances(self, h):
+        """Distancia de Hamming de h a todos los hashes del índice (vectorizada)."""
+        x = np.bitwise_xor(self._hashes[:len(self.images)], np.uint64(h))
+        return _POPCOUNT[x.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+    def match(self, h, exclude=None):
+        """
+        Imagen del índice más parecida a h dentro de max_distance: (ruta, distancia) o None.
+        Las entradas aún en proceso (sin resultado) también cuentan, para agrupar las ráfagas
+        de una misma corrida. exclude: ruta a ignorar (la misma imagen de una corrida anterior).
+        """
+        with self._lock:
+            if not self.images:
+                return None
+            d = self.distances(h)
+            i = self._pos.get(os.path.abspath(exclude)) if exclude is not None else None
+            if i is not None:
+                d[i] = 65
+            i = int(np.argmin(d))
+            if d[i] > self.max_distance:
+                return None
+            return self.images[i], int(d[i])
+
+    def add(self, h, image_path):
+        """Agrega una imagen en proceso; su resultado se registra después con set_result."""
+        key = os.path.abspath(image_path)
+        if key in self._pos:
+            self.discard(image_path)
+        with self._lock:
+            n = len(self.images)
+            if n == len(self._hashes):
+                # capacidad duplicada: agregar es O(1) amortizado
+                grown = np.zeros(2 * n, dtype=np.uint64)
+                grown[:n] = self._hashes
+                self._hashes = grown
+            self._hashes[n] = np.uint64(h)
+            self._pos[key] = n
+            self.images.append(key)
+            self.results.append(None)
+
+    def set_result(self, image_path, res):
+        result = {k: v for k, v in res.items() if k not in ("tiempos_ms", "contadores", "reutilizado")}
+        with self._lock:
+            self.results[self._pos[os.path.abspath(image_path)]] = to_jsonable(result)
+            self._dirty += 1
+            flush = self.save_every and self._dirty >= self.save_every
+        if flush:
+            self.save()
+
+    def discard(self, image_path):
+        """Quita una imagen (p. ej. si falló su procesamiento)."""
+        with self._lock:
+            i = self._pos.pop(os.path.abspath(image_path))
+            # la última entrada pasa al lugar de la quitada (el orden del índice no importa)
+            last = len(self.images) - 1
+            if i != last:
+                self.images[i], self.results[i] = self.images[last], self.results[last]
+                self._hashes[i] = self._hashes[last]
+                self._pos[self.images[i]] = i
+            self.images.pop()
+            self.results.pop()
+
+    def linked_result(self, original, image_path):
+        """
+        Resultado de la imagen original del índice para image_path (con "duplicado_de"),
+        o None si todavía no tiene resultado o faltan sus archivos.
+        """
+        with self._lock:
+            res = self.results[self._pos[os.path.abspath(original)]]
+        if res is None or any(res.get(k) and not os.path.exists(res[k]) for k in RESULT_FILE_KEYS):
+            return None
+        res = dict(res)
+        res["duplicado_de"] = res.get("duplicado_de") or os.path.abspath(original)
+        res["image"] = image_path
+        return res
+
+    def save(self):
+        """Escribe el índice de forma atómica (solo las entradas con resultado)."""
+        with self._lock:
+            entries = [{"hash": f"{int(h):016x}", "image": img, "config": self.config_id, "result": res}
+                       for h, img, res in zip(self._hashes[:len(self.images)], self.images, self.results) if res is not None]
+            data = {"version": PHASH_INDEX_VERSION, "entradas": self._other + entries}
+            os.makedirs(self.output_root, exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._dirty = 0
@@ -0,0 +1,134 @@
+# utils/quality.py
+import time
+import cv2
+import numpy as np
+
+from utils.image_utils import imread_reduced
+
+# lado menor de la imagen de trabajo: las métricas se calculan siempre a esta escala
+# (192 permite leer una retinografía de 2048x1536 con reducción 1/8 en el decoder)
+QUALITY_SIDE = 192
+
+QUALITY_OK = "OK"
+QUALITY_FLAGGED = "DUDOSA"
+QUALITY_REJECTED = "RECHAZADA"
+
+
+class QualityGate:
+    """
+    Control de calidad barato antes de la inferencia, sobre una versión reducida de la imagen.
+    Métricas:
+    - máscara del fondo de ojo (píxeles no negros): fracción de la imagen y circularidad
+      del contorno mayor respecto de su círculo envolvente -> "no parece retinografía"
+    - brillo medio y fracción de píxeles saturados dentro de la máscara -> exposición
+    - varianza del Laplaciano dentro de la máscara (sin el borde) -> desenfoque
+    mode: "flag" procesa igual y marca la imagen como DUDOSA; "reject" no la pasa por el
+    modelo y devuelve un resultado RECHAZADA con el motivo.
+    """
+
+    def __init__(self, mode="flag", min_sharpness=20.0, min_brightness=35.0, max_brightness=200.0,
+                 max_clipped=0.15, min_fundus_fraction=0.2, min_circularity=0.66):
+        if mode not in ("flag", "reject"):
+            raise ValueError(f"Modo de control de calidad desconocido: {mode}")
+        self.mode = mode
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.min_fundus_fraction = min_fundus_fraction
+        self.min_circularity = min_circularity
+
+    @property
+    def rejects(self):
+        return self.mode == "reject"
+
+    def metrics(self, img_bgr, is_rgb=False):
+        """Métricas de calidad de una imagen BGR uint8 (de cualquier tamaño; RGB si is_rgb)."""
+        h, w = img_bgr.shape[:2]
+        scale = QUALITY_SIDE / float(min(h, w))
+        if scale < 1.0:
+            img_bgr = cv2.resize(img_bgr, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(img_bgr, cv2.COLOR_RGB2GRAY if is_rgb else cv2.COLOR_BGR2GRAY)
+
+        # máscara del fondo de ojo: todo lo que no es el marco negro (umbral relativo, así una
+        # imagen subexpuesta se informa como tal y no como "no es retinografía")
+        mask = (gray > max(8.0, 0.15 * float(np.percentile(gray, 99)))).astype(np.uint8)
+        fundus_fraction = float(mask.mean())
+        circularity = 0.0
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if contours:
+            largest = max(contours, key=cv2.contourArea)
+            _, radius = cv2.minEnclosingCircle(largest)
+            if radius > 0:
+                circularity = float(cv2.contourArea(largest) / (np.pi * radius * radius))
+
+        inside = mask.astype(bool)
+        values = gray[inside] if inside.any() else gray.ravel()
+        brightness = float(values.mean())
+        clipped = float(np.count_nonzero(values >= 250) / values.size)
+
+        # el borde del círculo daría un Laplaciano alto falso: se mide dentro de la máscara erosionada
+        inner = cv2.erode(mask, np.ones((9, 9), np.uint8)).astype(bool)
+        lap = cv2.Laplacian(gray, cv2.CV_32F)
+        sharpness = float(lap[inner].var()) if inner.any() else float(lap.var())
+
+        return {
+            "nitidez": sharpness,
+            "brillo": brightness,
+            "saturados": clipped,
+            "fraccion_fondo": fundus_fraction,
+            "circularidad": circularity,
+        }
+
+    def reasons(self, m):
+        """Motivos de baja calidad para las métricas m (lista vacía si la imagen es evaluable)."""
+        reasons = []
+        if m["fraccion_fondo"] < self.min_fundus_fraction or m["circularidad"] < self.min_circularity:
+            reasons.append("no parece retinografía")
+        if m["brillo"] < self.min_brightness:
+            reasons.append("subexpuesta")
+        elif m["brillo"] > self.max_brightness or m["saturados"] > self.max_clipped:
+            reasons.append("sobreexpuesta")
+        if m["nitidez"] < self.min_sharpness:
+            reasons.append("borrosa")
+        return reasons
+
+    def check(self, img_bgr, is_rgb=False):
+        """Evalúa una imagen ya leída (BGR, o RGB si is_rgb). Devuelve el dict de calidad (ver check_file)."""
+        t0 = time.perf_counter()
+        m = self.metrics(img_bgr, is_rgb=is_rgb)
+        reasons = self.reasons(m)
+        if not reasons:
+            status = QUALITY_OK
+        else:
+            status = QUALITY_REJECTED if self.rejects else QUALITY_FLAGGED
+        return {"calidad": status, "calidad_motivo": "; ".join(reasons), "calidad_metricas": m,
+                "calidad_ms": (time.perf_counter() - t0) * 1000.0}
+
+    def check_file(self, image_path):
+        """
+        Evalúa una imagen en disco con una lectura reducida (no decodifica la resolución completa).
+        Devuelve {"calidad": OK|DUDOSA|RECHAZADA, "calidad_motivo", "calidad_metricas", "calidad_ms"}
+        o None si no se pudo leer.
+        """
+        t0 = time.perf_counter()
+        img_bgr, _ = imread_reduced(image_path, min_side=QUALITY_SIDE)
+        if img_bgr is None:
+            return None
+        quality = self.check(img_bgr)
+        quality["calidad_ms"] = (time.perf_counter() - t0) * 1000.0
+        return quality
+
+
+def estimate_saved_ms(metrics):
+    """
+    Tiempo estimado que se ahorró al no procesar las imágenes rechazadas: rechazadas x p50 de
+    lectura completa, modelo y etapas posteriores por imagen (según PipelineMetrics).
+    """
+    snap = metrics.snapshot()
+    rejected = snap["contadores"].get("rechazadas_calidad", 0)
+    if not rejected:
+        return 0.0
+    stages = ("decode", "resize", "forward", "backward", "heatmap_resize", "active_zone", "overlay", "write_images")
+    per_image = sum(snap["etapas"].get(s, {}).get("p50_ms", 0.0) for s in stages)
+    return rejected * per_image
@@ -0,0 +1,231 @@
+# utils/resource_monitor.py
+import gc
+import os
+import sys
+import json
+import time
+import ctypes
+import threading
+import logging
+from collections import Counter, deque
+from datetime import datetime
+
+import numpy as np
+
+from utils.memory import current_rss_mb, peak_rss_mb
+
+log = logging.getLogger(__name__)
+
+RESOURCE_LOG = os.path.join("resultados", "recursos.jsonl")
+RESOURCE_REPORT = os.path.join("resultados", "recursos_reporte.json")
+
+# series de cada muestra que se vigilan y subida mínima (absoluta, relativa) para alertar
+WATCHED_SERIES = {
+    "rss_mb": (50.0, 0.0),
+    "handles": (20, 0.0),
+    "hilos": (5, 0.0),
+    "objetos": (0, 0.10),
+    "latencia_p50_ms": (0.0, 0.25),
+}
+
+
+def open_handles():
+    """Descriptores (POSIX) o handles (Windows) abiertos por el proceso; None si no se puede medir."""
+    if sys.platform == "win32":
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = ctypes.c_void_p
+        kernel32.GetProcessHandleCount.argtypes = [ctypes.c_void_p, ctypes.POINTER(ctypes.c_ulong)]
+        count = ctypes.c_ulong()
+        if not kernel32.GetProcessHandleCount(kernel32.GetCurrentProcess(), ctypes.byref(count)):
+            return None
+        return int(count.value)
+    for fd_dir in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(fd_dir))
+        except OSError:
+            continue
+    return None
+
+
+def trend(values):
+    """
+    Tendencia de una serie: pendiente por muestra (mínimos cuadrados), subida (último menos
+    el primero) y qué tan monótona es (tau de Kendall, -1..1: 1 = siempre creciente).
+    """
+    v = np.asarray([x for x in values if x is not None], dtype=np.float64)
+    if len(v) < 3:
+        return {"muestras": len(v), "pendiente": 0.0, "subida": 0.0, "tau": 0.0}
+    slope = float(np.polyfit(np.arange(len(v)), v, 1)[0])
+    signs = np.sign(v[None, :] - v[:, None])[np.triu_indices(len(v), k=1)]
+    return {"muestras": len(v), "pendiente": slope, "subida": float(v[-1] - v[0]),
+            "tau": float(signs.sum() / len(signs))}
+
+
+def is_growing(t, first, min_rise=0.0, min_ratio=0.0, min_tau=0.7):
+    """Crecimiento sostenido: serie casi monótona y subida por encima del mínimo absoluto y relativo."""
+    if t["tau"] < min_tau or t["subida"] <= 0:
+        return False
+    if t["subida"] < min_rise:
+        return False
+    return not min_ratio or (first is not None and first > 0 and t["subida"] / first >= min_ratio)
+
+
+class ResourceMonitor:
+    """
+    Muestreo periódico de los recursos del proceso para sesiones largas (la app abierta todo
+    el día): RSS, cantidad de objetos de Python por tipo, handles abiertos, hilos y latencia por
+    imagen (de PipelineMetrics). Cada muestra se agrega a log_path (JSON Lines) y se guarda en
+    memoria (últimas `window`); sobre las últimas `trend_window` se marca el crecimiento
+    sostenido de cada serie y de los tipos de objeto que más crecen (posibles fugas).
+    interval_s: segundos entre muestras del hilo de fondo (start); sample() también se puede
+    llamar a mano, p. ej. cada N imágenes en benchmarks.soak_test.
+    """
+
+    def __init__(self, interval_s=60, metrics=None, log_path=RESOURCE_LOG, window=1440, trend_window=30,
+                 count_types=True, min_type_count=100, min_type_rise=1000):
+        self.interval_s = interval_s
+        self.metrics = metrics
+        self.log_path = log_path
+        self.trend_window = trend_window
+        self.count_types = count_types
+        self.min_type_count = min_type_count
+        self.min_type_rise = min_type_rise
+        self.samples = deque(maxlen=window)
+        # conteo por tipo de cada muestra (solo tipos con min_type_count o más objetos)
+        self._types = deque(maxlen=trend_window)
+        self._alerts = set()
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._f = None
+        if log_path:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            self._f = open(log_path, "a", encoding="utf-8")
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Monitor con el intervalo de GLAUCOMA_RESOURCE_INTERVAL_S (60 por defecto); None si es 0."""
+        interval = float(os.environ.get("GLAUCOMA_RESOURCE_INTERVAL_S", 60))
+        if interval <= 0:
+            return None
+        return cls(interval_s=interval, **kwargs)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="resource-monitor", daemon=True)
+        self._thread.start()
+        log.info("Monitor de recursos activo (cada %.0f s, %s)", self.interval_s, self.log_path)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            if self._f is not None and not self._f.closed:
+                self._f.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.sample()
+            except Exception as e:
+                log.error("Monitor de recursos: %s: %s", type(e).__name__, e, exc_info=True)
+
+    def sample(self, **extra):
+        """Toma una muestra, la registra y devuelve el dict (extra: campos adicionales, p. ej. imágenes)."""
+        sample = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "t_s": round(time.monotonic() - self._t0, 1),
+            "rss_mb": current_rss_mb(),
+            "pico_rss_mb": peak_rss_mb(),
+            "handles": open_handles(),
+            "hilos": threading.active_count(),
+        }
+        types = None
+        if self.count_types:
+            types = Counter(type(o).__name__ for o in gc.get_objects())
+            sample["objetos"] = sum(types.values())
+            sample["tipos_top"] = dict(types.most_common(10))
+            types = {name: n for name, n in types.items() if n >= self.min_type_count}
+        if self.metrics is not None:
+            snap = self.metrics.snapshot()
+            sample["imagenes"] = snap["contadores"].get("imagenes", 0)
+            if "total" in snap:
+                sample["latencia_p50_ms"] = snap["total"]["p50_ms"]
+                sample["latencia_p95_ms"] = snap["total"]["p95_ms"]
+        sample.update(extra)
+        with self._lock:
+            self.samples.append(sample)
+            if types is not None:
+                self._types.append(types)
+            alerts = self._check()
+            sample["alertas"] = sorted(alerts)
+            if self._f is not None and not self._f.closed:
+                self._f.write(json.dumps(sample, ensure_ascii=False) + "\n")
+                self._f.flush()
+            new = alerts - self._alerts
+            self._alerts = alerts
+        for name in sorted(new):
+            log.warning("Crecimiento sostenido de %s en las últimas %d muestras (posible fuga, ver %s)",
+                        name, self.trend_window, self.log_path, extra={"serie": name, "muestra": sample})
+        return sample
+
+    def _series(self, key):
+        return [s.get(key) for s in list(self.samples)[-self.trend_window:]]
+
+    def _check(self):
+        """Nombres de las series (y tipos de objeto, como 'tipo:<nombre>') con crecimiento sostenido."""
+        alerts = set()
+        for key, (min_rise, min_ratio) in WATCHED_SERIES.items():
+            values = [v for v in self._series(key) if v is not None]
+            if len(values) >= self.trend_window // 2 and is_growing(trend(values), values[0], min_rise, min_ratio):
+                alerts.add(key)
+        for name, t in self._type_trends():
+            alerts.add(f"tipo:{name}")
+        return alerts
+
+    def _type_trends(self, top=10):
+        """Tipos de objeto con crecimiento sostenido, de mayor a menor subida: [(tipo, tendencia)]."""
+        history = list(self._types)
+        if len(history) < max(3, self.trend_window // 2):
+            return []
+        growing = []
+        for name in history[-1]:
+            t = trend([h.get(name, 0) for h in history])
+            if is_growing(t, None, min_rise=self.min_type_rise, min_tau=0.8):
+                growing.append((name, t))
+        growing.sort(key=lambda item: item[1]["subida"], reverse=True)
+        return growing[:top]
+
+    def report(self):
+        """Última muestra, tendencia de cada serie vigilada, tipos que más crecen y alertas activas."""
+        with self._lock:
+            last = dict(self.samples[-1]) if self.samples else None
+            trends = {key: trend(self._series(key)) for key in WATCHED_SERIES}
+            types = [{"tipo": name, **t} for name, t in self._type_trends()]
+            alerts = sorted(self._alerts)
+            n = len(self.samples)
+        return {
+            "muestras": n,
+            "intervalo_s": self.interval_s,
+            "ventana_tendencia": self.trend_window,
+            "ultima": last,
+            "tendencias": trends,
+            "tipos_en_crecimiento": types,
+            "alertas": alerts,
+        }
+
+    def write_report(self, path=RESOURCE_REPORT):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        log.info("Reporte de recursos: %s", path)
+        return path
@@ -0,0 +1,195 @@
+# utils/results_store.py
+import os
+import csv
+import math
+import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: sin él se usa un CSV consolidado
+    pa = None
+    pq = None
+
+log = logging.getLogger(__name__)
+
+# Columnas del CSV por imagen (<nombre>_datos.csv)
+CSV_COLUMNS = [
+    "nombre_imagen", "probabilidad", "centro_x", "centro_y",
+    "bbox_xmin", "bbox_ymin", "bbox_xmax", "bbox_ymax",
+    "tamano_zona_activa", "nivel_urgencia", "nivel_urgencia_label"
+]
+
+# Columnas del archivo consolidado de una corrida y su tipo
+RESULT_COLUMNS = {
+    "image": "string",
+    "nombre_imagen": "string",
+    "overlay_path": "string",
+    "heatmap_puro_path": "string",
+    "heatmap_cache_path": "string",
+    "csv_path": "string",
+    "probabilidad": "float64",
+    "centro_x": "float64",
+    "centro_y": "float64",
+    "bbox_xmin": "int64",
+    "bbox_ymin": "int64",
+    "bbox_xmax": "int64",
+    "bbox_ymax": "int64",
+    "tamano_zona_activa": "float64",
+    "nivel_urgencia": "float64",
+    "nivel_urgencia_label": "string",
+    "calidad": "string",
+    "calidad_motivo": "string",
+    "duplicado_de": "string",
+    "incertidumbre": "float64",
+    "modelo_fingerprint": "string",
+}
+
+
+def result_to_row(res):
+    """
+    Convierte el diccionario devuelto por process_image en una fila plana
+    con las columnas de RESULT_COLUMNS.
+    """
+    bbox = res.get("bbox") or (-1, -1, -1, -1)
+    centro = res.get("centro") or (-1, -1)
+    row = {
+        "image": res.get("image"),
+        "nombre_imagen": os.path.basename(res["image"]) if res.get("image") else None,
+        "overlay_path": res.get("overlay_path"),
+        "heatmap_puro_path": res.get("heatmap_puro_path"),
+        "heatmap_cache_path": res.get("heatmap_cache_path"),
+        "csv_path": res.get("csv_path"),
+        "probabilidad": float(res.get("probabilidad", 0.0)),
+        "centro_x": float(centro[0]),
+        "centro_y": float(centro[1]),
+        "bbox_xmin": int(bbox[0]) if bbox[0] is not None else -1,
+        "bbox_ymin": int(bbox[1]) if bbox[1] is not None else -1,
+        "bbox_xmax": int(bbox[2]) if bbox[2] is not None else -1,
+        "bbox_ymax": int(bbox[3]) if bbox[3] is not None else -1,
+        "tamano_zona_activa": float(res.get("tamano_zona_activa", 0.0)),
+        "nivel_urgencia": float(res.get("nivel_urgencia", 0.0)),
+        "nivel_urgencia_label": res.get("nivel_urgencia_label"),
+        "calidad": res.get("calidad"),
+        "calidad_motivo": res.get("calidad_motivo"),
+        "duplicado_de": res.get("duplicado_de"),
+        "incertidumbre": res.get("incertidumbre"),
+        "modelo_fingerprint": res.get("modelo_fingerprint"),
+    }
+    return row
+
+
+def to_jsonable(value, nan_to_none=False):
+    """
+    Convierte un resultado (tuplas, escalares numpy, etc.) a tipos serializables en JSON.
+    nan_to_none: NaN e infinitos como None (null), para JSON estricto (p. ej. respuestas HTTP).
+    """
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v, nan_to_none) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v, nan_to_none) for v in value]
+    if hasattr(value, "tolist"):  # escalares y arrays numpy
+        value = value.tolist()
+        if nan_to_none and isinstance(value, list):
+            return to_jsonable(value, nan_to_none)
+    if nan_to_none and isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def write_image_csv(csv_path, row):
+    """Escribe el CSV de una sola imagen (<nombre>_datos.csv) sin pasar por pandas."""
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerow(row)
+
+
+def _arrow_schema():
+    tipos = {"string": pa.string(), "float64": pa.float64(), "int64": pa.int64()}
+    return pa.schema([(name, tipos[t]) for name, t in RESULT_COLUMNS.items()])
+
+
+class ResultsWriter:
+    """
+    Archivo de resultados consolidado para una corrida completa.
+    Las filas se acumulan en memoria y se vuelcan por lotes: en Parquet cada
+    lote es un row group, en CSV se agregan al final del archivo. En ambos
+    formatos cada corrida reemplaza el archivo anterior (sin filas repetidas
+    ni encabezados de otra versión de RESULT_COLUMNS).
+    Si pyarrow no está instalado se usa CSV aunque se pida Parquet.
+    """
+
+    def __init__(self, path, rows_per_group=1000):
+        self.rows_per_group = max(1, int(rows_per_group))
+        self._rows = []
+        self._writer = None
+        self._csv_file = None
+        self._csv_writer = None
+        self.rows_written = 0
+
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".parquet" and pq is None:
+            log.info("pyarrow no disponible, se usará CSV consolidado")
+            path = os.path.splitext(path)[0] + ".csv"
+            ext = ".csv"
+        self.format = "parquet" if ext == ".parquet" else "csv"
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def append(self, res):
+        """Agrega el resultado de una imagen (dict de process_image)."""
+        self._rows.append(result_to_row(res))
+        if len(self._rows) >= self.rows_per_group:
+            self.flush()
+
+    def extend(self, results):
+        for res in results:
+            self.append(res)
+
+    def flush(self):
+        if not self._rows:
+            return
+        if self.format == "parquet":
+            columns = {name: [r.get(name) for r in self._rows] for name in RESULT_COLUMNS}
+            schema = _arrow_schema()
+            table = pa.Table.from_pydict(columns, schema=schema)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, schema, compression="zstd")
+            self._writer.write_table(table)
+        else:
+            if self._csv_writer is None:
+                self._csv_file = open(self.path, "w", newline="", encoding="utf-8")
+                self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=list(RESULT_COLUMNS))
+                self._csv_writer.writeheader()
+            self._csv_writer.writerows(self._rows)
+            self._csv_file.flush()
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+            self._csv_writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def read_results(path, columns=None):
+    """Lee un archivo consolidado (Parquet o CSV) como DataFrame de pandas."""
+    import pandas as pd
+    if path.lower().endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
@@ -0,0 +1,112 @@
+# utils/runtime_config.py
+import os
+import json
+import logging
+
+from utils.memory import total_memory_mb
+
+log = logging.getLogger(__name__)
+
+RUNTIME_CONFIG_PATH = os.path.join("resultados", "runtime_config.json")
+# variable de entorno para usar otro archivo de configuración
+RUNTIME_CONFIG_ENV = "GLAUCOMA_RUNTIME_CONFIG"
+
+RUNTIME_KEYS = ("tf_intra_op", "tf_inter_op", "cv2_threads", "workers", "batch_size", "low_memory")
+
+# perfil de poca memoria (equipos de 4 GB): lotes chicos, heatmaps float16 y resultados en streaming
+LOW_MEMORY_MAX_BATCH = 4
+LOW_MEMORY_SWEEP_BATCH = 8
+# con esta RAM total o menos el perfil se activa por defecto
+LOW_MEMORY_AUTO_MB = 4608
+
+
+def default_runtime_config(cpu_count=None):
+    """
+    Configuración por defecto según los núcleos del equipo. Deja un núcleo libre para el hilo
+    de Qt y la E/S; OpenCV usa pocos hilos porque la lectura y la escritura ya corren en el
+    pool de `workers` (si no, cada cv2.resize abre tantos hilos como núcleos y compite con TF).
+    """
+    cores = cpu_count or os.cpu_count() or 1
+    config = {
+        "tf_intra_op": max(1, cores - 1),
+        "tf_inter_op": 1 if cores <= 4 else 2,
+        "cv2_threads": 1 if cores <= 4 else 2,
+        "workers": 2 if cores <= 4 else min(4, cores // 2),
+        "batch_size": 8,
+        "low_memory": 0,
+        "origen": "por_defecto",
+    }
+    total = total_memory_mb()
+    if total is not None and total <= LOW_MEMORY_AUTO_MB:
+        config = low_memory_profile(config)
+    return config
+
+
+def low_memory_profile(config):
+    """
+    Perfil de poca memoria sobre config: lote acotado a LOW_MEMORY_MAX_BATCH (las activaciones
+    que guarda el GradientTape crecen con el lote) y un solo worker, así hay como máximo un
+    lote de imágenes a resolución completa en memoria.
+    """
+    config = dict(config)
+    config["low_memory"] = 1
+    config["batch_size"] = min(int(config["batch_size"]), LOW_MEMORY_MAX_BATCH)
+    config["workers"] = 1
+    config["tf_inter_op"] = 1
+    return config
+
+
+def runtime_config_path(path=None):
+    return path or os.environ.get(RUNTIME_CONFIG_ENV) or RUNTIME_CONFIG_PATH
+
+
+def load_runtime_config(path=None):
+    """Valores por defecto actualizados con los del archivo (p. ej. el que guarda benchmarks.autotune)."""
+    config = default_runtime_config()
+    path = runtime_config_path(path)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            config.update({k: int(data[k]) for k in RUNTIME_KEYS if k in data})
+            config["origen"] = data.get("origen", path)
+        except (OSError, ValueError, TypeError) as e:
+            log.error("Configuración de ejecución ilegible (%s), se usan los valores por defecto: %s", path, e)
+    if config.get("low_memory"):
+        # los límites del perfil valen aunque el archivo diga otra cosa (p. ej. más workers)
+        config = low_memory_profile(config)
+    return config
+
+
+def save_runtime_config(config, path=None, extra=None):
+    """Guarda la configuración de forma atómica; extra: datos informativos (p. ej. la medición)."""
+    path = runtime_config_path(path)
+    data = {k: int(config[k]) for k in RUNTIME_KEYS}
+    data["origen"] = config.get("origen", "manual")
+    data.update(extra or {})
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+    return path
+
+
+def apply_runtime_config(config):
+    """
+    Fija los hilos de OpenCV y de TensorFlow. Los de TF solo se pueden cambiar antes de que el
+    runtime se inicialice (antes de cargar el modelo o correr cualquier operación).
+    """
+    import cv2
+    import tensorflow as tf
+    cv2.setNumThreads(int(config["cv2_threads"]))
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(int(config["tf_intra_op"]))
+        tf.config.threading.set_inter_op_parallelism_threads(int(config["tf_inter_op"]))
+    except RuntimeError as e:
+        log.error("TensorFlow ya estaba inicializado, no se cambian sus hilos: %s", e)
+    log.info("Hilos: TF intra %s / inter %s, OpenCV %s, workers %s, lote %s%s (%s)", config["tf_intra_op"],
+             config["tf_inter_op"], config["cv2_threads"], config["workers"], config["batch_size"],
+             ", poca memoria" if config.get("low_memory") else "", config.get("origen", "manual"),
+             extra={"runtime_config": {k: config[k] for k in RUNTIME_KEYS}})
+    return config
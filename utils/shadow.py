@@ -0,0 +1,120 @@
+# utils/shadow.py
+import os
+import json
+import time
+import threading
+import logging
+from datetime import datetime
+import cv2
+import numpy as np
+
+from utils.results_store import to_jsonable
+
+log = logging.getLogger(__name__)
+
+SHADOW_LOG = os.path.join("resultados", "shadow_eval.jsonl")
+
+
+def heatmap_agreement(a, b, threshold=0.5):
+    """
+    Concordancia entre dos heatmaps 0..1 (2D, pueden tener distinta resolución; se comparan
+    en la más fina): correlación de Pearson e IoU de las zonas >= threshold. La correlación
+    es None si alguno de los dos es constante (no está definida).
+    """
+    # float32: cv2.resize no admite los heatmaps float16 del modo de poca memoria
+    a, b = a.astype(np.float32, copy=False), b.astype(np.float32, copy=False)
+    h, w = max(a.shape[0], b.shape[0]), max(a.shape[1], b.shape[1])
+    if a.shape != (h, w):
+        a = cv2.resize(a, (w, h), interpolation=cv2.INTER_LINEAR)
+    if b.shape != (h, w):
+        b = cv2.resize(b, (w, h), interpolation=cv2.INTER_LINEAR)
+    a, b = a.ravel(), b.ravel()
+    corr = float(np.corrcoef(a, b)[0, 1]) if a.std() > 0 and b.std() > 0 else None
+    ma, mb = a >= threshold, b >= threshold
+    union = np.count_nonzero(ma | mb)
+    iou = float(np.count_nonzero(ma & mb) / union) if union else 1.0
+    return corr, iou
+
+
+class ShadowEvaluator:
+    """
+    Evaluación en sombra de un modelo candidato sobre el mismo lote ya decodificado y
+    preprocesado que usa el modelo clínico: no se vuelve a leer ni a redimensionar nada.
+    visualizer: GradCAMVisualizer del modelo candidato (solo se usa compute_heatmaps).
+    Por imagen se escribe una línea en log_path (JSON Lines) con ambas probabilidades, si
+    coinciden en la decisión, la concordancia de los heatmaps y la latencia agregada.
+    Nunca modifica el resultado clínico: cualquier error del candidato se registra y se ignora.
+    """
+
+    def __init__(self, visualizer, log_path=SHADOW_LOG, name=None, prob_threshold=0.5):
+        self.visualizer = visualizer
+        self.log_path = log_path
+        self.name = name or getattr(visualizer.sequential_model, "name", "candidato")
+        self.prob_threshold = prob_threshold
+        self._lock = threading.Lock()
+        self._stats = {"imagenes": 0, "misma_decision": 0, "dif_abs": 0.0, "iou": 0.0, "ms": 0.0, "errores": 0}
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        self._f = open(log_path, "a", encoding="utf-8")
+
+    def evaluate(self, image_paths, batch_input, heatmaps, probs):
+        """
+        Corre el candidato sobre batch_input (el mismo lote del modelo clínico, cuyos
+        heatmaps y probs recibe solo para comparar) y registra la comparación.
+        Devuelve los ms que agregó la evaluación en sombra.
+        """
+        t0 = time.perf_counter()
+        try:
+            shadow_heatmaps, shadow_probs = self.visualizer.compute_heatmaps(batch_input)
+        except Exception as e:
+            with self._lock:
+                self._stats["errores"] += 1
+            log.error("Modelo en sombra (%s): %s: %s", self.name, type(e).__name__, e, exc_info=True,
+                      extra={"modelo_fingerprint": getattr(self.visualizer, "model_fingerprint", None)})
+            return (time.perf_counter() - t0) * 1000.0
+        records = []
+        for path, hm, p, shm, sp in zip(image_paths, heatmaps, probs, shadow_heatmaps, shadow_probs):
+            corr, iou = heatmap_agreement(hm, shm)
+            records.append({
+                "image": path,
+                "prob_clinico": float(p),
+                "prob_sombra": float(sp),
+                "misma_decision": bool((p >= self.prob_threshold) == (sp >= self.prob_threshold)),
+                "heatmap_corr": corr,
+                "heatmap_iou": iou,
+            })
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        per_image = elapsed / max(1, len(records))
+        fecha = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            for rec in records:
+                rec.update(fecha=fecha, modelo=self.name, latencia_ms=per_image,
+                           modelo_fingerprint=getattr(self.visualizer, "model_fingerprint", None))
+                # JSON estricto: un NaN suelto rompe a los lectores de JSON Lines
+                self._f.write(json.dumps(to_jsonable(rec, nan_to_none=True), ensure_ascii=False, allow_nan=False) + "\n")
+                self._stats["imagenes"] += 1
+                self._stats["misma_decision"] += rec["misma_decision"]
+                self._stats["dif_abs"] += abs(rec["prob_sombra"] - rec["prob_clinico"])
+                self._stats["iou"] += rec["heatmap_iou"]
+                self._stats["ms"] += per_image
+            self._f.flush()
+        return elapsed
+
+    def summary(self):
+        """Agregados de la corrida: concordancia, diferencia media de probabilidad, IoU y ms por imagen."""
+        with self._lock:
+            s = dict(self._stats)
+        n = s["imagenes"] or 1
+        return {
+            "modelo": self.name,
+            "imagenes": s["imagenes"],
+            "errores": s["errores"],
+            "concordancia": s["misma_decision"] / n,
+            "dif_prob_media": s["dif_abs"] / n,
+            "iou_medio": s["iou"] / n,
+            "ms_por_imagen": s["ms"] / n,
+        }
+
+    def close(self):
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
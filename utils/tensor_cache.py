@@ -0,0 +1,137 @@
+# utils/tensor_cache.py
+import os
+import json
+import hashlib
+import threading
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+TENSOR_CACHE_DIR = os.path.join("resultados", "tensor_cache")
+TENSOR_CACHE_VERSION = 1
+_DATA_FILENAME = "tensores.u8"
+_INDEX_FILENAME = "index.json"
+
+
+def content_digest(path, chunk_size=1 << 20):
+    """Hash del contenido de un archivo (blake2b, 128 bits en hex)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class TensorCache:
+    """
+    Caché en disco de las entradas del modelo ya preprocesadas (RGB uint8 del tamaño de
+    entrada, antes de normalizar), indexada por el hash del contenido de la imagen.
+    Al volver a puntuar un archivo con otro modelo, las imágenes cacheadas no se decodifican
+    ni se redimensionan. Los tensores van en un único archivo de registros fijos que se lee
+    con np.memmap; index.json guarda hash -> [registro, alto, ancho] de la imagen original.
+    El índice se escribe de forma atómica cada save_every altas y al llamar save().
+    """
+
+    def __init__(self, cache_dir=TENSOR_CACHE_DIR, size=(224, 224), save_every=200):
+        self.cache_dir = cache_dir
+        self.size = tuple(size)
+        self.save_every = save_every
+        self.data_path = os.path.join(cache_dir, _DATA_FILENAME)
+        self.index_path = os.path.join(cache_dir, _INDEX_FILENAME)
+        self.entries = {}
+        self._digests = {}   # (ruta, tamaño, mtime) -> hash, para no releer el archivo
+        self._map = None
+        self._dirty = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+        # registros (alto, ancho, 3): size es (ancho, alto), como en cv2.resize
+        self._record_shape = (self.size[1], self.size[0], 3)
+        self._record_bytes = int(np.prod(self._record_shape))
+        self._f = open(self.data_path, "r+b" if os.path.exists(self.data_path) else "w+b")
+        self._slots = max((e[0] for e in self.entries.values()), default=-1) + 1
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            log.error("Índice de la caché de tensores ilegible, se reconstruye: %s", e)
+            data = {}
+        if data.get("version") != TENSOR_CACHE_VERSION or tuple(data.get("size", ())) != self.size:
+            # otro tamaño de entrada: los registros anteriores no sirven
+            if os.path.exists(self.data_path):
+                os.remove(self.data_path)
+            return
+        self.entries = data.get("tensores", {})
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, image_path):
+        """Hash del contenido de image_path (memorizado mientras no cambien tamaño y mtime)."""
+        st = os.stat(image_path)
+        sig = (os.path.abspath(image_path), st.st_size, st.st_mtime_ns)
+        digest = self._digests.get(sig)
+        if digest is None:
+            digest = content_digest(image_path)
+            self._digests[sig] = digest
+        return digest
+
+    def get(self, image_path):
+        """(tensor uint8 de solo lectura, (alto, ancho) original) o None si no está en la caché."""
+        digest = self.key(image_path)
+        with self._lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            slot, h, w = entry
+            if self._map is None or len(self._map) <= slot:
+                self._f.flush()
+                n = os.path.getsize(self.data_path) // self._record_bytes
+                self._map = np.memmap(self.data_path, dtype=np.uint8, mode="r", shape=(n,) + self._record_shape)
+            return self._map[slot], (h, w)
+
+    def put(self, image_path, tensor_u8, orig_shape):
+        """Agrega la entrada preprocesada (uint8, tamaño de entrada del modelo) de image_path."""
+        if tensor_u8.shape != self._record_shape or tensor_u8.dtype != np.uint8:
+            raise ValueError(f"Tensor de forma {tensor_u8.shape}/{tensor_u8.dtype}, se esperaba {self._record_shape}/uint8")
+        digest = self.key(image_path)
+        with self._lock:
+            if digest in self.entries:
+                return
+            slot = self._slots
+            self._f.seek(slot * self._record_bytes)
+            self._f.write(np.ascontiguousarray(tensor_u8).tobytes())
+            self._slots += 1
+            self.entries[digest] = [slot, int(orig_shape[0]), int(orig_shape[1])]
+            self._dirty += 1
+            flush = self.save_every and self._dirty >= self.save_every
+        if flush:
+            self.save()
+
+    def save(self):
+        """Asegura los tensores en disco y luego escribe el índice (archivo temporal + os.replace)."""
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            data = {"version": TENSOR_CACHE_VERSION, "size": list(self.size), "tensores": self.entries}
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.index_path)
+            self._dirty = 0
+
+    def close(self):
+        self.save()
+        with self._lock:
+            self._map = None
+            if not self._f.closed:
+                self._f.close()
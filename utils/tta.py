@@ -0,0 +1,100 @@
+# utils/tta.py
+import cv2
+import numpy as np
+
+# por defecto solo se aumentan las imágenes con probabilidad a esta distancia (o menos) de 0.5
+DEFAULT_TTA_MARGIN = 0.15
+DEFAULT_TTA_ROTATIONS = (-10.0, 10.0)
+
+
+class TestTimeAugmentation:
+    """
+    Aumentación en inferencia (TTA) para los casos dudosos: espejo horizontal y rotaciones
+    pequeñas de la entrada del modelo (uint8, 224x224). Todas las vistas aumentadas de un lote
+    se apilan en un único lote; sus heatmaps se llevan de vuelta al encuadre original (flip
+    exacto sobre la grilla; rotación inversa con máscara de píxeles válidos) y se promedian
+    con la vista original. La varianza de las probabilidades entre vistas es la incertidumbre.
+    margin: solo se aplica a probabilidades en [0.5 - margin, 0.5 + margin] (None = a todas).
+    """
+
+    def __init__(self, flip=True, rotations=DEFAULT_TTA_ROTATIONS, margin=DEFAULT_TTA_MARGIN):
+        self.margin = margin
+        # (nombre, flip, ángulo); la vista original va implícita en primer lugar
+        self.views = []
+        if flip:
+            self.views.append(("flip_h", True, 0.0))
+        for angle in rotations or ():
+            self.views.append((f"rot{angle:+g}", False, float(angle)))
+        if not self.views:
+            raise ValueError("TTA sin vistas aumentadas")
+
+    @property
+    def n_views(self):
+        """Vistas por imagen, incluida la original."""
+        return len(self.views) + 1
+
+    def to_dict(self):
+        return {"vistas": [name for name, _, _ in self.views], "margen": self.margin}
+
+    def applies(self, prob):
+        return self.margin is None or abs(float(prob) - 0.5) <= self.margin
+
+    @staticmethod
+    def _rotation(angle, shape):
+        h, w = shape[:2]
+        return cv2.getRotationMatrix2D(((w - 1) / 2.0, (h - 1) / 2.0), angle, 1.0)
+
+    def augment(self, batch_u8):
+        """Lote (N, H, W, 3) -> vistas aumentadas apiladas (V*N, H, W, 3), vista por vista."""
+        n, h, w = batch_u8.shape[:3]
+        out = np.empty((len(self.views) * n,) + batch_u8.shape[1:], dtype=batch_u8.dtype)
+        for v, (_, flip, angle) in enumerate(self.views):
+            m = None if flip else self._rotation(angle, batch_u8.shape[1:])
+            for i in range(n):
+                dst = out[v * n + i]
+                if flip:
+                    cv2.flip(batch_u8[i], 1, dst=dst)
+                else:
+                    cv2.warpAffine(batch_u8[i], m, (w, h), dst=dst, flags=cv2.INTER_LINEAR,
+                                   borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        return out
+
+    def _unwarp(self, heatmap, view, input_shape):
+        """Heatmap (h, w) de una vista -> (heatmap en el encuadre original, peso de cada celda)."""
+        _, flip, angle = view
+        if flip:
+            return heatmap[:, ::-1], None
+        h, w = heatmap.shape
+        in_h, in_w = input_shape[:2]
+        inv = cv2.invertAffineTransform(self._rotation(angle, input_shape))
+        up = cv2.resize(heatmap.astype(np.float32, copy=False), (in_w, in_h), interpolation=cv2.INTER_LINEAR)
+        back = cv2.warpAffine(up, inv, (in_w, in_h), flags=cv2.INTER_LINEAR, borderValue=0)
+        valid = cv2.warpAffine(np.ones((in_h, in_w), np.float32), inv, (in_w, in_h), flags=cv2.INTER_LINEAR,
+                               borderValue=0)
+        # las esquinas que la rotación dejó fuera de cuadro no cuentan en el promedio
+        back = cv2.resize(back, (w, h), interpolation=cv2.INTER_AREA)
+        valid = cv2.resize(valid, (w, h), interpolation=cv2.INTER_AREA)
+        return back, valid
+
+    def merge(self, heatmaps, probs, view_heatmaps, view_probs, input_shape):
+        """
+        Combina la vista original (heatmaps (N, h, w), probs (N,)) con las aumentadas
+        (salida de compute_heatmaps sobre augment()). Devuelve heatmaps promediados y
+        normalizados 0..1, probabilidad media (N,) y varianza de la probabilidad (N,).
+        """
+        n = len(probs)
+        all_probs = np.concatenate([np.asarray(probs, dtype=float)[None],
+                                    np.asarray(view_probs, dtype=float).reshape(len(self.views), n)])
+        merged = np.empty_like(heatmaps)
+        for i in range(n):
+            total = heatmaps[i].astype(np.float32)
+            weight = np.ones_like(total)
+            for v, view in enumerate(self.views):
+                back, valid = self._unwarp(view_heatmaps[v * n + i], view, input_shape)
+                # fuera de cuadro back ya vale 0: basta con no sumar peso ahí
+                total += back
+                weight += 1.0 if valid is None else valid
+            total /= weight
+            maxv = total.max()
+            merged[i] = total / maxv if maxv > 0 else total
+        return merged, all_probs.mean(axis=0), all_probs.var(axis=0)
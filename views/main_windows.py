@@ -2,21 +2,68 @@
 import os
 import sys
 import json
+import logging
+import threading
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton,
                                QLabel, QHBoxLayout, QListWidget, QListWidgetItem, QTabWidget,
-                               QTextEdit, QSplitter, QComboBox)
+                               QTextEdit, QSplitter, QComboBox, QCheckBox)
 from PySide6.QtGui import QPixmap
-from PySide6.QtCore import Qt
-from views.widgets import select_image, select_folder, confirm_delete
+from PySide6.QtCore import Qt, QTimer, QObject, Signal
+from views.widgets import select_image, select_folder, select_model, confirm_delete, rgb_to_pixmap
+from views.stall_watchdog import watched_slot
 from utils.file_utils import open_folder, delete_detection_folder
-from utils.history_utils import append_record, read_master
+from utils.history_utils import append_record, read_master, result_to_record
+from utils.folder_watcher import FolderWatcher
+from utils.job_journal import unfinished_jobs
+from utils.quality import estimate_saved_ms
+from utils.model_registry import ModelRegistry
 import pandas as pd
 
+log = logging.getLogger(__name__)
+
+
+def _urgency_key(r):
+    """Clave de orden por urgencia; las imágenes sin urgencia (NaN, no evaluables) quedan al final."""
+    urg = r.get("nivel_urgencia", 0.0)
+    return -1.0 if urg != urg else urg
+
+
+class ResultsBridge(QObject):
+    """Lleva los resultados de los hilos de trabajo (watcher, carpeta) al hilo de la GUI."""
+    results_ready = Signal(list)
+    folder_status = Signal(str)
+    folder_result = Signal(object)
+    folder_done = Signal(list)
+    folder_failed = Signal(str)
+    model_ready = Signal(object)
+    model_failed = Signal(str)
+
+
 class MainWindow(QMainWindow):
     def __init__(self, gradcam_visualizer):
         super().__init__()
         self.setWindowTitle("Detector glaucoma - App")
         self.gc = gradcam_visualizer
+        # detector de bloqueos de la GUI (opcional, ver views.stall_watchdog)
+        self.watchdog = None
+        # modo vigilancia de carpeta (ver utils.folder_watcher) y análisis de carpeta en segundo plano
+        self.watcher = None
+        self.folder_thread = None
+        self.bridge = ResultsBridge()
+        self.bridge.results_ready.connect(self.on_watch_results)
+        self.bridge.folder_status.connect(self.on_folder_status)
+        self.bridge.folder_result.connect(self.on_folder_result)
+        self.bridge.folder_done.connect(self.on_folder_done)
+        self.bridge.folder_failed.connect(self.show_error_message)
+        self.bridge.model_ready.connect(self.on_model_swapped)
+        self.bridge.model_failed.connect(self.on_model_swap_failed)
+        # registro de modelos y cambio en caliente (ver set_model_registry)
+        self.registry = None
+        self.swapper = None
+        # lote y workers del análisis de carpeta (ver utils.runtime_config; None = de a una imagen)
+        self.runtime_config = None
+        # monitor de recursos de la sesión (ver utils.resource_monitor y set_resource_monitor)
+        self.resource_monitor = None
         
         # Estado de inicialización
         self.model_loaded = gradcam_visualizer is not None
@@ -44,8 +91,33 @@ class MainWindow(QMainWindow):
         self.tabs.addTab(self.tab_hist, "📋 Historial")
         self._init_history_tab()
 
+        # Panel diagnóstico (recursos de la sesión)
+        self.tab_diag = QWidget()
+        self.tabs.addTab(self.tab_diag, "🩺 Diagnóstico")
+        self._init_diagnostics_tab()
+
         self.current_detail = None
 
+        # Barra de estado con el rendimiento en vivo (ver utils.metrics)
+        self.status_label = QLabel("Cargando modelo...")
+        self.status_label.setStyleSheet("font-size: 9pt; color: #475569;")
+        self.statusBar().addPermanentWidget(self.status_label)
+        self.combo_model = QComboBox()
+        self.combo_model.setEnabled(False)
+        self.combo_model.setToolTip("Modelo activo (registro de modelos)")
+        self.combo_model.activated.connect(self.on_model_selected)
+        self.btn_add_model = QPushButton("＋")
+        self.btn_add_model.setObjectName("secondary")
+        self.btn_add_model.setToolTip("Agregar un modelo al registro")
+        self.btn_add_model.setEnabled(False)
+        self.btn_add_model.clicked.connect(self.on_add_model)
+        self.statusBar().addPermanentWidget(self.combo_model)
+        self.statusBar().addPermanentWidget(self.btn_add_model)
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.update_status_bar)
+        self.status_timer.timeout.connect(self.update_diagnostics)
+        self.status_timer.start(1000)
+
     def _init_single_tab(self):
         layout = QVBoxLayout()
         # Título para la sección
@@ -89,9 +161,24 @@ class MainWindow(QMainWindow):
         folder_title.setAlignment(Qt.AlignCenter)
         layout.addWidget(folder_title)
 
-        btn_folder = QPushButton("Seleccionar carpeta y detectar todo")
-        btn_folder.clicked.connect(self.on_select_folder)
-        layout.addWidget(btn_folder)
+        self.btn_folder = QPushButton("Seleccionar carpeta y detectar todo")
+        self.btn_folder.clicked.connect(self.on_select_folder)
+        layout.addWidget(self.btn_folder)
+
+        options = QHBoxLayout()
+        # duplicados: solo hashes perceptuales idénticos y a pedido (ver utils.phash_index)
+        self.chk_dedupe = QCheckBox("Reutilizar resultado de duplicados exactos")
+        self.chk_dedupe.setToolTip("Las copias idénticas de una imagen ya procesada reciben su resultado sin pasar por el modelo")
+        self.chk_force = QCheckBox("Forzar recálculo")
+        self.chk_force.setToolTip("Procesar todas las imágenes aunque ya tengan resultado guardado")
+        options.addWidget(self.chk_dedupe); options.addWidget(self.chk_force)
+        layout.addLayout(options)
+
+        self.btn_watch = QPushButton("👁 Vigilar carpeta (detección automática)")
+        self.btn_watch.setObjectName("secondary")
+        self.btn_watch.setCheckable(True)
+        self.btn_watch.toggled.connect(self.on_toggle_watch)
+        layout.addWidget(self.btn_watch)
 
         self.folder_summary = QLabel("")
         self.folder_summary.setObjectName("Resumen")
@@ -235,66 +322,132 @@ class MainWindow(QMainWindow):
         self.tab_hist.setLayout(layout)
         self.refresh_history()
 
+    def _init_diagnostics_tab(self):
+        layout = QVBoxLayout()
+        diag_title = QLabel("🩺 Recursos de la sesión")
+        diag_title.setStyleSheet("font-weight: 600; color: #0c4a6e; font-size: 12pt; margin-bottom: 16px;")
+        diag_title.setAlignment(Qt.AlignCenter)
+        layout.addWidget(diag_title)
+
+        self.diag_summary = QLabel("Monitor de recursos inactivo")
+        self.diag_summary.setStyleSheet("color: #475569;")
+        self.diag_summary.setWordWrap(True)
+        layout.addWidget(self.diag_summary)
+        self.diag_alerts = QLabel("")
+        self.diag_alerts.setStyleSheet("color: #b91c1c; font-weight: 600;")
+        self.diag_alerts.setWordWrap(True)
+        layout.addWidget(self.diag_alerts)
+        self.diag_text = QTextEdit()
+        self.diag_text.setReadOnly(True)
+        self.diag_text.setStyleSheet("font-family: Consolas, monospace; font-size: 9pt;")
+        layout.addWidget(self.diag_text)
+
+        row = QHBoxLayout()
+        btn_sample = QPushButton("Tomar muestra ahora")
+        btn_sample.setObjectName("secondary")
+        btn_sample.clicked.connect(self.on_resource_sample)
+        btn_report = QPushButton("Guardar reporte")
+        btn_report.setObjectName("secondary")
+        btn_report.clicked.connect(self.on_resource_report)
+        row.addWidget(btn_sample); row.addWidget(btn_report)
+        layout.addLayout(row)
+        self.tab_diag.setLayout(layout)
+
+    @watched_slot
     def on_load_image(self):
         path = select_image(self)
         if not path:
             return
+        self.analyze_image(path)
+
+    def analyze_image(self, path):
+        """Detección de una imagen: procesa, registra en el historial y muestra el detalle."""
         res = self.gc.process_image(path, output_root="resultados")
-        append_record({
-            "image": res["image"],
-            "overlay_path": res["overlay_path"],
-            "heatmap_puro_path": res["heatmap_puro_path"],
-            "csv_path": res["csv_path"],
-            "probabilidad": res["probabilidad"],
-            "centro_x": res["centro"][0],
-            "centro_y": res["centro"][1],
-            "bbox_xmin": res["bbox"][0],
-            "bbox_ymin": res["bbox"][1],
-            "bbox_xmax": res["bbox"][2],
-            "bbox_ymax": res["bbox"][3],
-            "tamano_zona_activa": res["tamano_zona_activa"],
-            "nivel_urgencia": res["nivel_urgencia"],
-            "nivel_urgencia_label": res["nivel_urgencia_label"]
-        })
-        pix = QPixmap(res["overlay_path"])
-        self.single_preview.setPixmap(pix.scaled(self.single_preview.size(), Qt.KeepAspectRatio))
+        append_record(result_to_record(res))
+        pix, _ = self._result_pixmaps(res)
+        if pix is not None:
+            self.single_preview.setPixmap(pix.scaled(self.single_preview.size(), Qt.KeepAspectRatio))
         self.set_detail_from_result(res)
         self.tabs.setCurrentWidget(self.tab_detail)
         self.refresh_history()
 
+    @watched_slot
     def on_select_folder(self):
         folder = select_folder(self)
         if not folder:
             return
-        results = self.gc.process_folder(folder, output_root="resultados")
-        # append each to master
-        for r in results:
-            append_record({
-                "image": r["image"],
-                "overlay_path": r["overlay_path"],
-                "heatmap_puro_path": r["heatmap_puro_path"],
-                "csv_path": r["csv_path"],
-                "probabilidad": r["probabilidad"],
-                "centro_x": r["centro"][0],
-                "centro_y": r["centro"][1],
-                "bbox_xmin": r["bbox"][0],
-                "bbox_ymin": r["bbox"][1],
-                "bbox_xmax": r["bbox"][2],
-                "bbox_ymax": r["bbox"][3],
-                "tamano_zona_activa": r["tamano_zona_activa"],
-                "nivel_urgencia": r["nivel_urgencia"],
-                "nivel_urgencia_label": r["nivel_urgencia_label"]
-            })
-        # ordenar por urgencia desc y llenar lista
-        results_sorted = sorted(results, key=lambda x: x.get("nivel_urgencia", 0.0), reverse=True)
+        self.run_folder(folder)
+
+    def run_folder(self, folder):
+        """
+        Procesa una carpeta en segundo plano como trabajo reanudable. Primero un barrido rápido
+        de probabilidad y luego el pipeline completo empezando por los casos más probables:
+        los resultados aparecen en la lista (ordenada por urgencia) a medida que terminan.
+        """
+        if self.folder_thread is not None and self.folder_thread.is_alive():
+            return
+        self.folder_list.clear()
+        self.folder_summary.setText(f"⏳ Analizando: {folder}\nBarrido rápido de probabilidad...")
+        self.btn_folder.setEnabled(False)
+
+        def _on_result(r):
+            # cada imagen se agrega al historial apenas termina (los resultados reutilizados ya están);
+            # si la app se cierra a mitad, volver a procesar la carpeta reanuda el trabajo
+            if not r.get("reutilizado"):
+                append_record(result_to_record(r))
+            self.bridge.folder_result.emit(r)
+
+        def _on_sweep(ranked):
+            probables = sum(1 for _, p in ranked if p >= 0.5)
+            self.bridge.folder_status.emit(f"⏳ Analizando: {folder}\n"
+                                           f"• {len(ranked)} imágenes nuevas, {probables} probables: se procesan primero")
+
+        runtime = self.runtime_config or {"batch_size": 1, "workers": 1}
+        dedupe = self.chk_dedupe.isChecked()
+        force = self.chk_force.isChecked()
+
+        def _work():
+            try:
+                # collect=True también con low_memory: on_folder_done arma la lista final ordenada
+                results = self.gc.process_folder(folder, output_root="resultados", recursive=True, incremental=True,
+                                                 resumable=True, prioritize=True, on_result=_on_result,
+                                                 on_sweep=_on_sweep, dedupe=dedupe, force=force,
+                                                 batch_size=runtime["batch_size"],
+                                                 workers=runtime["workers"], collect=True)
+            except Exception as e:
+                self.bridge.folder_failed.emit(f"Error al procesar la carpeta: {e}")
+                results = None
+            self.bridge.folder_done.emit(results if results is not None else [])
+
+        self.folder_thread = threading.Thread(target=_work, name="folder-job", daemon=True)
+        self.folder_thread.start()
+
+    def on_folder_status(self, text):
+        self.folder_summary.setText(text)
+
+    @watched_slot
+    def on_folder_result(self, r):
+        self._insert_ranked(r)
+        if self.folder_list.count() == 1:
+            self.folder_list.setCurrentRow(0)
+
+    @watched_slot
+    def on_folder_done(self, results):
+        """Resumen final de la carpeta y lista completa ordenada por urgencia."""
+        self.btn_folder.setEnabled(True)
+        # ordenar por urgencia desc y llenar lista (las no evaluables por calidad van al final)
+        results_sorted = sorted(results, key=_urgency_key, reverse=True)
+        gradable = [r for r in results_sorted if r.get("calidad") != "RECHAZADA"]
         self.folder_list.clear()
         total = len(results_sorted)
-        alta = sum(1 for r in results_sorted if r.get("nivel_urgencia_label") == "ALTA")
-        media = sum(1 for r in results_sorted if r.get("nivel_urgencia_label") == "MEDIA")
-        baja = sum(1 for r in results_sorted if r.get("nivel_urgencia_label") == "BAJA")
-        min_urg = min((r.get("nivel_urgencia", 0.0) for r in results_sorted), default=0.0)
-        detected = sum(1 for r in results_sorted if r.get("probabilidad", 0.0) >= 0.5)
-        min_prob = min((r.get("probabilidad", 0.0) for r in results_sorted), default=0.0)
+        alta = sum(1 for r in gradable if r.get("nivel_urgencia_label") == "ALTA")
+        media = sum(1 for r in gradable if r.get("nivel_urgencia_label") == "MEDIA")
+        baja = sum(1 for r in gradable if r.get("nivel_urgencia_label") == "BAJA")
+        min_urg = min((r.get("nivel_urgencia", 0.0) for r in gradable), default=0.0)
+        detected = sum(1 for r in gradable if r.get("probabilidad", 0.0) >= 0.5)
+        min_prob = min((r.get("probabilidad", 0.0) for r in gradable), default=0.0)
+        rejected = total - len(gradable)
+        flagged = sum(1 for r in gradable if r.get("calidad") == "DUDOSA")
         # Crear resumen visual con emojis y mejor formato
         summary_text = f"""
 📊 RESUMEN DE DETECCIÓN:
@@ -305,22 +458,89 @@ class MainWindow(QMainWindow):
 • Urgencia mínima: {min_urg:.3f}
 • Probabilidad mínima: {min_prob:.3f}
         """.strip()
+        if rejected or flagged:
+            summary_text += f"\n• Calidad: ⚪ no evaluables: {rejected} | ⚠ dudosas: {flagged}"
+        duplicates = sum(1 for r in results_sorted if r.get("duplicado_de"))
+        if duplicates:
+            summary_text += f"\n• Duplicadas (resultado de la original): {duplicates}"
         self.folder_summary.setText(summary_text)
         for r in results_sorted:
-            base = os.path.basename(r["image"]) if r.get("image") else "?"
-            urgency_level = r['nivel_urgencia_label']
-            urgency_emoji = "🔴" if urgency_level == "ALTA" else "🟡" if urgency_level == "MEDIA" else "🟢"
-            prob = r.get('probabilidad', 0.0)
-            prob_emoji = "✅" if prob >= 0.5 else "❌"
-            
-            label = f"{urgency_emoji} {base} | Prob: {prob:.3f} {prob_emoji} | Urg: {r['nivel_urgencia']:.3f} | {urgency_level}"
-            item = QListWidgetItem(label)
-            item.setData(Qt.UserRole, r)
-            self.folder_list.addItem(item)
+            self.folder_list.addItem(self._folder_item(r))
         if results_sorted:
             self.set_detail_from_result(results_sorted[0])
         self.refresh_history()
 
+    def _folder_item(self, r):
+        base = os.path.basename(r["image"]) if r.get("image") else "?"
+        if r.get("calidad") == "RECHAZADA":
+            item = QListWidgetItem(f"⚪ {base} | No evaluable: {r.get('calidad_motivo', '')}")
+            item.setData(Qt.UserRole, r)
+            return item
+        urgency_level = r['nivel_urgencia_label']
+        urgency_emoji = "🔴" if urgency_level == "ALTA" else "🟡" if urgency_level == "MEDIA" else "🟢"
+        prob = r.get('probabilidad', 0.0)
+        prob_emoji = "✅" if prob >= 0.5 else "❌"
+
+        label = f"{urgency_emoji} {base} | Prob: {prob:.3f} {prob_emoji} | Urg: {r['nivel_urgencia']:.3f} | {urgency_level}"
+        if r.get("calidad") == "DUDOSA":
+            label += f" | ⚠ {r.get('calidad_motivo', '')}"
+        if r.get("duplicado_de"):
+            label += f" | ≡ {os.path.basename(r['duplicado_de'])}"
+        item = QListWidgetItem(label)
+        item.setData(Qt.UserRole, r)
+        return item
+
+    def _insert_ranked(self, r):
+        """Inserta un resultado en folder_list manteniendo el orden por urgencia descendente."""
+        row = 0
+        while row < self.folder_list.count():
+            other = self.folder_list.item(row).data(Qt.UserRole)
+            if _urgency_key(other) < _urgency_key(r):
+                break
+            row += 1
+        self.folder_list.insertItem(row, self._folder_item(r))
+
+    def on_toggle_watch(self, checked):
+        """Inicia o detiene la vigilancia de una carpeta (procesa las imágenes nuevas al llegar)."""
+        if not checked:
+            if self.watcher is not None:
+                self.watcher.stop()
+                self.watcher = None
+            self.btn_watch.setText("👁 Vigilar carpeta (detección automática)")
+            return
+        if self.gc is None:
+            self.btn_watch.setChecked(False)
+            return
+        folder = select_folder(self)
+        if not folder:
+            self.btn_watch.setChecked(False)
+            return
+        self.folder_list.clear()
+        self.folder_summary.setText(f"👁 Vigilando: {folder}\nEsperando imágenes nuevas...")
+        self.watcher = FolderWatcher(self.gc, folder, output_root="resultados",
+                                     on_results=self.bridge.results_ready.emit).start()
+        self.btn_watch.setText("⏹ Detener vigilancia")
+
+    @watched_slot
+    def on_watch_results(self, results):
+        """Agrega al historial y a la lista (ordenada por urgencia) un lote del watcher."""
+        for r in results:
+            append_record(result_to_record(r))
+            self._insert_ranked(r)
+        if self.watcher is not None:
+            alta = sum(1 for i in range(self.folder_list.count())
+                       if self.folder_list.item(i).data(Qt.UserRole).get("nivel_urgencia_label") == "ALTA")
+            self.folder_summary.setText(f"👁 Vigilando: {self.watcher.folder}\n"
+                                        f"• Procesadas: {self.watcher.processed} | 🔴 ALTA: {alta}")
+        self.refresh_history()
+
+    def closeEvent(self, event):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        super().closeEvent(event)
+
+    @watched_slot
     def refresh_history(self):
         self.history_list.clear()
         try:
@@ -355,20 +575,20 @@ class MainWindow(QMainWindow):
                 item.setData(Qt.UserRole, row.to_dict())
                 self.history_list.addItem(item)
         except Exception as e:
-            print("No history or error:", e)
+            log.error("No se pudo leer el historial: %s", e, exc_info=True)
 
+    @watched_slot
     def set_detail_from_result(self, res: dict):
         self.current_detail = res
         # imágenes
         try:
-            if res.get("overlay_path") and os.path.exists(res["overlay_path"]):
-                pix1 = QPixmap(res["overlay_path"]).scaled(600, 400, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                self.detail_overlay.setPixmap(pix1)
+            pix1, pix2 = self._result_pixmaps(res)
+            if pix1 is not None:
+                self.detail_overlay.setPixmap(pix1.scaled(600, 400, Qt.KeepAspectRatio, Qt.SmoothTransformation))
             else:
                 self.detail_overlay.setText("Overlay not found")
-            if res.get("heatmap_puro_path") and os.path.exists(res["heatmap_puro_path"]):
-                pix2 = QPixmap(res["heatmap_puro_path"]).scaled(600, 400, Qt.KeepAspectRatio, Qt.SmoothTransformation)
-                self.detail_heatmap.setPixmap(pix2)
+            if pix2 is not None:
+                self.detail_heatmap.setPixmap(pix2.scaled(600, 400, Qt.KeepAspectRatio, Qt.SmoothTransformation))
             else:
                 self.detail_heatmap.setText("Heatmap not found")
         except Exception:
@@ -376,6 +596,13 @@ class MainWindow(QMainWindow):
         # texto características
         try:
             # Crear un formato más legible para el usuario médico
+            if res.get("calidad") == "RECHAZADA":
+                self.detail_text.setPlainText(
+                    f"⚪ IMAGEN NO EVALUABLE\n\n🔍 Archivo: {os.path.basename(res.get('image', 'N/A'))}\n"
+                    f"🧪 Motivo: {res.get('calidad_motivo', '')}\n\n"
+                    f"No se pasó por el modelo. Repetir la captura.\n\n"
+                    f"{json.dumps(res.get('calidad_metricas', {}), indent=2, ensure_ascii=False)}")
+                return
             features_text = f"""📊 RESULTADO DE DETECCIÓN
 
 🔍 IMAGEN:
@@ -384,6 +611,10 @@ class MainWindow(QMainWindow):
 📈 PROBABILIDADES:
    • Probabilidad de glaucoma: {res.get('probabilidad', 0.0):.1%}
    • Nivel de urgencia: {res.get('nivel_urgencia_label', 'N/A')} ({res.get('nivel_urgencia', 0.0):.3f})
+   • Calidad de la imagen: {res.get('calidad') or 'sin control'} {res.get('calidad_motivo') or ''}
+   • Duplicada de: {os.path.basename(res.get('duplicado_de') or '') or 'no'}
+   • Modelo: {res.get('modelo_fingerprint') or 'N/A'}
+   • Incertidumbre (TTA): {f"{res['incertidumbre']:.4f} ({res.get('tta_vistas')} vistas)" if res.get('incertidumbre') is not None else 'no aplicada'}
 
 📍 LOCALIZACIÓN:
    • Centro de la zona activa: ({res.get('centro', (0, 0))[0]:.1f}, {res.get('centro', (0, 0))[1]:.1f})
@@ -392,9 +623,9 @@ class MainWindow(QMainWindow):
 📏 CARACTERÍSTICAS:
    • Tamaño de zona activa: {res.get('tamano_zona_activa', 0.0):.1%}
    • Archivos generados:
-     - Overlay: {os.path.basename(res.get('overlay_path', 'N/A'))}
-     - Heatmap: {os.path.basename(res.get('heatmap_puro_path', 'N/A'))}
-     - Datos CSV: {os.path.basename(res.get('csv_path', 'N/A'))}
+     - Overlay: {os.path.basename(res.get('overlay_path') or 'N/A')}
+     - Heatmap: {os.path.basename(res.get('heatmap_puro_path') or 'N/A')}
+     - Datos CSV: {os.path.basename(res.get('csv_path') or 'N/A')}
 
 📋 DATOS TÉCNICOS COMPLETOS:
 {json.dumps({
@@ -405,6 +636,24 @@ class MainWindow(QMainWindow):
         except Exception:
             self.detail_text.setPlainText(str(res))
 
+    def _result_pixmaps(self, res: dict):
+        """
+        Devuelve (overlay, heatmap) como QPixmap. Si las imágenes no se guardaron
+        (modo lazy) se generan en memoria a partir del heatmap cacheado.
+        """
+        overlay_path = res.get("overlay_path")
+        heatmap_path = res.get("heatmap_puro_path")
+        pix1 = QPixmap(overlay_path) if isinstance(overlay_path, str) and os.path.exists(overlay_path) else None
+        pix2 = QPixmap(heatmap_path) if isinstance(heatmap_path, str) and os.path.exists(heatmap_path) else None
+        if (pix1 is None or pix2 is None) and self.gc is not None and isinstance(res.get("heatmap_cache_path"), str):
+            overlay_rgb, heatmap_bgr = self.gc.render_overlay_from_cache(res)
+            if overlay_rgb is not None:
+                if pix1 is None:
+                    pix1 = rgb_to_pixmap(overlay_rgb)
+                if pix2 is None:
+                    pix2 = rgb_to_pixmap(heatmap_bgr[:, :, ::-1])
+        return pix1, pix2
+
     def on_folder_item_double_clicked(self, item: QListWidgetItem):
         data = item.data(Qt.UserRole)
         if isinstance(data, dict):
@@ -420,6 +669,7 @@ class MainWindow(QMainWindow):
                 "image": data.get("image"),
                 "overlay_path": data.get("overlay_path"),
                 "heatmap_puro_path": data.get("heatmap_puro_path"),
+                "heatmap_cache_path": data.get("heatmap_cache_path"),
                 "csv_path": data.get("csv_path"),
                 "probabilidad": data.get("probabilidad", 0.0),
                 "centro": (data.get("centro_x", -1), data.get("centro_y", -1)),
@@ -436,12 +686,34 @@ class MainWindow(QMainWindow):
             self.set_detail_from_result(mapped)
             self.tabs.setCurrentWidget(self.tab_detail)
 
+    def _result_folder(self, info):
+        """Carpeta de resultados de una detección (puede estar en subcarpetas si se escaneó recursivamente)."""
+        for key in ("csv_path", "overlay_path", "heatmap_puro_path", "heatmap_cache_path"):
+            path = info.get(key)
+            if isinstance(path, str) and path and path != "N/A":
+                return os.path.dirname(path)
+        return os.path.join("resultados", os.path.splitext(os.path.basename(info["image"]))[0])
+
+    def _is_duplicate(self, info):
+        """
+        Un duplicado (ver utils.phash_index) reutiliza los archivos de la imagen original: su
+        carpeta es la de la original y no se borra desde esta fila.
+        """
+        dup = info.get("duplicado_de")
+        if not (isinstance(dup, str) and dup):
+            return False
+        from PySide6.QtWidgets import QMessageBox
+        QMessageBox.information(self, "Duplicado",
+                                f"Esta imagen es un duplicado de:\n{dup}\n"
+                                "Sus resultados son los de la original y no se eliminan desde aquí.")
+        return True
+
     def open_selected_folder(self):
         item = self.history_list.currentItem()
         if not item:
             return
         info = item.data(Qt.UserRole)
-        folder = os.path.join("resultados", os.path.splitext(os.path.basename(info["image"]))[0])
+        folder = self._result_folder(info)
         if os.path.exists(folder):
             open_folder(folder)
 
@@ -450,7 +722,9 @@ class MainWindow(QMainWindow):
         if not item:
             return
         info = item.data(Qt.UserRole)
-        folder = os.path.join("resultados", os.path.splitext(os.path.basename(info["image"]))[0])
+        if self._is_duplicate(info):
+            return
+        folder = self._result_folder(info)
         if confirm_delete(self, folder):
             deleted = delete_detection_folder(folder)
             if deleted:
@@ -462,7 +736,7 @@ class MainWindow(QMainWindow):
         img_path = self.current_detail.get("image")
         if not img_path:
             return
-        folder = os.path.join("resultados", os.path.splitext(os.path.basename(img_path))[0])
+        folder = self._result_folder(self.current_detail)
         if os.path.exists(folder):
             open_folder(folder)
 
@@ -472,7 +746,9 @@ class MainWindow(QMainWindow):
         img_path = self.current_detail.get("image")
         if not img_path:
             return
-        folder = os.path.join("resultados", os.path.splitext(os.path.basename(img_path))[0])
+        if self._is_duplicate(self.current_detail):
+            return
+        folder = self._result_folder(self.current_detail)
         if confirm_delete(self, folder):
             if delete_detection_folder(folder):
                 self.refresh_history()
@@ -487,7 +763,7 @@ class MainWindow(QMainWindow):
         img_path = res.get("image")
         if not img_path:
             return
-        folder = os.path.join("resultados", os.path.splitext(os.path.basename(img_path))[0])
+        folder = self._result_folder(res)
         if os.path.exists(folder):
             open_folder(folder)
 
@@ -501,16 +777,173 @@ class MainWindow(QMainWindow):
         img_path = res.get("image")
         if not img_path:
             return
-        folder = os.path.join("resultados", os.path.splitext(os.path.basename(img_path))[0])
+        if self._is_duplicate(res):
+            return
+        folder = self._result_folder(res)
         if confirm_delete(self, folder):
             if delete_detection_folder(folder):
                 self.folder_list.takeItem(self.folder_list.currentRow())
     
+    def update_status_bar(self):
+        """Muestra imágenes/s y p50/p95 por imagen de las últimas detecciones."""
+        if self.gc is None:
+            return
+        snap = self.gc.metrics.snapshot()
+        n = snap["contadores"].get("imagenes", 0)
+        if not n:
+            self.status_label.setText("Modelo listo")
+            return
+        etapas = snap["etapas"]
+        rechazadas = snap["contadores"].get("rechazadas_calidad", 0)
+        modelo = sum(etapas.get(k, {}).get("p50_ms", 0.0) for k in ("forward", "backward"))
+        self.status_label.setText(
+            f"⏱ {snap['imagenes_por_s']:.2f} img/s | por imagen p50 {snap['total']['p50_ms']:.0f} ms"
+            f" · p95 {snap['total']['p95_ms']:.0f} ms | modelo p50 {modelo:.0f} ms | procesadas: {n}"
+            + (f" | descartadas por calidad: {rechazadas} (~{estimate_saved_ms(self.gc.metrics) / 1000.0:.0f} s ahorrados)"
+               if rechazadas else "")
+        )
+
+    def set_resource_monitor(self, monitor):
+        self.resource_monitor = monitor
+        self.update_diagnostics(force=True)
+
+    def update_diagnostics(self, force=False):
+        """Última muestra, tendencias y tipos de objeto en crecimiento (solo con la pestaña visible)."""
+        if self.resource_monitor is None or (not force and self.tabs.currentWidget() is not self.tab_diag):
+            return
+        rep = self.resource_monitor.report()
+        last = rep["ultima"]
+        if last is None:
+            self.diag_summary.setText(f"Monitor activo: primera muestra en {self.resource_monitor.interval_s:.0f} s")
+            return
+
+        def _fmt(value, spec=".0f"):
+            return "—" if value is None else format(value, spec)
+        self.diag_summary.setText(
+            f"{last['fecha']} | RSS {_fmt(last['rss_mb'])} MB (pico {_fmt(last['pico_rss_mb'])} MB) | "
+            f"handles {_fmt(last['handles'], 'd')} | hilos {last['hilos']} | objetos {_fmt(last.get('objetos'), 'd')} | "
+            f"latencia p50 {_fmt(last.get('latencia_p50_ms'))} ms | imágenes {_fmt(last.get('imagenes'), 'd')} | "
+            f"muestras: {rep['muestras']}")
+        self.diag_alerts.setText("⚠️ Crecimiento sostenido: " + ", ".join(rep["alertas"]) if rep["alertas"] else "")
+        lines = [f"Tendencias (últimas {rep['ventana_tendencia']} muestras):"]
+        for key, t in rep["tendencias"].items():
+            lines.append(f"  {key:16s} subida {t['subida']:+10.1f}   pendiente {t['pendiente']:+8.2f}/muestra"
+                         f"   tau {t['tau']:+.2f}   ({t['muestras']} muestras)")
+        if rep["tipos_en_crecimiento"]:
+            lines.append("")
+            lines.append("Tipos de objeto en crecimiento:")
+            for t in rep["tipos_en_crecimiento"]:
+                lines.append(f"  {t['tipo']:30s} {t['subida']:+10.0f}   tau {t['tau']:+.2f}")
+        lines.append("")
+        lines.append("Objetos más numerosos:")
+        for name, n in (last.get("tipos_top") or {}).items():
+            lines.append(f"  {name:30s} {n:10d}")
+        self.diag_text.setPlainText("\n".join(lines))
+
+    @watched_slot
+    def on_resource_sample(self):
+        if self.resource_monitor is None:
+            return
+        self.resource_monitor.sample()
+        self.update_diagnostics(force=True)
+
+    @watched_slot
+    def on_resource_report(self):
+        if self.resource_monitor is None:
+            return
+        path = self.resource_monitor.write_report()
+        self.statusBar().showMessage(f"Reporte de recursos guardado en {path}", 5000)
+
     def set_model(self, gradcam_visualizer):
         """Actualiza el modelo después de la carga inicial"""
         self.gc = gradcam_visualizer
         self.model_loaded = True
-        print("✅ Modelo configurado en la ventana principal")
+        self.update_status_bar()
+        log.info("Modelo configurado en la ventana principal")
+        QTimer.singleShot(0, self.offer_resume_jobs)
+
+    def set_model_registry(self, registry, swapper):
+        """Habilita el selector de modelo; swapper carga y precalienta el elegido en segundo plano."""
+        self.registry = registry
+        self.swapper = swapper
+        self._fill_model_combo()
+        self._set_model_controls_enabled(True)
+
+    def _set_model_controls_enabled(self, enabled):
+        """Selector y botón de agregar modelo: deshabilitados mientras hay un cambio de modelo en curso."""
+        self.combo_model.setEnabled(enabled)
+        self.btn_add_model.setEnabled(enabled)
+
+    def _fill_model_combo(self):
+        self.combo_model.clear()
+        active = self.swapper.entry["sha256"] if self.swapper and self.swapper.entry else None
+        for entry in self.registry.available():
+            self.combo_model.addItem(ModelRegistry.label(entry), entry["sha256"])
+            if entry["sha256"] == active:
+                self.combo_model.setCurrentIndex(self.combo_model.count() - 1)
+
+    def on_add_model(self):
+        if self.swapper.busy:
+            self.show_error_message("Ya hay un cambio de modelo en curso; espere a que termine.")
+            return
+        path = select_model(self)
+        if not path:
+            return
+        try:
+            entry = self.registry.register(path)
+        except OSError as e:
+            self.show_error_message(f"No se pudo registrar el modelo: {e}")
+            return
+        self._fill_model_combo()
+        self.combo_model.setCurrentIndex(self.combo_model.findData(entry["sha256"]))
+        self.on_model_selected(self.combo_model.currentIndex())
+
+    def on_model_selected(self, index):
+        entry = self.registry.find(self.combo_model.itemData(index) or "")
+        if entry is None or (self.swapper.entry and entry["sha256"] == self.swapper.entry["sha256"]):
+            return
+        # el modelo actual sigue atendiendo hasta que el nuevo esté cargado y precalentado
+        self._set_model_controls_enabled(False)
+        try:
+            self.swapper.swap(entry, on_ready=self.bridge.model_ready.emit, on_error=self.bridge.model_failed.emit)
+        except RuntimeError as e:
+            # otro cambio en curso: se vuelve a mostrar el modelo activo
+            self._fill_model_combo()
+            self._set_model_controls_enabled(not self.swapper.busy)
+            self.show_error_message(str(e))
+            return
+        self.status_label.setText(f"Cargando modelo {ModelRegistry.label(entry)}...")
+
+    def on_model_swapped(self, gradcam_visualizer):
+        """Cambio atómico al modelo ya precalentado (los trabajos en curso terminan con el anterior)."""
+        self.gc = gradcam_visualizer
+        if self.watcher is not None:
+            self.watcher.gc = gradcam_visualizer
+        self._set_model_controls_enabled(True)
+        self.update_status_bar()
+        self.statusBar().showMessage(f"Modelo activo: {ModelRegistry.label(self.swapper.entry)}", 5000)
+
+    def on_model_swap_failed(self, message):
+        self._fill_model_combo()
+        self._set_model_controls_enabled(True)
+        self.show_error_message(message)
+
+    def offer_resume_jobs(self):
+        """Si quedaron trabajos de carpeta interrumpidos (cierre o reinicio del equipo), ofrece reanudarlos."""
+        from PySide6.QtWidgets import QMessageBox
+        for job in unfinished_jobs():
+            folder = job["input_folder"]
+            if not os.path.isdir(folder):
+                continue
+            answer = QMessageBox.question(
+                self, "Trabajo interrumpido",
+                f"El procesamiento de la carpeta:\n{folder}\nquedó interrumpido "
+                f"({job['procesadas']} imágenes procesadas).\n¿Reanudarlo ahora?")
+            if answer == QMessageBox.Yes:
+                self.tabs.setCurrentWidget(self.tab_folder)
+                self.run_folder(folder)
+                # de a un trabajo por vez; los demás se ofrecen en el próximo inicio
+                break
     
     def show_error_message(self, message):
         """Muestra un mensaje de error en la interfaz"""
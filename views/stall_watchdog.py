@@ -0,0 +1,177 @@
+# views/stall_watchdog.py
+import os
+import sys
+import json
+import time
+import inspect
+import functools
+import threading
+import traceback
+import logging
+from collections import deque, Counter, defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+from PySide6.QtCore import QObject, QTimer
+
+log = logging.getLogger(__name__)
+
+
+def watched_slot(func):
+    """
+    Marca un método de MainWindow como slot vigilado: si la ventana tiene un
+    watchdog activo, los bloqueos que ocurran durante la llamada se atribuyen a él.
+    """
+    # Qt puede pasar argumentos extra (p. ej. `checked` de clicked): se descartan los que el slot no acepta
+    n_params = len(inspect.signature(func).parameters) - 1
+
+    @functools.wraps(func)
+    def wrapper(self, *args):
+        args = args[:n_params]
+        wd = getattr(self, "watchdog", None)
+        if wd is None:
+            return func(self, *args)
+        with wd.slot(func.__name__):
+            return func(self, *args)
+    return wrapper
+
+
+class StallWatchdog(QObject):
+    """
+    Detector de bloqueos del event loop de Qt (opt-in).
+    Un QTimer en el hilo de la GUI marca un latido cada interval_ms; un hilo aparte
+    detecta cuando el latido se atrasa más de threshold_ms y muestrea la pila del
+    hilo principal mientras dura el bloqueo. Al terminar cada bloqueo se registra
+    el slot que estaba corriendo, cuánto bloqueó y las pilas muestreadas.
+    """
+
+    def __init__(self, parent=None, threshold_ms=200, interval_ms=50, sample_ms=100, max_stalls=500):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.sample_every = sample_ms / 1000.0
+        self._main_ident = threading.main_thread().ident
+        self._last_beat = time.monotonic()
+        self._lags_ms = deque(maxlen=5000)
+        self._slots = []
+        self._last_slot = (None, 0.0)
+        self._samples = []
+        self._sample_slot = None
+        self._lock = threading.Lock()
+        self.stalls = deque(maxlen=max_stalls)
+        self._stop = threading.Event()
+        self._thread = None
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._beat)
+
+    @classmethod
+    def from_env(cls, parent=None):
+        """Crea el watchdog si GLAUCOMA_STALL_WATCHDOG=1 (umbral en GLAUCOMA_STALL_MS)."""
+        if os.environ.get("GLAUCOMA_STALL_WATCHDOG", "0") not in ("1", "true", "yes"):
+            return None
+        return cls(parent, threshold_ms=float(os.environ.get("GLAUCOMA_STALL_MS", 200)))
+
+    def start(self):
+        self._last_beat = time.monotonic()
+        self._timer.start(int(self.interval * 1000))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._monitor, name="stall-watchdog", daemon=True)
+        self._thread.start()
+        log.info("Detector de bloqueos de la GUI activo (umbral %.0f ms)", self.threshold * 1000)
+        return self
+
+    def stop(self):
+        self._timer.stop()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    @contextmanager
+    def slot(self, name):
+        self._slots.append(name)
+        try:
+            yield
+        finally:
+            self._last_slot = (" > ".join(self._slots), time.monotonic())
+            self._slots.pop()
+
+    # --- hilo de la GUI ---------------------------------------------------
+    def _beat(self):
+        now = time.monotonic()
+        gap = now - self._last_beat
+        self._last_beat = now
+        self._lags_ms.append(max(0.0, (gap - self.interval) * 1000.0))
+        if gap >= self.threshold:
+            with self._lock:
+                samples, slot_name = self._samples, self._sample_slot
+                self._samples, self._sample_slot = [], None
+            # sin muestras (bloqueo corto): se atribuye al slot que terminó durante el bloqueo
+            last_name, last_end = self._last_slot
+            if not slot_name and last_end >= now - gap:
+                slot_name = last_name
+            stall = {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "slot": slot_name or "desconocido",
+                "bloqueo_ms": gap * 1000.0,
+                "pilas": samples,
+            }
+            self.stalls.append(stall)
+            log.warning("%s bloqueó la GUI %.0f ms", stall["slot"], stall["bloqueo_ms"],
+                        extra={"slot": stall["slot"], "bloqueo_ms": stall["bloqueo_ms"]})
+
+    # --- hilo monitor -----------------------------------------------------
+    def _monitor(self):
+        next_sample = 0.0
+        while not self._stop.wait(self.sample_every / 2):
+            now = time.monotonic()
+            if now - self._last_beat < self.threshold or now < next_sample:
+                continue
+            next_sample = now + self.sample_every
+            frame = sys._current_frames().get(self._main_ident)
+            if frame is None:
+                continue
+            stack = [f"{os.path.basename(fs.filename)}:{fs.lineno} {fs.name}"
+                     for fs in traceback.extract_stack(frame)[-12:]]
+            slot_name = " > ".join(self._slots) if self._slots else None
+            with self._lock:
+                self._samples.append(stack)
+                if slot_name and not self._sample_slot:
+                    self._sample_slot = slot_name
+
+    # --- reporte ----------------------------------------------------------
+    def report(self, top_frames=5):
+        """Agrega los bloqueos por slot: cantidad, total, máximo, p95 y frames más frecuentes."""
+        by_slot = defaultdict(list)
+        for st in list(self.stalls):
+            by_slot[st["slot"]].append(st)
+        slots = {}
+        for name, items in by_slot.items():
+            durs = np.array([s["bloqueo_ms"] for s in items])
+            frames = Counter(line for s in items for stack in s["pilas"] for line in stack[-3:])
+            slots[name] = {
+                "bloqueos": len(items),
+                "total_ms": float(durs.sum()),
+                "max_ms": float(durs.max()),
+                "p95_ms": float(np.percentile(durs, 95)),
+                "frames_frecuentes": [{"frame": f, "muestras": c} for f, c in frames.most_common(top_frames)],
+                "ejemplo_pila": next((s["pilas"][0] for s in items if s["pilas"]), []),
+            }
+        lags = np.array(self._lags_ms) if self._lags_ms else np.zeros(1)
+        return {
+            "umbral_ms": self.threshold * 1000.0,
+            "latencia_event_loop_ms": {
+                "p50": float(np.percentile(lags, 50)),
+                "p95": float(np.percentile(lags, 95)),
+                "max": float(lags.max()),
+            },
+            "slots": dict(sorted(slots.items(), key=lambda kv: kv[1]["total_ms"], reverse=True)),
+        }
+
+    def write_report(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        log.info("Reporte de bloqueos de la GUI: %s", path)
@@ -1,11 +1,17 @@
 # views/widgets.py
 from PySide6.QtWidgets import QFileDialog, QMessageBox
+from PySide6.QtGui import QImage, QPixmap
+import numpy as np
 import os
 
 def select_image(parent=None):
     fname, _ = QFileDialog.getOpenFileName(parent, "Seleccionar imagen", "", "Images (*.png *.jpg *.jpeg *.bmp *.tiff)")
     return fname
 
+def select_model(parent=None):
+    fname, _ = QFileDialog.getOpenFileName(parent, "Seleccionar modelo", "", "Modelos (*.h5 *.keras)")
+    return fname
+
 def select_folder(parent=None):
     folder = QFileDialog.getExistingDirectory(parent, "Seleccionar carpeta")
     return folder
@@ -13,3 +19,10 @@ def select_folder(parent=None):
 def confirm_delete(parent, folder):
     reply = QMessageBox.question(parent, "Eliminar detección", f"¿Eliminar la carpeta {os.path.basename(folder)}?", QMessageBox.Yes | QMessageBox.No)
     return reply == QMessageBox.Yes
+
+def rgb_to_pixmap(img_rgb):
+    """Convierte un array RGB uint8 (H,W,3) en QPixmap (para overlays generados en memoria)."""
+    img_rgb = np.ascontiguousarray(img_rgb, dtype=np.uint8)
+    h, w = img_rgb.shape[:2]
+    qimg = QImage(img_rgb.data, w, h, 3 * w, QImage.Format_RGB888)
+    return QPixmap.fromImage(qimg.copy())